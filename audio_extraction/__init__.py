@@ -0,0 +1,14 @@
+from functools import lru_cache
+
+from audio_extraction.pcm_audio import AudioExtractor
+
+
+@lru_cache(maxsize=None)
+def get_extractor() -> AudioExtractor:
+    return AudioExtractor()
+
+
+def __getattr__(name):
+    if name == "extractor":
+        return get_extractor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
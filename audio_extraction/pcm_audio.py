@@ -0,0 +1,173 @@
+import json
+import os
+import struct
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import dotenv
+import numpy as np
+
+from editor.ffmpeg_utils import run_ffmpeg
+from media_archive.fingerprint import fingerprint_file
+from pipeline import tracing
+
+dotenv.load_dotenv()
+
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "./data/audio")
+SAMPLE_RATE = 16000
+CHANNELS = 1
+
+
+def read_wav_layout(wav_path: str) -> Tuple[int, int, int, int]:
+    """ Returns the sample rate, channel count, byte offset and byte size of the PCM data of a 16-bit WAV file. """
+    with open(wav_path, 'rb') as file:
+        riff, _, wave_id = struct.unpack('<4sI4s', file.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"Not a WAV file: {wav_path}")
+
+        sample_rate, channels = None, None
+        while True:
+            header = file.read(8)
+            if len(header) < 8:
+                raise ValueError(f"No data chunk in {wav_path}")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', file.read(16))
+                if bits != 16:
+                    raise ValueError(f"Expected 16-bit PCM in {wav_path}, got {bits}-bit")
+                file.seek(chunk_size - 16 + chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                offset = file.tell()
+                data_size = min(chunk_size, os.path.getsize(wav_path) - offset)
+                return sample_rate, channels, offset, data_size
+            else:
+                file.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def write_wav(chunks: Iterable[np.ndarray], sample_rate: int, channels: int, n_samples: int, wav_path: str) -> str:
+    """ Writes n_samples frames of 16-bit PCM, given as (samples, channels) chunks, to a WAV file in one pass. """
+    data_size = n_samples * channels * 2
+    with open(wav_path, 'wb') as file:
+        file.write(struct.pack(
+            '<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, channels, sample_rate,
+            sample_rate * channels * 2, channels * 2, 16, b'data', data_size
+        ))
+        for chunk in chunks:
+            file.write(np.ascontiguousarray(chunk, dtype='<i2').data)
+    return wav_path
+
+
+class AudioBuffer:
+    """ Decoded 16-bit PCM of a media file, memory-mapped from a cached WAV file and shared between stages. """
+
+    def __init__(self, wav_path: str):
+        self.wav_path = wav_path
+        self.sample_rate, self.channels, offset, data_size = read_wav_layout(wav_path)
+        n_samples = data_size // (2 * self.channels)
+        self.samples = np.memmap(wav_path, dtype='<i2', mode='r', offset=offset, shape=(n_samples, self.channels))
+        self.consumers: List[str] = []
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def slice(self, start: float, end: float) -> np.ndarray:
+        """ Zero-copy view of the samples between start and end seconds. """
+        return self.samples[int(round(start * self.sample_rate)):int(round(end * self.sample_rate))]
+
+    def to_float(self, start: float = 0.0, end: Optional[float] = None) -> np.ndarray:
+        """ Samples as a float32 (channel, time) array in [-1, 1], the layout expected by pyannote. """
+        samples = self.slice(start, self.duration if end is None else end)
+        return (samples.T / 32768.0).astype(np.float32)
+
+    def mark_used(self, consumer: str):
+        self.consumers.append(consumer)
+
+
+class AudioExtractor:
+    """
+    Decodes the audio track of a media file once into a cache directory and hands out memory-mapped
+    buffers of it. Keeps a report of the decode time spent and saved per file and layout, until it is printed.
+    """
+
+    def __init__(self, cache_dir: str = AUDIO_CACHE_DIR, sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS):
+        self.cache_dir = cache_dir
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.report: Dict[Tuple[str, int, int], dict] = {}
+
+    def __call__(self, file_path: str, fingerprint: Optional[str] = None, sample_rate: Optional[int] = None,
+                 channels: Optional[int] = None) -> AudioBuffer:
+        """ The buffer at the analysis layout of the extractor, or at the given sample rate and channels. """
+        sample_rate = sample_rate or self.sample_rate
+        channels = channels or self.channels
+        key = (file_path, sample_rate, channels)
+        if key in self.report:
+            return self.report[key]["buffer"]
+
+        if fingerprint is None:
+            fingerprint = fingerprint_file(file_path)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        wav_path = os.path.join(self.cache_dir, f"{fingerprint}_{sample_rate}_{channels}.wav")
+        stats_path = f"{wav_path}.json"
+
+        cached = os.path.exists(wav_path) and os.path.exists(stats_path)
+        if cached:
+            with open(stats_path, 'r') as file:
+                decode_seconds = json.load(file)["decode_seconds"]
+            tracing.count(cache_hits=1)
+        else:
+            print(f"Decoding audio of {os.path.basename(file_path)}.")
+            start_time = time.perf_counter()
+            temp_wav_path = f"{wav_path}.tmp.wav"
+            with tracing.span("audio_decode", sample_rate=sample_rate, channels=channels):
+                run_ffmpeg([
+                    "-i", file_path,
+                    "-vn",
+                    "-ac", str(channels),
+                    "-ar", str(sample_rate),
+                    "-c:a", "pcm_s16le",
+                    "-map_metadata", "-1",
+                    temp_wav_path
+                ])
+                tracing.count(bytes_read=os.path.getsize(file_path), bytes_written=os.path.getsize(temp_wav_path))
+            os.replace(temp_wav_path, wav_path)
+            decode_seconds = time.perf_counter() - start_time
+            with open(stats_path, 'w') as file:
+                json.dump({"decode_seconds": decode_seconds}, file)
+
+        buffer = AudioBuffer(wav_path)
+        self.report[key] = {"buffer": buffer, "decode_seconds": decode_seconds, "cached": cached}
+        return buffer
+
+    def get_reports(self, file_path: str) -> List[dict]:
+        """
+        Per layout the file was decoded at, the decode time of the shared buffer and the decodes it replaced,
+        one per consumer beyond the first.
+        """
+        reports = []
+        for (path, sample_rate, channels), entry in list(self.report.items()):
+            if path != file_path:
+                continue
+            consumers = entry["buffer"].consumers
+            avoided_decodes = len(consumers) if entry["cached"] else max(len(consumers) - 1, 0)
+            reports.append({
+                "file_path": file_path,
+                "sample_rate": sample_rate,
+                "channels": channels,
+                "decode_seconds": 0.0 if entry["cached"] else entry["decode_seconds"],
+                "cached": entry["cached"],
+                "consumers": list(consumers),
+                "decode_seconds_saved": avoided_decodes * entry["decode_seconds"],
+            })
+        return reports
+
+    def print_report(self, file_path: str):
+        """ Prints the reports of the file and releases its buffers, a later call maps the cached audio again. """
+        for report in self.get_reports(file_path):
+            print(
+                f"Audio decode for {os.path.basename(file_path)} at {report['sample_rate']} Hz: "
+                f"{report['decode_seconds']:.2f}s ({'cached' if report['cached'] else 'decoded'}), "
+                f"shared by {report['consumers']}, saved {report['decode_seconds_saved']:.2f}s."
+            )
+            self.report.pop((file_path, report["sample_rate"], report["channels"]), None)
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+
+from benchmarks.cut_processing import speech_segments_of
+from benchmarks.synthetic_media import generate_speech
+from media_archive.media_archive import Media, MediaArchive
+from transcriptions.objects import Language
+
+JSON_BACKEND = "json"
+SQLITE_BACKEND = "sqlite"
+
+
+def generate_media(i: int, duration: float) -> Media:
+    """ A fully processed media: transcriptions, segments and parts of duration seconds of synthetic speech. """
+    transcription = generate_speech(duration, seed=i)
+    speech_segments = speech_segments_of(transcription)
+    return Media(
+        file_path=f"/videos/video_{i}.mp4",
+        transcription_uuid=f"benchmark-{i}",
+        language=Language.english,
+        transcription=transcription,
+        corrected_transcription=transcription,
+        speech_segments=speech_segments,
+        pause_segments=[(end, start) for (_, end), (start, _) in zip(speech_segments, speech_segments[1:])],
+        repetition_segments=[],
+        fingerprint=f"{i:032x}",
+        stage_keys={"transcription": "benchmark"}
+    )
+
+
+def open_archive(backend: str, work_dir: str) -> MediaArchive:
+    cache_file = os.path.join(work_dir, "archive.json")
+    if backend == JSON_BACKEND:
+        return MediaArchive(cache_file=cache_file, db_file=None)
+    return MediaArchive(cache_file=cache_file, db_file=os.path.join(work_dir, "archive.db"))
+
+
+def benchmark(sizes=(10, 100, 500), duration: float = 600, backends=(JSON_BACKEND, SQLITE_BACKEND)) -> dict:
+    """
+    MediaArchive load time, full save time and the time to archive one more media against the number of
+    archived media of duration seconds each, per storage backend.
+    """
+    template = generate_media(0, duration)
+    results = {}
+    for backend in backends:
+        results[backend] = {}
+        for size in sizes:
+            with tempfile.TemporaryDirectory(prefix="bench_media_archive_") as work_dir:
+                archive = open_archive(backend, work_dir)
+                for i in range(size):
+                    archive.cache[f"/videos/video_{i}.mp4"] = template.copy(
+                        update={"file_path": f"/videos/video_{i}.mp4", "fingerprint": f"{i:032x}"}
+                    )
+
+                start_time = time.perf_counter()
+                archive.save()
+                save_seconds = time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                archive = open_archive(backend, work_dir)
+                load_seconds = time.perf_counter() - start_time
+                assert len(archive.cache) == size
+
+                start_time = time.perf_counter()
+                archive.add_media(generate_media(size, duration))
+                add_seconds = time.perf_counter() - start_time
+
+                stored_bytes = sum(os.path.getsize(os.path.join(work_dir, name)) for name in os.listdir(work_dir))
+            results[backend][size] = {
+                "save_seconds": save_seconds,
+                "load_seconds": load_seconds,
+                "add_media_seconds": add_seconds,
+                "stored_bytes": stored_bytes,
+            }
+            print(f"{backend}, {size} media ({stored_bytes / 2 ** 20:.1f} MiB): save {save_seconds:.3f}s, "
+                  f"load {load_seconds:.3f}s, add one {add_seconds:.3f}s")
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
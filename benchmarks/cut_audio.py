@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from audio_extraction.pcm_audio import AudioBuffer, AudioExtractor
+from benchmarks.synthetic_media import generate_cuts, generate_test_audio
+from editor.cut_media import MOVIEPY_ENGINE, NUMPY_ENGINE, cut_audio
+from editor.pcm_cut import CHANNELS, SAMPLE_RATE, numpy_cut_audio
+
+
+def max_jump(wav_path: str) -> int:
+    """ Largest step between consecutive samples, a click at a join shows up as a step far above the tones'. """
+    samples = AudioBuffer(wav_path).samples.astype(np.int32)
+    return int(np.abs(np.diff(samples, axis=0)).max())
+
+
+def benchmark(duration: float = 600, n_cuts: int = 300, extension: str = ".wav") -> dict:
+    """
+    Times editor.cut_media.cut_audio per engine on a synthetic recording. The numpy engine is timed with the
+    decode into the audio cache and again from the cached PCM, and without crossfades to compare the joins.
+    """
+    work_dir = tempfile.mkdtemp(prefix="bench_cut_audio_")
+    try:
+        file_path = generate_test_audio(os.path.join(work_dir, f"source{extension}"), duration=duration)
+        cuts = generate_cuts(duration, n_cuts)
+        extractor = AudioExtractor(os.path.join(work_dir, "audio"), sample_rate=SAMPLE_RATE, channels=CHANNELS)
+
+        runs = {
+            MOVIEPY_ENGINE: lambda output_dir_path: cut_audio(
+                file_path, output_dir_path, cuts, save_cuts=False, engine=MOVIEPY_ENGINE),
+            f"{NUMPY_ENGINE} (decode)": lambda output_dir_path: numpy_cut_audio(
+                file_path, output_dir_path, cuts, save_cuts=False, audio_extractor=extractor),
+            f"{NUMPY_ENGINE} (cached)": lambda output_dir_path: numpy_cut_audio(
+                file_path, output_dir_path, cuts, save_cuts=False, audio_extractor=extractor),
+            f"{NUMPY_ENGINE} (no crossfade)": lambda output_dir_path: numpy_cut_audio(
+                file_path, output_dir_path, cuts, save_cuts=False, audio_extractor=extractor, crossfade_duration=0),
+        }
+
+        results = {}
+        for i, (name, run) in enumerate(runs.items()):
+            # The extractor hands out its buffer again within a run, a new one reads the cache from disk
+            extractor.report.clear()
+            start_time = time.perf_counter()
+            result_path = run(os.path.join(work_dir, str(i)))
+            elapsed = time.perf_counter() - start_time
+            results[name] = {"seconds": elapsed, "realtime_factor": duration / elapsed}
+            if extension == ".wav":
+                results[name]["max_jump"] = max_jump(result_path)
+            print(f"{name}: {elapsed:.2f}s ({duration / elapsed:.0f}x realtime) for {n_cuts} cuts over {duration}s"
+                  + (f", max sample step {results[name]['max_jump']}" if "max_jump" in results[name] else ""))
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    benchmark()
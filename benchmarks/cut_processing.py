@@ -0,0 +1,60 @@
+import contextlib
+import io
+import time
+
+from benchmarks.synthetic_media import generate_speech
+from editor.video_segments_processing import merge_overlapping_cuts, sync_transcription_to_pauses
+from llm.windowing import split_paragraphs
+
+
+def speech_segments_of(transcription) -> list:
+    """ The speech segments a voice detector would find: runs of words without a pause longer than a second. """
+    segments = []
+    for word in transcription.words:
+        if segments and word.start - segments[-1][1] < 1.0:
+            segments[-1] = (segments[-1][0], max(segments[-1][1], word.end - 0.05))
+        else:
+            segments.append((word.start, word.end - 0.05))
+    return segments
+
+
+def timed(function, *args, **kwargs) -> float:
+    """ Seconds of one call, with the progress printed by the function discarded. """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+        function(*args, **kwargs)
+        return time.perf_counter() - start_time
+
+
+def benchmark(durations=(600, 3600, 4 * 3600, 16 * 3600)) -> dict:
+    """
+    Scaling of merge_overlapping_cuts and sync_transcription_to_pauses with the length of the recording,
+    on synthetic speech with one LLM-like cut every few seconds.
+    """
+    results = {}
+    for duration in durations:
+        transcription = generate_speech(duration)
+        speech_segments = speech_segments_of(transcription)
+        # Cuts of a few words, overlapping the neighbouring ones now and then like windowed LLM results
+        cuts = [(word.start, transcription.words[min(i + 3, len(transcription.words) - 1)].end)
+                for i, word in enumerate(transcription.words) if i % 7 in (0, 2)]
+
+        results[duration] = {
+            "words": len(transcription.words),
+            "speech_segments": len(speech_segments),
+            "cuts": len(cuts),
+            "merge_overlapping_cuts_seconds": timed(merge_overlapping_cuts, cuts),
+            "sync_transcription_to_pauses_seconds": timed(sync_transcription_to_pauses, transcription, speech_segments),
+            "split_paragraphs_seconds": timed(split_paragraphs, transcription, speech_segments),
+        }
+        print(
+            f"{duration / 60:.0f} min, {len(transcription.words)} words, {len(cuts)} cuts: "
+            f"merge {results[duration]['merge_overlapping_cuts_seconds'] * 1000:.1f}ms, "
+            f"sync {results[duration]['sync_transcription_to_pauses_seconds'] * 1000:.1f}ms, "
+            f"paragraphs {results[duration]['split_paragraphs_seconds'] * 1000:.1f}ms"
+        )
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
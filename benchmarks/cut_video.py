@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic_media import generate_cuts, generate_test_video
+from editor.cut_media import MOVIEPY_ENGINE, SMART_ENGINE, cut_video
+
+
+def benchmark(duration: float = 120, n_cuts: int = 40, engines=(MOVIEPY_ENGINE, SMART_ENGINE)) -> dict:
+    """ Times editor.cut_media.cut_video per engine on a synthetic recording. """
+    work_dir = tempfile.mkdtemp(prefix="bench_cut_video_")
+    try:
+        file_path = generate_test_video(os.path.join(work_dir, "source.mp4"), duration=duration)
+        cuts = generate_cuts(duration, n_cuts)
+
+        results = {}
+        for engine in engines:
+            output_dir_path = os.path.join(work_dir, engine)
+            start_time = time.perf_counter()
+            cut_video(file_path=file_path, output_dir_path=output_dir_path, cuts=cuts, save_cuts=False, engine=engine)
+            elapsed = time.perf_counter() - start_time
+            results[engine] = {
+                "seconds": elapsed,
+                "realtime_factor": duration / elapsed,
+            }
+            print(f"{engine}: {elapsed:.2f}s ({duration / elapsed:.1f}x realtime) for {n_cuts} cuts over {duration}s")
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+
+from editor import intervals
+
+# The quadratic list implementations are only timed up to this many intervals
+MAX_LIST_SIZE = 10_000
+
+
+def timed(function):
+    start_time = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start_time
+
+
+def list_merge_cuts(cuts, min_duration=0.3):
+    """ merge_overlapping_cuts before the interval engine, kept for comparison. """
+    cuts = sorted(cuts, key=lambda x: x[0])
+    overlaps, current_overlap = [], []
+    for i in range(len(cuts) - 1):
+        if cuts[i][1] + min_duration > cuts[i + 1][0]:
+            if not current_overlap:
+                current_overlap = [i]
+            current_overlap.append(i + 1)
+        elif current_overlap:
+            overlaps.append(current_overlap)
+            current_overlap = []
+    if current_overlap:
+        overlaps.append(current_overlap)
+    merged_cuts, skip_indices = [], set()
+    for group in overlaps:
+        merged_cuts.append((cuts[group[0]][0], max(cuts[i][1] for i in group)))
+        skip_indices.update(group)
+    merged_cuts += [cut for i, cut in enumerate(cuts) if i not in skip_indices]
+    return sorted(merged_cuts, key=lambda x: x[0])
+
+
+def list_kept_segments(cuts, duration):
+    """ get_kept_segments before the interval engine. """
+    kept_segments, last_end = [], 0
+    for start, end in sorted(cuts):
+        if start > last_end:
+            kept_segments.append((last_end, min(start, duration)))
+        last_end = max(last_end, end)
+        if last_end >= duration:
+            break
+    if last_end < duration:
+        kept_segments.append((last_end, duration))
+    return kept_segments
+
+
+def list_sync_words(word_starts, speech_segments):
+    """ The per word linear scan of sync_transcription_to_pauses before the interval engine. """
+    return [next((i for i, (start, end) in enumerate(speech_segments) if start <= t <= end), -1) for t in word_starts]
+
+
+def random_intervals(n: int, rng: np.random.Generator) -> np.ndarray:
+    """ About 2 seconds of speech per interval with some overlapping ones, like LLM cuts. """
+    starts = np.sort(rng.uniform(0, n * 2.0, n))
+    return np.column_stack([starts, starts + rng.exponential(1.0, n)])
+
+
+def benchmark(sizes=(1_000, 10_000, 100_000, 1_000_000), seed: int = 0) -> dict:
+    """ Union, complement and word assignment of the interval engine against the list implementations. """
+    rng = np.random.default_rng(seed)
+    results = {}
+    for n in sizes:
+        cuts = random_intervals(n, rng)
+        duration = float(cuts[:, 1].max())
+        cut_list = intervals.to_list(cuts)
+        speech = intervals.union(random_intervals(n, rng))
+        word_starts = rng.uniform(0, duration, n)
+
+        merged, union_seconds = timed(lambda: intervals.union(cuts, gap=0.3))
+        _, complement_seconds = timed(lambda: intervals.complement(cuts, 0.0, duration))
+        _, containing_seconds = timed(lambda: intervals.containing(word_starts, speech))
+        result = {
+            "union_seconds": union_seconds,
+            "complement_seconds": complement_seconds,
+            "containing_seconds": containing_seconds,
+        }
+        line = f"{n:>9} intervals | union {union_seconds:.4f}s | complement {complement_seconds:.4f}s" \
+               f" | containing {containing_seconds:.4f}s"
+
+        if n <= MAX_LIST_SIZE:
+            _, result["list_union_seconds"] = timed(lambda: list_merge_cuts(cut_list))
+            _, result["list_complement_seconds"] = timed(lambda: list_kept_segments(cut_list, duration))
+            _, result["list_containing_seconds"] = timed(
+                lambda: list_sync_words(word_starts.tolist(), intervals.to_list(speech)))
+            line += f" | lists: union {result['list_union_seconds']:.4f}s," \
+                    f" complement {result['list_complement_seconds']:.4f}s," \
+                    f" containing {result['list_containing_seconds']:.4f}s"
+        results[n] = result
+        print(line + f" | {len(merged)} merged cuts")
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
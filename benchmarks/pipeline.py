@@ -0,0 +1,124 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from audio_extraction.pcm_audio import AudioBuffer, AudioExtractor
+from benchmarks.synthetic_media import generate_speech_video
+from editor import intervals
+from editor.cut_media import MOVIEPY_ENGINE
+from editor.subtitle_render import BURN_SUBTITLES
+from editor.video_processor import VideoProcessor
+from llm.stub_server import StubLLMServer
+from media_archive.media_archive import MediaArchive
+from pipeline.scheduler import StageScheduler
+from transcriptions.api_client import TranscriptClient
+from transcriptions.objects import Language
+from transcriptions.stub_server import StubTranscriptionServer
+from voice_segmentation.voice_activity_detection import VoiceDetector
+
+
+class EnergyVoiceDetector(VoiceDetector):
+    """ Stand-in for the pyannote detector: speech is where the RMS of short frames is above a threshold. """
+    frame_duration: float = 0.03
+    threshold: float = 0.01
+
+    def __init__(self):
+        super().__init__(model_id="energy")
+
+    def __call__(self, file_path: str, pause_margin: Tuple[float, float] = None, audio: Optional[AudioBuffer] = None,
+                 streaming: Optional[bool] = None) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+        audio = audio if audio is not None else AudioExtractor()(file_path)
+        audio.mark_used("voice_activity_detection")
+        frame = int(self.frame_duration * audio.sample_rate)
+        n_frames = len(audio.samples) // frame
+        frames = audio.samples[:n_frames * frame, 0].reshape(n_frames, frame) / 32768.0
+        active = np.sqrt((frames ** 2).mean(axis=1)) > self.threshold
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], active.astype(np.int8), [0]])))
+        speech = edges.reshape(-1, 2) * self.frame_duration
+
+        pause_margin = self.pause_margin if pause_margin is None else pause_margin
+        pauses = intervals.pad(intervals.complement(speech, 0.0, audio.duration), -pause_margin[0], -pause_margin[1])
+        return intervals.to_list(speech), intervals.to_list(intervals.filter_min_duration(pauses))
+
+
+@contextlib.contextmanager
+def stub_services(transcription_delay: float = 0.0, n_words: int = 200, llm_delay: float = 0.2):
+    """
+    Runs the stub transcription and LLM servers on a background event loop, with langchain pointed at
+    the LLM stub for the duration of the block. TranscriptClient polls every 10 seconds, so transcripts
+    are ready right away by default.
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def call(coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    transcription_server = call(StubTranscriptionServer(processing_delay=transcription_delay, n_words=n_words).start())
+    llm_server = call(StubLLMServer(response_delay=llm_delay).start())
+    previous_env = {name: os.environ.get(name) for name in ("OPENAI_API_BASE", "OPENAI_API_KEY")}
+    os.environ.update({"OPENAI_API_BASE": llm_server.base_url, "OPENAI_API_KEY": "stub"})
+    try:
+        yield transcription_server, llm_server
+    finally:
+        for name, value in previous_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        call(transcription_server.stop())
+        call(llm_server.stop())
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+
+def benchmark(duration: float = 60, llm_stages: bool = True, cut_engine: str = MOVIEPY_ENGINE,
+              subtitles_mode: str = BURN_SUBTITLES) -> dict:
+    """
+    Seconds per stage of a VideoProcessor run on a synthetic recording, with the transcription API and the
+    LLM served by local stubs and an energy based voice detector, then of a second run served by the archive.
+    """
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as work_dir:
+        source_dir = os.path.join(work_dir, "source")
+        generate_speech_video(os.path.join(source_dir, "talk.mp4"), duration=duration)
+
+        with stub_services(n_words=int(duration * 2)) as (transcription_server, llm_server):
+            archive = MediaArchive(cache_file=os.path.join(work_dir, "archive.json"), db_file=None)
+            transcript_client = TranscriptClient(api_key="stub", media_archive=archive)
+            transcript_client.post_file_url, transcript_client.get_transcript_url = transcription_server.urls
+            processor = VideoProcessor(
+                media_archive=archive,
+                voice_detector=EnergyVoiceDetector(),
+                transcript_client=transcript_client,
+                audio_extractor=AudioExtractor(os.path.join(work_dir, "audio")),
+                source_videos_dir=source_dir,
+                result_videos_dir=os.path.join(work_dir, "processed")
+            )
+
+            results = {}
+            for run in ["first run", "archived run"]:
+                stages = processor.build_stages(
+                    correct_grammar=llm_stages, find_repetitions=llm_stages, split_into_parts=llm_stages,
+                    save_cuts=False, cut_engine=cut_engine, subtitles_mode=subtitles_mode
+                )
+                scheduler = StageScheduler(stages, workers=processor.stage_workers)
+                scheduler.run(file_path=os.path.join(source_dir, "talk.mp4"), language=Language.english,
+                              result_dir=processor.get_result_dir("talk.mp4"))
+                scheduler.print_report()
+                results[run] = {
+                    "wall_seconds": scheduler.wall_time,
+                    "stage_seconds": {timing.name: timing.duration for timing in scheduler.timings},
+                }
+            results["transcription_requests"] = transcription_server.requests
+            results["llm_requests"] = llm_server.requests
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,69 @@
+import json
+import random
+
+from benchmarks.synthetic_media import generate_speech
+from llm.indexed_words import encode_indexed_words
+from llm.prompts import CORRECT_TRANSCRIPTION, CORRECT_WORDS_INDICES, EXTRACT_CUT_INDICES, EXTRACT_TIMESTAMPS, \
+    SPLIT_TRANSCRIPT, SPLIT_TRANSCRIPT_INDICES
+
+
+def benchmark(duration: float = 1200, model: str = "gpt-4", correction_rate: float = 0.05, n_cuts: int = 20) -> dict:
+    """
+    Prompt and answer tokens of the timestamp prompts against their index based variants, for
+    duration seconds of speech. Answers are the expected JSON for the same corrections and cuts.
+    """
+    # Only this benchmark needs tiktoken, the helpers of the module are used without it
+    import tiktoken
+
+    encoding = tiktoken.encoding_for_model(model)
+    transcription = generate_speech(duration)
+    words = transcription.words
+    text = " ".join(word.word for word in words)
+    rng = random.Random(1)
+    corrected = sorted(rng.sample(range(len(words)), int(len(words) * correction_rate)))
+    cuts = sorted(rng.sample(range(len(words) - 5), n_cuts))
+
+    cases = {
+        "correction": (
+            CORRECT_TRANSCRIPTION.format(text=text, mistakes="", language="en_GB", timestamps=transcription),
+            json.dumps([{"start": w.start, "end": w.end, "word": w.word} for w in words]),
+            CORRECT_WORDS_INDICES.format(text=text, mistakes="", language="en_GB",
+                                         indexed_words=encode_indexed_words(transcription)),
+            json.dumps([{"index": i, "word": words[i].word + "."} for i in corrected]),
+        ),
+        "repetitions": (
+            EXTRACT_TIMESTAMPS.format(text=text, repetitions="", language="en_GB", timestamps=transcription),
+            json.dumps([{"cut_start": words[i].start, "cut_end": words[i + 4].end} for i in cuts]),
+            EXTRACT_CUT_INDICES.format(text=text, repetitions="", language="en_GB",
+                                       indexed_words=encode_indexed_words(transcription)),
+            json.dumps([{"first": i, "last": i + 4} for i in cuts]),
+        ),
+        "parts": (
+            SPLIT_TRANSCRIPT.format(text=text, ideas="", language="en_GB", timestamps=transcription),
+            "",
+            SPLIT_TRANSCRIPT_INDICES.format(text=text, ideas="", language="en_GB",
+                                            indexed_words=encode_indexed_words(transcription)),
+            "",
+        ),
+    }
+
+    results = {}
+    print(f"{len(words)} words, {duration / 60:.0f} minutes of speech, {model} tokens:")
+    for name, (prompt, answer, indexed_prompt, indexed_answer) in cases.items():
+        result = {
+            "prompt_tokens": len(encoding.encode(prompt)),
+            "indexed_prompt_tokens": len(encoding.encode(indexed_prompt)),
+            "answer_tokens": len(encoding.encode(answer)),
+            "indexed_answer_tokens": len(encoding.encode(indexed_answer)),
+        }
+        results[name] = result
+        print(
+            f"{name:<12} prompt {result['prompt_tokens']:>7} -> {result['indexed_prompt_tokens']:>7} "
+            f"({result['indexed_prompt_tokens'] / result['prompt_tokens']:.0%}), "
+            f"answer {result['answer_tokens']:>7} -> {result['indexed_answer_tokens']:>7}"
+        )
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,75 @@
+import argparse
+from typing import List, Tuple
+
+from media_archive.media_archive import MediaArchive
+from transcriptions.repetitions import find_repetition_candidates, merge_candidate_cuts
+
+
+def overlap(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    return max(0.0, min(a[1], b[1]) - max(a[0], b[0]))
+
+
+def score(predicted: List[Tuple[float, float]], expected: List[Tuple[float, float]]) -> dict:
+    """
+    Precision and recall of predicted cuts against expected ones, counted per cut (a cut matches
+    when it overlaps any cut of the other list) and per second of cut time.
+    """
+    matched_predicted = sum(any(overlap(p, e) > 0 for e in expected) for p in predicted)
+    matched_expected = sum(any(overlap(e, p) > 0 for p in predicted) for e in expected)
+    overlap_seconds = sum(overlap(p, e) for p in predicted for e in expected)
+    predicted_seconds = sum(end - start for start, end in predicted)
+    expected_seconds = sum(end - start for start, end in expected)
+    return {
+        "predicted": len(predicted),
+        "expected": len(expected),
+        "matched_predicted": matched_predicted,
+        "matched_expected": matched_expected,
+        "overlap_seconds": overlap_seconds,
+        "predicted_seconds": predicted_seconds,
+        "expected_seconds": expected_seconds,
+    }
+
+
+def ratios(counts: dict) -> Tuple[float, float, float, float]:
+    precision = counts["matched_predicted"] / counts["predicted"] if counts["predicted"] else 1.0
+    recall = counts["matched_expected"] / counts["expected"] if counts["expected"] else 1.0
+    time_precision = counts["overlap_seconds"] / counts["predicted_seconds"] if counts["predicted_seconds"] else 1.0
+    time_recall = counts["overlap_seconds"] / counts["expected_seconds"] if counts["expected_seconds"] else 1.0
+    return precision, recall, time_precision, time_recall
+
+
+def evaluate(media_archive: MediaArchive, include_ambiguous: bool = False) -> dict:
+    """
+    Runs the local repetition detector on every archived media with LLM repetition cuts, on the
+    transcription the LLM saw, and scores it against the LLM cuts.
+    """
+    totals = {}
+    for media in media_archive.cache.values():
+        transcription = media.corrected_transcription or media.transcription
+        if media.repetition_segments is None or transcription is None:
+            continue
+        candidates = [
+            candidate for candidate in find_repetition_candidates(transcription)
+            if include_ambiguous or not candidate.ambiguous
+        ]
+        counts = score(merge_candidate_cuts(candidates), [tuple(cut) for cut in media.repetition_segments])
+        for name, value in counts.items():
+            totals[name] = totals.get(name, 0) + value
+        precision, recall, _, _ = ratios(counts)
+        print(f"{media.file_path}: {counts['predicted']} local, {counts['expected']} LLM cuts, "
+              f"precision {precision:.2f}, recall {recall:.2f}")
+
+    if not totals:
+        print("No archived media with LLM repetition cuts.")
+        return {}
+    precision, recall, time_precision, time_recall = ratios(totals)
+    print(f"Total: precision {precision:.2f}, recall {recall:.2f} per cut, "
+          f"precision {time_precision:.2f}, recall {time_recall:.2f} per second of cut time.")
+    return {"precision": precision, "recall": recall, "time_precision": time_precision, "time_recall": time_recall}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local repetition detector against the archived LLM results.")
+    parser.add_argument("--include-ambiguous", action="store_true", help="Count the candidates needing confirmation.")
+    args = parser.parse_args()
+    evaluate(MediaArchive(), include_ambiguous=args.include_ambiguous)
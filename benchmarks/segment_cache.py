@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.subtitles import generate_transcription
+from benchmarks.synthetic_media import generate_cuts, generate_test_video
+from editor.segment_cache import SegmentCache, cached_cut_video
+
+
+def benchmark(duration: float = 120, n_cuts: int = 40, with_subtitles: bool = True) -> dict:
+    """
+    Times a first render through the segment cache, then re-renders after removing one cut and after
+    widening every cut, as a pause_margin change would.
+    """
+    work_dir = tempfile.mkdtemp(prefix="bench_segment_cache_")
+    try:
+        file_path = generate_test_video(os.path.join(work_dir, "source.mp4"), duration=duration)
+        transcription = generate_transcription(duration) if with_subtitles else None
+        cuts = generate_cuts(duration, n_cuts)
+        edits = {
+            "first render": cuts,
+            "same cuts": cuts,
+            "one cut removed": cuts[:n_cuts // 2] + cuts[n_cuts // 2 + 1:],
+            "margin changed": [(start - 0.1, end) for start, end in cuts],
+        }
+
+        results = {}
+        for name, edit_cuts in edits.items():
+            cache = SegmentCache(os.path.join(work_dir, "cache"))
+            start_time = time.perf_counter()
+            cached_cut_video(file_path, os.path.join(work_dir, "out"), edit_cuts, transcription=transcription,
+                             save_cuts=False, cache=cache)
+            elapsed = time.perf_counter() - start_time
+            results[name] = {"seconds": elapsed, **cache.get_stats()}
+            cache.connection.close()
+            print(f"{name}: {elapsed:.2f}s, {results[name]['hit_rate']:.0%} of pieces reused")
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from media_archive.fingerprint import fingerprint_file
+from media_archive.media_archive import Media, MediaArchive
+from transcriptions.objects import Language, TranscribedWord, Transcription
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["moviepy", "langchain_openai", "langchain_core", "pyannote", "torch"]
+
+NO_OP_SCRIPT = f"""
+import json, sys, time
+start_time = time.perf_counter()
+from editor.video_processor import VideoProcessor
+import_seconds = time.perf_counter() - start_time
+from media_archive.media_archive import MediaArchive
+processor = VideoProcessor(
+    media_archive=MediaArchive(cache_file=sys.argv[1]), source_videos_dir=sys.argv[2], result_videos_dir=sys.argv[2]
+)
+processor.process_video(sys.argv[3], correct_grammar=False, find_repetitions=False, split_into_parts=False, render=False)
+print(json.dumps({{
+    "import_seconds": import_seconds,
+    "no_op_seconds": time.perf_counter() - start_time,
+    "heavy_modules_loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def prepare_cached_media(work_dir: str, file_name: str = "cached.mp4", n_words: int = 2000) -> MediaArchive:
+    """ An archive holding every stage needed by a run without grammar correction, repetitions and parts. """
+    file_path = os.path.join(work_dir, file_name)
+    with open(file_path, 'wb') as file:
+        file.write(os.urandom(1 << 20))
+
+    words = [TranscribedWord(word=f"word{i}", start=i * 0.4, end=i * 0.4 + 0.3) for i in range(n_words)]
+    speech_segments = [(i * 10.0, i * 10.0 + 9.0) for i in range(int(n_words * 0.4 / 10) + 1)]
+    pause_segments = [(end, end + 1.0) for _, end in speech_segments]
+
+    archive = MediaArchive(cache_file=os.path.join(work_dir, "cache.json"))
+    archive.add_media(Media(
+        file_path=file_path,
+        transcription_uuid="benchmark",
+        language=Language.english,
+        fingerprint=fingerprint_file(file_path),
+        transcription=Transcription(words=words),
+        speech_segments=speech_segments,
+        pause_segments=pause_segments
+    ))
+    return archive
+
+
+def benchmark(repeats: int = 5) -> dict:
+    """ Wall time of importing editor.video_processor and of a full archive-hit run, in fresh interpreters. """
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as work_dir:
+        archive = prepare_cached_media(work_dir)
+        runs = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            process = subprocess.run(
+                [sys.executable, "-c", NO_OP_SCRIPT, archive.cache_file, work_dir, "cached.mp4"],
+                cwd=REPO_DIR, capture_output=True, text=True, check=True
+            )
+            run = json.loads(process.stdout.strip().splitlines()[-1])
+            run["process_seconds"] = time.perf_counter() - start_time
+            runs.append(run)
+
+    results = {
+        key: min(run[key] for run in runs)
+        for key in ["import_seconds", "no_op_seconds", "process_seconds"]
+    }
+    results["heavy_modules_loaded"] = runs[-1]["heavy_modules_loaded"]
+    print(
+        f"import: {results['import_seconds']:.3f}s, archive-hit run: {results['no_op_seconds']:.3f}s, "
+        f"process: {results['process_seconds']:.3f}s, heavy modules loaded: {results['heavy_modules_loaded']}"
+    )
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
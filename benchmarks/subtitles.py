@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from moviepy.video.VideoClip import VideoClip
+
+from benchmarks.synthetic_media import generate_cuts, generate_test_video
+from editor.cut_media import MOVIEPY_ENGINE, SMART_ENGINE
+from editor.subtitle_render import BURN_SUBTITLES, FRAMES_SUBTITLES, SOFT_SUBTITLES
+from editor.subtitles import PIL_ENGINE, SPRITE_ENGINE, add_subtitles_to_frames
+from transcriptions.objects import TranscribedWord, Transcription
+
+
+def generate_transcription(duration: float, words_per_second: float = 2.5) -> Transcription:
+    n_words = int(duration * words_per_second)
+    step = 1 / words_per_second
+    words = [
+        TranscribedWord(word=f"word{i}", start=i * step, end=i * step + step * 0.8)
+        for i in range(n_words)
+    ]
+    return Transcription(words=words)
+
+
+def benchmark(duration: float = 3600, n_frames: int = 300, fps: int = 30, size=(1920, 1080),
+              engines=(PIL_ENGINE, SPRITE_ENGINE)) -> dict:
+    """ Frames per second of editor.subtitles.add_subtitles_to_frames per engine, without encoding. """
+    width, height = size
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame.flags.writeable = False
+    video = VideoClip(make_frame=lambda t: frame, duration=duration)
+    # Consecutive frames from the middle of the recording, as the encoder would request them
+    timestamps = duration / 2 + np.arange(n_frames) / fps
+
+    results = {}
+    for engine in engines:
+        subbed_video = add_subtitles_to_frames(video, generate_transcription(duration), engine=engine)
+        start_time = time.perf_counter()
+        for t in timestamps:
+            subbed_video.get_frame(t)
+        elapsed = time.perf_counter() - start_time
+        results[engine] = {"fps": n_frames / elapsed}
+        print(f"{engine}: {n_frames / elapsed:.1f} fps at {width}x{height}, {duration}s of subtitles")
+    return results
+
+
+def benchmark_render_modes(duration: float = 60, n_cuts: int = 20,
+                           modes=(FRAMES_SUBTITLES, BURN_SUBTITLES, SOFT_SUBTITLES)) -> dict:
+    """ Times editor.video_processor.process_video with subtitles per subtitles mode on a synthetic recording. """
+    from editor.video_processor import process_video
+
+    work_dir = tempfile.mkdtemp(prefix="bench_subtitles_")
+    try:
+        file_path = generate_test_video(os.path.join(work_dir, "source.mp4"), duration=duration)
+        cuts = generate_cuts(duration, n_cuts)
+        transcription = generate_transcription(duration)
+
+        results = {}
+        for mode in modes:
+            start_time = time.perf_counter()
+            process_video(file_path=file_path, output_dir_path=os.path.join(work_dir, mode), cuts=cuts,
+                          transcription=transcription, save_cuts=False, subtitles_mode=mode,
+                          cut_engine=SMART_ENGINE if mode == SOFT_SUBTITLES else MOVIEPY_ENGINE)
+            elapsed = time.perf_counter() - start_time
+            results[mode] = {"seconds": elapsed, "realtime_factor": duration / elapsed}
+            print(f"{mode}: {elapsed:.2f}s ({duration / elapsed:.1f}x realtime) for {duration}s with {n_cuts} cuts")
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    benchmark()
+    benchmark_render_modes()
@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Sequence
+
+import dotenv
+
+from benchmarks import archive_storage, cut_audio, cut_processing, cut_video, intervals, pipeline, subtitles
+
+dotenv.load_dotenv()
+
+BENCHMARK_RESULTS_DIR = os.getenv("BENCHMARK_RESULTS_DIR", "./data/benchmarks")
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every stage of the pipeline, sized to run in a few minutes altogether
+BENCHMARKS: Dict[str, Callable[[], dict]] = {
+    "subtitle_frames": lambda: subtitles.benchmark(n_frames=120),
+    "cut_video": lambda: {n_cuts: cut_video.benchmark(duration=60, n_cuts=n_cuts) for n_cuts in (10, 40, 160)},
+    "cut_audio": lambda: {n_cuts: cut_audio.benchmark(duration=600, n_cuts=n_cuts) for n_cuts in (10, 100, 1000)},
+    "cut_processing": cut_processing.benchmark,
+    "intervals": lambda: intervals.benchmark(sizes=(1_000, 100_000)),
+    "archive_storage": archive_storage.benchmark,
+    "pipeline": lambda: pipeline.benchmark(duration=60),
+}
+
+
+def get_environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "git_commit": commit or None,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(names: Optional[Sequence[str]] = None, output_path: Optional[str] = None) -> str:
+    """
+    Runs the benchmarks, all of them by default, and writes their results with the environment to a JSON file.
+    A failing benchmark records its error and the others still run.
+    """
+    names = list(names or BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {sorted(unknown)}")
+
+    started = datetime.now(timezone.utc)
+    report = {"started": started.isoformat(), "environment": get_environment(), "results": {}}
+    for name in names:
+        print(f"\n=== {name}")
+        start_time = time.perf_counter()
+        try:
+            result = BENCHMARKS[name]()
+        except Exception as e:
+            traceback.print_exc()
+            result = {"error": f"{type(e).__name__}: {e}"}
+        report["results"][name] = {"total_seconds": time.perf_counter() - start_time, "result": result}
+
+    if output_path is None:
+        os.makedirs(BENCHMARK_RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(BENCHMARK_RESULTS_DIR, f"{started.strftime('%Y%m%dT%H%M%SZ')}.json")
+    with open(output_path, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nBenchmark results written to {output_path}")
+    return output_path
+
+
+def flatten(value, prefix: str = "") -> Dict[str, float]:
+    """ The numeric leaves of nested results, keyed by their slash separated path. """
+    if isinstance(value, dict):
+        leaves = {}
+        for key, item in value.items():
+            leaves.update(flatten(item, f"{prefix}/{key}" if prefix else str(key)))
+        return leaves
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def compare(base_path: str, new_path: str, threshold: float = 1.1) -> Dict[str, float]:
+    """
+    Ratios of the timings of two result files, new over base, for the timings present in both.
+    Prints every timing and flags the ones slower than threshold times the base.
+    """
+    with open(base_path) as file:
+        base = flatten(json.load(file)["results"])
+    with open(new_path) as file:
+        new = flatten(json.load(file)["results"])
+
+    ratios = {}
+    for path in sorted(set(base) & set(new)):
+        if not path.endswith("seconds") or base[path] <= 0:
+            continue
+        ratios[path] = new[path] / base[path]
+        flag = "  SLOWER" if ratios[path] > threshold else ""
+        print(f"{path:<80}{base[path]:>10.3f}s{new[path]:>10.3f}s{ratios[path]:>8.2f}x{flag}")
+    return ratios
+
+
+def test():
+    results = {"cut_audio": {10: {"numpy": {"seconds": 2.0, "realtime_factor": 300.0}}, "ok": True, "name": "x"}}
+    assert flatten(results) == {"cut_audio/10/numpy/seconds": 2.0, "cut_audio/10/numpy/realtime_factor": 300.0}
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for i, seconds in enumerate([2.0, 3.0]):
+            paths.append(os.path.join(temp_dir, f"{i}.json"))
+            with open(paths[-1], "w") as file:
+                json.dump({"results": {"cut_audio": {"10": {"numpy": {"seconds": seconds}}}}}, file)
+        assert compare(paths[0], paths[1]) == {"cut_audio/10/numpy/seconds": 1.5}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and store the results as JSON.")
+    parser.add_argument("benchmarks", nargs="*",
+                        help=f"Benchmarks to run among {', '.join(BENCHMARKS)}, all of them by default.")
+    parser.add_argument("--output", help=f"Result file, by default a timestamped file in {BENCHMARK_RESULTS_DIR}.")
+    parser.add_argument("--compare", metavar="BASE", help="Compare the results of this run with an earlier result file.")
+    args = parser.parse_args()
+
+    output_path = run(args.benchmarks, args.output)
+    if args.compare:
+        compare(args.compare, output_path)
+
+
+if __name__ == '__main__':
+    main()
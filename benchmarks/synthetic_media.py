@@ -0,0 +1,82 @@
+import os
+import random
+from typing import List, Tuple
+
+from editor.ffmpeg_utils import run_ffmpeg
+from transcriptions.objects import TranscribedWord, Transcription
+
+WORDS = ["so", "today", "we", "talk", "about", "the", "new", "editor", "and", "how", "it", "works", "really"]
+
+
+def generate_test_video(file_path: str, duration: float = 60, fps: int = 30, gop: int = 60,
+                        size: str = "1280x720") -> str:
+    """ Writes an H.264/AAC test recording built from ffmpeg lavfi sources. """
+    if os.path.exists(file_path):
+        return file_path
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    run_ffmpeg([
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", str(gop),
+        "-c:a", "aac",
+        "-shortest",
+        file_path
+    ])
+    return file_path
+
+
+def generate_cuts(duration: float, n_cuts: int, min_length: float = 0.2, max_length: float = 1.5,
+                  seed: int = 0) -> List[Tuple[float, float]]:
+    """ Non-overlapping pause-like cuts spread evenly over the recording. """
+    rng = random.Random(seed)
+    slot = duration / n_cuts
+    cuts = []
+    for i in range(n_cuts):
+        length = min(rng.uniform(min_length, max_length), slot / 2)
+        start = i * slot + rng.uniform(0, slot - length)
+        cuts.append((start, start + length))
+    return cuts
+
+
+def generate_test_audio(file_path: str, duration: float = 600, sample_rate: int = 44100) -> str:
+    """ Writes a stereo test recording of two tones, in the format given by the file extension. """
+    if os.path.exists(file_path):
+        return file_path
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    run_ffmpeg([
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate={sample_rate}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=660:sample_rate={sample_rate}:duration={duration}",
+        "-filter_complex", "[0:a][1:a]join=inputs=2:channel_layout=stereo",
+        file_path
+    ])
+    return file_path
+
+
+def generate_speech_video(file_path: str, duration: float = 60, speech: float = 2.0, pause: float = 0.8,
+                          fps: int = 30, size: str = "1280x720") -> str:
+    """ A test recording whose audio alternates speech-like tone bursts and silent pauses, for voice detection. """
+    if os.path.exists(file_path):
+        return file_path
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    run_ffmpeg([
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=48000:duration={duration}",
+        "-af", f"volume=eval=frame:volume='lt(mod(t,{speech + pause}),{speech})'",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        "-shortest",
+        file_path
+    ])
+    return file_path
+
+
+def generate_speech(duration: float, words_per_second: float = 2.5, seed: int = 0) -> Transcription:
+    """ Words with the irregular float timestamps of a real transcription, and a pause every few seconds. """
+    rng = random.Random(seed)
+    words, t = [], 0.0
+    while t < duration:
+        word_duration = rng.uniform(0.15, 0.6)
+        words.append(TranscribedWord(word=rng.choice(WORDS), start=round(t, 3), end=round(t + word_duration, 3)))
+        t += word_duration + (rng.uniform(0.9, 2.0) if rng.random() < 0.08 else rng.uniform(0.0, 0.2))
+        t += max(0.0, 1 / words_per_second - word_duration - 0.1)
+    return Transcription(words=words)
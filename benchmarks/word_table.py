@@ -0,0 +1,80 @@
+import json
+import time
+import tracemalloc
+
+from benchmarks.synthetic_media import WORDS
+from transcriptions.objects import TranscribedWord, Transcription
+from transcriptions.word_table import WordTable
+
+
+def timed(function):
+    start_time = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start_time
+
+
+def measure_memory(function):
+    """ Result of function and the bytes it allocated that are still alive. """
+    tracemalloc.start()
+    result = function()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def benchmark(sizes=(10_000, 100_000, 1_000_000)) -> dict:
+    """
+    Memory, construction, time range slicing, conversion and serialization of a Transcription
+    against a WordTable holding the same words.
+    """
+    results = {}
+    for n_words in sizes:
+        starts = [i * 0.4 for i in range(n_words)]
+        ends = [start + 0.3 for start in starts]
+        words = [WORDS[i % len(WORDS)] for i in range(n_words)]
+        # A 10% window from the middle of the recording
+        window = (starts[n_words // 2], starts[n_words // 2 + n_words // 10])
+
+        transcription, transcription_bytes = measure_memory(lambda: Transcription(
+            words=[TranscribedWord(word=w, start=s, end=e) for w, s, e in zip(words, starts, ends)]
+        ))
+        table, table_bytes = measure_memory(lambda: WordTable.from_columns(starts, ends, words))
+
+        _, build_seconds = timed(lambda: Transcription(
+            words=[TranscribedWord(word=w, start=s, end=e) for w, s, e in zip(words, starts, ends)]
+        ))
+        _, table_build_seconds = timed(lambda: WordTable.from_columns(starts, ends, words))
+        _, slice_seconds = timed(lambda: Transcription(
+            words=[w for w in transcription.words if w.end > window[0] and w.start < window[1]]
+        ))
+        _, table_slice_seconds = timed(lambda: table.between(*window))
+        _, from_seconds = timed(lambda: WordTable.from_transcription(transcription))
+        _, to_seconds = timed(lambda: table.to_transcription())
+        serialized, dump_seconds = timed(lambda: json.dumps(transcription.dict()))
+        _, load_seconds = timed(lambda: Transcription.parse_obj(json.loads(serialized)))
+        table_serialized, table_dump_seconds = timed(lambda: json.dumps(table.to_dict()))
+        _, table_load_seconds = timed(lambda: WordTable.from_dict(json.loads(table_serialized)))
+
+        result = {
+            "memory_mb": transcription_bytes / 2 ** 20, "table_memory_mb": table_bytes / 2 ** 20,
+            "build_seconds": build_seconds, "table_build_seconds": table_build_seconds,
+            "slice_seconds": slice_seconds, "table_slice_seconds": table_slice_seconds,
+            "from_transcription_seconds": from_seconds, "to_transcription_seconds": to_seconds,
+            "json_mb": len(serialized) / 2 ** 20, "table_json_mb": len(table_serialized) / 2 ** 20,
+            "archive_roundtrip_seconds": dump_seconds + load_seconds,
+            "table_archive_roundtrip_seconds": table_dump_seconds + table_load_seconds,
+        }
+        results[n_words] = result
+        print(
+            f"{n_words:>9} words | memory {result['memory_mb']:8.1f} -> {result['table_memory_mb']:6.1f} MB"
+            f" | build {build_seconds:7.3f} -> {table_build_seconds:6.3f}s"
+            f" | slice {slice_seconds:7.4f} -> {table_slice_seconds:6.4f}s"
+            f" | json {result['json_mb']:6.1f} -> {result['table_json_mb']:5.1f} MB,"
+            f" roundtrip {result['archive_roundtrip_seconds']:6.2f} -> {result['table_archive_roundtrip_seconds']:5.2f}s"
+            f" | from/to Transcription {from_seconds:.3f}/{to_seconds:.3f}s"
+        )
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
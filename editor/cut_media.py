@@ -1,37 +1,69 @@
 import os
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
-from moviepy.audio.AudioClip import concatenate_audioclips
-from moviepy.audio.io.AudioFileClip import AudioFileClip
-from moviepy.video.compositing.concatenate import concatenate_videoclips
-from moviepy.video.io.VideoFileClip import VideoFileClip
+from audio_extraction.pcm_audio import AudioBuffer
+from editor.parallel_render import parallel_cut_video
+from editor.pcm_cut import numpy_cut_audio
+from editor.segment_cache import cached_cut_video
+from editor.smart_cut import SmartCutUnsupported, smart_cut_video
+from editor.video_segments_processing import get_frame_segments, get_kept_segments, subclip_frames
+from pipeline.tracing import traced
 
+MOVIEPY_ENGINE = "moviepy"
+SMART_ENGINE = "smart"
+PARALLEL_ENGINE = "parallel"
+CACHED_ENGINE = "cached"
+NUMPY_ENGINE = "numpy"
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi')
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.aac')
 
-def cut_media(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]], save_cuts: bool = True):
+
+def cut_media(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]], save_cuts: bool = True,
+              engine: str = MOVIEPY_ENGINE, audio_buffer: Optional[AudioBuffer] = None):
 
     file_name = os.path.basename(file_path)
     extension = os.path.splitext(file_name)[1].lower()
 
-    if extension in ['.mp4', '.mov', '.avi']:
+    if extension in VIDEO_EXTENSIONS:
         return cut_video(
             file_path=file_path,
             output_dir_path=output_dir_path,
             cuts=cuts,
-            save_cuts=save_cuts
+            save_cuts=save_cuts,
+            engine=engine
         )
 
-    elif extension in ['.mp3', '.wav', '.aac']:
+    elif extension in AUDIO_EXTENSIONS:
         return cut_audio(
             file_path=file_path,
             output_dir_path=output_dir_path,
             cuts=cuts,
-            save_cuts=save_cuts
+            save_cuts=save_cuts,
+            engine=engine,
+            audio_buffer=audio_buffer
         )
     else:
         raise ValueError(f"Unsupported file type: {extension}")
 
 
-def cut_audio(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]], save_cuts: bool = True):
+@traced
+def cut_audio(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]], save_cuts: bool = True,
+              engine: str = MOVIEPY_ENGINE, audio_buffer: Optional[AudioBuffer] = None):
+    """
+    :param engine: "numpy" cuts with sample accuracy from the memory-mapped PCM of the file and crossfades
+        the joins, the video engines cut audio files with moviepy.
+    :param audio_buffer: Already decoded audio of the file, used by the "numpy" engine. The cuts are sliced
+        from it instead of decoding the file again, and written at the buffer's sample rate, so it should be
+        decoded at the source rate rather than the analysis rate of the voice detector. Moviepy streams the
+        file instead, a float copy of the whole buffer would hold the recording in memory.
+    """
+    if engine == NUMPY_ENGINE:
+        return numpy_cut_audio(file_path=file_path, output_dir_path=output_dir_path, cuts=cuts,
+                               save_cuts=save_cuts, audio_buffer=audio_buffer)
+
+    from moviepy.audio.AudioClip import concatenate_audioclips
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+
     # Load the audio file using AudioFileClip
     audio = AudioFileClip(file_path)
     file_name = os.path.basename(file_path)
@@ -43,14 +75,7 @@ def cut_audio(file_path: str, output_dir_path: str, cuts: List[Tuple[float, floa
     cuts_dir = os.path.join(output_dir_path, "cuts")
     os.makedirs(cuts_dir, exist_ok=True)
 
-    audio_cuts = []
-    last_end = 0
-    for start, end in sorted(cuts):
-        if start > last_end:
-            audio_cuts.append(audio.subclip(last_end, start))
-        last_end = end
-    if last_end < audio.duration:
-        audio_cuts.append(audio.subclip(last_end, audio.duration))
+    audio_cuts = [audio.subclip(start, end) for start, end in get_kept_segments(cuts, audio.duration)]
 
     if save_cuts:
         for i, clip in enumerate(audio_cuts):
@@ -68,7 +93,29 @@ def cut_audio(file_path: str, output_dir_path: str, cuts: List[Tuple[float, floa
     return result_audio_file_path
 
 
-def cut_video(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]], save_cuts: bool = True):
+@traced
+def cut_video(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]], save_cuts: bool = True,
+              engine: str = MOVIEPY_ENGINE):
+    """
+    :param engine: "moviepy" decodes and re-encodes every kept frame, "smart" stream-copies the GOPs
+        between cut borders and falls back to "moviepy" when the source can not be smart-cut,
+        "parallel" re-encodes independent chunks of the output across a process pool, "cached" re-encodes
+        only the pieces of the output missing from the segment cache.
+    """
+    if engine == PARALLEL_ENGINE:
+        return parallel_cut_video(file_path=file_path, output_dir_path=output_dir_path, cuts=cuts, save_cuts=save_cuts)
+    elif engine == CACHED_ENGINE:
+        return cached_cut_video(file_path=file_path, output_dir_path=output_dir_path, cuts=cuts, save_cuts=save_cuts)
+    elif engine == SMART_ENGINE:
+        try:
+            return smart_cut_video(file_path=file_path, output_dir_path=output_dir_path, cuts=cuts, save_cuts=save_cuts)
+        except SmartCutUnsupported as e:
+            print(f"Smart cut not possible, falling back to full re-encode: {e}")
+    elif engine != MOVIEPY_ENGINE:
+        raise ValueError(f"Unsupported cut engine: {engine}")
+
+    from moviepy.video.compositing.concatenate import concatenate_videoclips
+    from moviepy.video.io.VideoFileClip import VideoFileClip
 
     video = VideoFileClip(file_path)
     file_name = os.path.basename(file_path)
@@ -79,14 +126,7 @@ def cut_video(file_path: str, output_dir_path: str, cuts: List[Tuple[float, floa
     cuts_dir = os.path.join(output_dir_path, "cuts")
     os.makedirs(cuts_dir, exist_ok=True)
 
-    video_cuts = []
-    last_end = 0
-    for start, end in sorted(cuts):
-        if start > last_end:
-            video_cuts.append(video.subclip(last_end, start))
-        last_end = end
-    if last_end < video.duration:
-        video_cuts.append(video.subclip(last_end, video.duration))
+    video_cuts = subclip_frames(video, get_frame_segments(cuts, video.duration, video.fps))
 
     if save_cuts:
         for i, clip in enumerate(video_cuts):
@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from editor import intervals
+from editor.ffmpeg_utils import probe_video
+from editor.subtitle_files import SRT, export_subtitles
+from editor.subtitles import generate_transcription_subtitles
+from editor.video_segments_processing import get_kept_segments, map_transcription_to_segments
+from media_archive.fingerprint import fingerprint_file
+from transcriptions.objects import Transcription
+
+EDIT_JSON = "json"
+CONCAT = "ffconcat"
+EDL = "edl"
+OTIO = "otio"
+EDIT_FORMATS = (EDIT_JSON, CONCAT, EDL, OTIO)
+
+
+class EditTimeline(BaseModel):
+    """
+    The edit of one source: the kept (start, end) segments in source seconds, joined in order, and the
+    source transcription. Enough to render the result later, on any node that can reach the source.
+    """
+    source_path: str
+    source_fingerprint: Optional[str] = None
+    duration: float
+    fps: float
+    kept_segments: List[Tuple[float, float]]
+    transcription: Optional[Transcription] = None
+    render_options: Dict = {}
+
+    @property
+    def cuts(self) -> List[Tuple[float, float]]:
+        """ The removed ranges, as process_video expects them. """
+        kept = intervals.to_array(self.kept_segments)
+        return intervals.to_list(intervals.complement(kept, 0.0, self.duration))
+
+    @property
+    def output_duration(self) -> float:
+        return sum(end - start for start, end in self.kept_segments)
+
+    def output_transcription(self) -> Optional[Transcription]:
+        """ The transcription on the output timeline. """
+        if self.transcription is None:
+            return None
+        return map_transcription_to_segments(self.transcription, self.kept_segments)
+
+    def save(self, path: str) -> str:
+        with open(path, "w") as file:
+            json.dump(self.dict(), file)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "EditTimeline":
+        with open(path) as file:
+            return cls.parse_obj(json.load(file))
+
+
+def build_timeline(file_path: str, cuts: List[Tuple[float, float]], transcription: Optional[Transcription] = None,
+                   fingerprint: Optional[str] = None, **render_options) -> EditTimeline:
+    infos = probe_video(file_path)
+    return EditTimeline(
+        source_path=os.path.abspath(file_path),
+        source_fingerprint=fingerprint or fingerprint_file(file_path),
+        duration=infos["duration"],
+        fps=infos["video_fps"] if infos["video_found"] else 25.0,
+        kept_segments=get_kept_segments(cuts, infos["duration"]),
+        transcription=transcription,
+        render_options=render_options
+    )
+
+
+def to_concat_script(timeline: EditTimeline) -> str:
+    """
+    ffconcat script playing the kept segments of the source in order, for ffmpeg -f concat -safe 0.
+    The demuxer starts each segment on the keyframe before its inpoint, render_edit cuts exactly.
+    """
+    escaped_path = timeline.source_path.replace("'", "'\\''")
+    lines = ["ffconcat version 1.0"]
+    for start, end in timeline.kept_segments:
+        lines += [f"file '{escaped_path}'", f"inpoint {start:.6f}", f"outpoint {end:.6f}"]
+    return "\n".join(lines) + "\n"
+
+
+def to_timecode(frames: int, fps: int) -> str:
+    """ Non drop frame SMPTE timecode HH:MM:SS:FF. """
+    seconds, frame = divmod(frames, fps)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return f"{hour:02d}:{minute:02d}:{second:02d}:{frame:02d}"
+
+
+def to_cmx3600(timeline: EditTimeline, title: Optional[str] = None) -> str:
+    """
+    CMX3600 EDL with one cut event per kept segment, on video and the first audio track. Timecodes are
+    non drop frame at the rounded frame rate, record times are counted from the frames of the sources.
+    """
+    fps = max(int(round(timeline.fps)), 1)
+    clip_name = os.path.basename(timeline.source_path)
+    reel = "AX"
+    lines = [f"TITLE: {title or os.path.splitext(clip_name)[0]}", "FCM: NON-DROP FRAME", ""]
+    record_frames = 0
+    for event, (start, end) in enumerate(timeline.kept_segments, start=1):
+        source_in, source_out = int(round(start * fps)), int(round(end * fps))
+        record_in, record_out = record_frames, record_frames + source_out - source_in
+        record_frames = record_out
+        lines.append(
+            f"{event:03d}  {reel:<8} AA/V  C        {to_timecode(source_in, fps)} {to_timecode(source_out, fps)} "
+            f"{to_timecode(record_in, fps)} {to_timecode(record_out, fps)}"
+        )
+        lines += [f"* FROM CLIP NAME: {clip_name}", ""]
+    return "\n".join(lines)
+
+
+def rational_time(seconds: float, rate: float) -> dict:
+    return {"OTIO_SCHEMA": "RationalTime.1", "rate": rate, "value": round(seconds * rate, 6)}
+
+
+def time_range(start: float, duration: float, rate: float) -> dict:
+    return {"OTIO_SCHEMA": "TimeRange.1", "start_time": rational_time(start, rate),
+            "duration": rational_time(duration, rate)}
+
+
+def to_otio(timeline: EditTimeline, name: Optional[str] = None) -> dict:
+    """
+    OpenTimelineIO timeline (JSON serialization, no dependency on the library): a video and an audio
+    track of clips referencing the source, with the subtitles as markers on the video track.
+    """
+    rate = timeline.fps
+    clip_name = os.path.basename(timeline.source_path)
+    media_reference = {
+        "OTIO_SCHEMA": "ExternalReference.1",
+        "metadata": {"fingerprint": timeline.source_fingerprint},
+        "name": clip_name,
+        "available_range": time_range(0.0, timeline.duration, rate),
+        "target_url": timeline.source_path,
+    }
+
+    def clips():
+        return [{
+            "OTIO_SCHEMA": "Clip.2",
+            "metadata": {},
+            "name": f"{clip_name} {i}",
+            "source_range": time_range(start, end - start, rate),
+            "effects": [],
+            "markers": [],
+            "enabled": True,
+            "media_references": {"DEFAULT_MEDIA": media_reference},
+            "active_media_reference_key": "DEFAULT_MEDIA",
+        } for i, (start, end) in enumerate(timeline.kept_segments)]
+
+    output_transcription = timeline.output_transcription()
+    subtitles = generate_transcription_subtitles(output_transcription) if output_transcription is not None else []
+    markers = [{
+        "OTIO_SCHEMA": "Marker.2",
+        "metadata": {"type": "subtitle"},
+        "name": subtitle.word,
+        "color": "YELLOW",
+        "marked_range": time_range(subtitle.start, subtitle.end - subtitle.start, rate),
+        "comment": subtitle.word,
+    } for subtitle in subtitles]
+
+    def track(kind, track_markers):
+        return {"OTIO_SCHEMA": "Track.1", "metadata": {}, "name": kind, "source_range": None, "effects": [],
+                "markers": track_markers, "enabled": True, "children": clips(), "kind": kind}
+
+    return {
+        "OTIO_SCHEMA": "Timeline.1",
+        "metadata": {"render_options": timeline.render_options},
+        "name": name or os.path.splitext(clip_name)[0],
+        "global_start_time": None,
+        "tracks": {
+            "OTIO_SCHEMA": "Stack.1", "metadata": {}, "name": "tracks", "source_range": None, "effects": [],
+            "markers": [], "enabled": True,
+            "children": [track("Video", markers), track("Audio", [])],
+        },
+    }
+
+
+def export_edit(timeline: EditTimeline, output_dir_path: str, formats: Sequence[str] = EDIT_FORMATS) -> Dict[str, str]:
+    """
+    Writes the edit as edit_<name>.<format> files: the json job consumed by render_edit, the ffmpeg concat
+    script, the CMX3600 EDL and the OpenTimelineIO timeline, plus the SRT subtitles of the output timeline.
+    """
+    os.makedirs(output_dir_path, exist_ok=True)
+    base_path = os.path.join(output_dir_path, f"edit_{os.path.splitext(os.path.basename(timeline.source_path))[0]}")
+    paths = {}
+    for edit_format in formats:
+        path = f"{base_path}.{edit_format}"
+        if edit_format == EDIT_JSON:
+            timeline.save(path)
+        elif edit_format in (CONCAT, EDL):
+            with open(path, "w") as file:
+                file.write(to_concat_script(timeline) if edit_format == CONCAT else to_cmx3600(timeline))
+        elif edit_format == OTIO:
+            with open(path, "w") as file:
+                json.dump(to_otio(timeline), file, indent=2)
+        else:
+            raise ValueError(f"Unsupported edit format: {edit_format}")
+        paths[edit_format] = path
+
+    if timeline.transcription is not None:
+        paths[SRT] = export_subtitles(timeline.output_transcription(), f"{base_path}.mp4", (SRT,))[0]
+    print(f"Exported edit of {len(timeline.kept_segments)} segments: {sorted(paths.values())}")
+    return paths
+
+
+def resolve_source(timeline: EditTimeline, source_dir: Optional[str] = None) -> str:
+    """ The source file of the edit, looked up by name in source_dir when the recorded path does not exist. """
+    source_path = timeline.source_path
+    if not os.path.exists(source_path) and source_dir is not None:
+        source_path = os.path.join(source_dir, os.path.basename(timeline.source_path))
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Source of the edit not found: {timeline.source_path}")
+    if timeline.source_fingerprint is not None and fingerprint_file(source_path) != timeline.source_fingerprint:
+        raise ValueError(f"{source_path} is not the source the edit was made for.")
+    return source_path
+
+
+def render_edit(edit_path: str, output_dir_path: Optional[str] = None, source_dir: Optional[str] = None,
+                **render_options) -> str:
+    """
+    Renders an exported json edit through process_video, with the render options recorded in the edit
+    overridden by the given ones. The analysis that produced the edit is not needed.
+    """
+    from editor.video_processor import process_video
+
+    timeline = EditTimeline.load(edit_path)
+    source_path = resolve_source(timeline, source_dir)
+    options = {**timeline.render_options, **render_options}
+    if timeline.transcription is None:
+        options["generate_subtitles"] = False
+    return process_video(
+        file_path=source_path,
+        output_dir_path=output_dir_path or os.path.dirname(os.path.abspath(edit_path)),
+        cuts=timeline.cuts,
+        transcription=timeline.transcription,
+        **options
+    )
+
+
+def test():
+    from transcriptions.objects import TranscribedWord
+
+    timeline = EditTimeline(
+        source_path="/videos/talk.mp4", duration=10.0, fps=25.0,
+        kept_segments=[(0.0, 2.0), (3.0, 4.5), (6.0, 10.0)],
+        transcription=Transcription(words=[TranscribedWord(word="hi", start=3.2, end=3.6)])
+    )
+    assert timeline.cuts == [(2.0, 3.0), (4.5, 6.0)]
+    assert EditTimeline.parse_obj(json.loads(json.dumps(timeline.dict()))) == timeline
+    assert to_timecode(3 * 3600 * 25 + 61 * 25 + 7, 25) == "03:01:01:07"
+
+    edl = to_cmx3600(timeline)
+    assert "002  AX       AA/V  C        00:00:03:00 00:00:04:12 00:00:02:00 00:00:03:12" in edl
+    assert to_concat_script(timeline).count("inpoint") == 3
+
+    otio = to_otio(timeline)
+    video, audio = otio["tracks"]["children"]
+    assert [clip["source_range"]["start_time"]["value"] for clip in video["children"]] == [0, 75, 150]
+    assert video["markers"][0]["marked_range"]["start_time"]["value"] == 55.0
+    print(edl)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render exported json edits.")
+    parser.add_argument("edits", nargs="+", help="edit_<name>.json files written by export_edit.")
+    parser.add_argument("--output-dir", help="By default, next to each edit.")
+    parser.add_argument("--source-dir", help="Where to find the sources when their recorded path does not exist.")
+    args = parser.parse_args()
+    for edit_path in args.edits:
+        print(render_edit(edit_path, output_dir_path=args.output_dir, source_dir=args.source_dir))
+
+
+if __name__ == '__main__':
+    main()
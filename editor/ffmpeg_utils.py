@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import subprocess
+from fractions import Fraction
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+
+
+class FFmpegError(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def get_ffmpeg_binary() -> str:
+    """ The ffmpeg binary moviepy is configured with, resolved on first use since moviepy.config runs it. """
+    from moviepy.config import get_setting
+    return get_setting("FFMPEG_BINARY")
+
+
+def run_ffmpeg(args: List[str]):
+    command = [get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error"] + args
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise FFmpegError(f"ffmpeg failed ({' '.join(command)}): {process.stderr.strip()}")
+
+
+def count_frames(file_path: str) -> int:
+    """ Frames of the first video stream, counted by decoding it, where probe_video only estimates them. """
+    command = [get_ffmpeg_binary(), "-hide_banner", "-i", file_path, "-map", "0:v:0", "-f", "null", "-"]
+    process = subprocess.run(command, capture_output=True, text=True)
+    frames = re.findall(r"frame=\s*(\d+)", process.stderr)
+    if process.returncode != 0 or not frames:
+        raise FFmpegError(f"ffmpeg failed ({' '.join(command)}): {process.stderr.strip()}")
+    return int(frames[-1])
+
+
+def run_ffprobe(args: List[str]) -> dict:
+    command = [FFPROBE_BINARY, "-v", "error", "-of", "json"] + args
+    try:
+        process = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError as e:
+        raise FFmpegError(f"ffprobe binary not found: {FFPROBE_BINARY}") from e
+    if process.returncode != 0:
+        raise FFmpegError(f"ffprobe failed ({' '.join(command)}): {process.stderr.strip()}")
+    return json.loads(process.stdout)
+
+
+def probe_video_stream(file_path: str) -> dict:
+    """
+    Returns the parameters of the first video stream, plus the container duration and
+    whether the file has an audio stream.
+    """
+    data = run_ffprobe([
+        "-show_entries",
+        "stream=codec_type,codec_name,profile,level,pix_fmt,width,height,r_frame_rate,time_base,has_b_frames,refs,"
+        "sample_aspect_ratio,color_range,color_space,color_transfer,color_primaries:format=duration",
+        file_path
+    ])
+    video_streams = [stream for stream in data.get("streams", []) if stream.get("codec_type") == "video"]
+    if not video_streams:
+        raise FFmpegError(f"No video stream found in {file_path}")
+
+    stream = video_streams[0]
+    stream["fps"] = Fraction(stream["r_frame_rate"])
+    stream["duration"] = float(data["format"]["duration"])
+    stream["has_audio"] = any(s.get("codec_type") == "audio" for s in data["streams"])
+    return stream
+
+
+def probe_video(file_path: str) -> dict:
+    """
+    Duration, size, fps and audio presence from the ffmpeg header parse moviepy does, without decoding
+    frames. Works without ffprobe.
+    """
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    return ffmpeg_parse_infos(file_path)
+
+
+def probe_keyframes(file_path: str) -> List[float]:
+    """ Presentation timestamps (seconds) of the video keyframes, read from packet flags without decoding. """
+    data = run_ffprobe([
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        file_path
+    ])
+    keyframes = [
+        float(packet["pts_time"])
+        for packet in data.get("packets", [])
+        if "K" in packet.get("flags", "") and packet.get("pts_time", "N/A") != "N/A"
+    ]
+    return sorted(keyframes)
+
+
+def render_audio(file_path: str, segments: List[Tuple[float, float]], audio_path: str):
+    """ Renders the audio of the given (start, end) segments, back to back, in one pass. """
+    selection = "+".join(f"between(t,{start:.6f},{end:.6f})" for start, end in segments)
+    run_ffmpeg([
+        "-i", file_path,
+        "-vn",
+        "-af", f"aselect='{selection}',asetpts=N/SR/TB",
+        "-c:a", "aac",
+        audio_path
+    ])
+
+
+def write_concat_list(file_paths: List[str], list_path: str):
+    with open(list_path, "w") as file:
+        for path in file_paths:
+            escaped_path = os.path.abspath(path).replace("'", "'\\''")
+            file.write(f"file '{escaped_path}'\n")
+
+
+def concat_files(file_paths: List[str], output_path: str, audio_path: Optional[str] = None):
+    """ Joins files with identical stream parameters through the concat demuxer, without re-encoding. """
+    list_path = f"{output_path}.concat.txt"
+    write_concat_list(file_paths, list_path)
+
+    args = ["-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path is not None:
+        args += ["-i", audio_path, "-map", "0:v", "-map", "1:a"]
+    args += ["-c", "copy", output_path]
+
+    try:
+        run_ffmpeg(args)
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+def escape_filter_path(path: str) -> str:
+    """ A path quoted as a filter option value inside a -vf filter graph. """
+    return "'" + path.replace("\\", "/").replace("'", r"'\\\''").replace(":", r"\:") + "'"
+
+
+def cut_and_burn_subtitles(file_path: str, segments: List[Tuple[float, float]], subtitles_path: str,
+                           output_path: str, fps: float, has_audio: bool = True, fonts_dir: Optional[str] = None):
+    """
+    Keeps the given (start, end) segments and draws the subtitles with libass in a single ffmpeg pass.
+    The subtitle timings must already be on the output timeline.
+    """
+    selection = "+".join(f"between(t,{start:.6f},{end:.6f})" for start, end in segments)
+    # Shifted by half a frame, so a frame on a frame-snapped border is kept by one segment and not both
+    frame_selection = "+".join(f"between(t,{start - 0.5 / fps:.6f},{end - 0.5 / fps:.6f})" for start, end in segments)
+    subtitles_filter = f"subtitles=filename={escape_filter_path(os.path.abspath(subtitles_path))}"
+    if fonts_dir is not None:
+        subtitles_filter += f":fontsdir={escape_filter_path(os.path.abspath(fonts_dir))}"
+
+    args = ["-i", file_path, "-vf", f"select='{frame_selection}',setpts=N/FRAME_RATE/TB,{subtitles_filter}",
+            "-r", str(fps), "-c:v", "libx264"]
+    if has_audio:
+        args += ["-af", f"aselect='{selection}',asetpts=N/SR/TB", "-c:a", "aac"]
+    else:
+        args += ["-an"]
+    run_ffmpeg(args + [output_path])
+    return output_path
+
+
+# Subtitle codecs that can be stream-copied next to the video, by container
+SUBTITLE_CODECS = {".mp4": "mov_text", ".mov": "mov_text", ".m4v": "mov_text", ".mkv": "ass", ".webm": "webvtt"}
+
+
+def mux_subtitles(video_path: str, subtitles_path: str, output_path: str):
+    """ Adds the subtitles as a soft track, copying the video and audio streams without re-encoding. """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in SUBTITLE_CODECS:
+        raise FFmpegError(f"Can not mux subtitles into {extension} files")
+
+    args = ["-i", video_path, "-i", subtitles_path, "-map", "0:v", "-map", "0:a?", "-map", "1:s",
+            "-c", "copy", "-c:s", SUBTITLE_CODECS[extension], output_path]
+    run_ffmpeg(args)
+    return output_path
+
+
+def encode_pcm(chunks: Iterable[np.ndarray], sample_rate: int, channels: int, output_path: str, codec_args=()):
+    """
+    Encodes 16-bit PCM chunks of shape (samples, channels) into output_path in one streaming pass,
+    piping them into ffmpeg as they are produced.
+    """
+    command = [get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error",
+               "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+               *codec_args, output_path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for chunk in chunks:
+            process.stdin.write(np.ascontiguousarray(chunk, dtype="<i2").data)
+    except BrokenPipeError:
+        pass
+    finally:
+        process.stdin.close()
+    stderr = process.stderr.read().decode(errors="replace")
+    if process.wait() != 0:
+        raise FFmpegError(f"ffmpeg failed ({' '.join(command)}): {stderr.strip()}")
+    return output_path
@@ -0,0 +1,123 @@
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+Intervals = np.ndarray
+
+
+def to_array(intervals: Iterable[Tuple[float, float]]) -> Intervals:
+    """ (n, 2) float array of (start, end) rows. """
+    array = np.asarray(list(intervals) if not isinstance(intervals, np.ndarray) else intervals, dtype=np.float64)
+    return array.reshape(-1, 2)
+
+
+def to_list(intervals: Intervals) -> List[Tuple[float, float]]:
+    return [(start, end) for start, end in intervals.tolist()]
+
+
+def sort(intervals: Intervals) -> Intervals:
+    return intervals[np.argsort(intervals[:, 0], kind="stable")]
+
+
+def union(intervals: Intervals, gap: float = 0.0) -> Intervals:
+    """
+    Sorted disjoint intervals covering the given ones. Intervals closer than gap are joined too,
+    so with gap > 0 touching intervals are merged as well.
+    """
+    if len(intervals) == 0:
+        return intervals.reshape(0, 2)
+    intervals = sort(intervals)
+    starts, ends = intervals[:, 0], intervals[:, 1]
+    covered_until = np.maximum.accumulate(ends)
+    first = np.ones(len(intervals), dtype=bool)
+    first[1:] = starts[1:] >= covered_until[:-1] + gap if gap > 0 else starts[1:] > covered_until[:-1]
+    group_starts = np.flatnonzero(first)
+    return np.column_stack([starts[group_starts], np.maximum.reduceat(ends, group_starts)])
+
+
+def complement(intervals: Intervals, start: float, end: float) -> Intervals:
+    """ The parts of (start, end) not covered by the intervals, without empty ones. """
+    covered = union(intervals)
+    covered = covered[(covered[:, 1] > start) & (covered[:, 0] < end)]
+    gap_starts = np.concatenate([[start], np.minimum(covered[:, 1], end)])
+    gap_ends = np.concatenate([np.maximum(covered[:, 0], start), [end]])
+    gaps = np.column_stack([gap_starts, gap_ends])
+    return gaps[gaps[:, 1] > gaps[:, 0]]
+
+
+def pad(intervals: Intervals, before: float, after: float) -> Intervals:
+    """ Moves the starts earlier by before and the ends later by after, negative values shrink. """
+    return intervals + np.array([-before, after])
+
+
+def filter_min_duration(intervals: Intervals, min_duration: float = 0.0) -> Intervals:
+    """ Drops the intervals shorter than min_duration, and always the empty or inverted ones. """
+    durations = intervals[:, 1] - intervals[:, 0]
+    return intervals[(durations > 0) & (durations >= min_duration)]
+
+
+def assign(times: np.ndarray, intervals: Intervals) -> np.ndarray:
+    """
+    Index of the first of the sorted disjoint intervals ending at or after each time. Times after
+    the last interval are assigned to it.
+    """
+    if len(intervals) == 0:
+        return np.full(len(times), -1, dtype=np.int64)
+    return np.minimum(np.searchsorted(intervals[:, 1], times, side="left"), len(intervals) - 1)
+
+
+def containing(times: np.ndarray, intervals: Intervals) -> np.ndarray:
+    """ Index of the first of the sorted disjoint intervals containing each time (ends included), or -1. """
+    index = assign(times, intervals)
+    if len(intervals) == 0:
+        return index
+    inside = (intervals[index, 0] <= times) & (times <= intervals[index, 1])
+    return np.where(inside, index, -1)
+
+
+def test(n_trials: int = 300, seed: int = 0):
+    """ Property checks against a brute force evaluation on a fine grid. """
+    rng = np.random.default_rng(seed)
+    grid = np.linspace(0, 100, 20001)[:-1] + 0.0025
+
+    def covered(intervals):
+        mask = np.zeros(len(grid), dtype=bool)
+        for start, end in intervals:
+            mask |= (grid >= start) & (grid < end)
+        return mask
+
+    for _ in range(n_trials):
+        n = int(rng.integers(0, 30))
+        starts = np.round(rng.uniform(0, 95, n), 2)
+        intervals = np.column_stack([starts, starts + np.round(rng.uniform(0, 8, n), 2)])
+
+        merged = union(intervals)
+        assert np.array_equal(covered(merged), covered(intervals))
+        assert np.all(merged[1:, 0] > merged[:-1, 1]), "union is not sorted and disjoint"
+        assert np.array_equal(union(merged), merged), "union is not idempotent"
+        assert np.all(union(intervals, gap=0.5)[1:, 0] >= union(intervals, gap=0.5)[:-1, 1] + 0.5)
+
+        gaps = complement(intervals, 0.0, 100.0)
+        assert np.array_equal(covered(gaps), ~covered(intervals))
+        assert np.all(gaps[:, 1] > gaps[:, 0])
+        assert np.array_equal(covered(complement(gaps, 0.0, 100.0)), covered(merged))
+
+        shrunk = filter_min_duration(pad(intervals, -0.5, -0.5))
+        assert np.all(shrunk[:, 1] - shrunk[:, 0] > 0)
+        assert np.all(covered(shrunk) <= covered(intervals))
+
+        times = rng.uniform(0, 110, 50)
+        index = containing(times, merged)
+        for t, i in zip(times, index):
+            inside = [j for j, (start, end) in enumerate(merged) if start <= t <= end]
+            assert i == (inside[0] if inside else -1)
+        if len(merged):
+            assigned = assign(times, merged)
+            for t, i in zip(times, assigned):
+                later = [j for j, (_, end) in enumerate(merged) if end >= t]
+                assert i == (later[0] if later else len(merged) - 1)
+    print(f"{n_trials} random interval sets checked.")
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,205 @@
+import bisect
+import itertools
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+
+import dotenv
+
+from editor.ffmpeg_utils import FFmpegError, concat_files, probe_keyframes, render_audio
+from editor.subtitles import add_subtitles_to_frames, generate_transcription_subtitles, shift_subtitles
+from editor.video_segments_processing import get_frame_segments, get_kept_segments, map_transcription_to_segments, \
+    snap_to_frames, subclip_frames
+from pipeline.tracing import traced
+from transcriptions.objects import TranscribedWord, Transcription
+
+dotenv.load_dotenv()
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_CHUNK_SIZE = float(os.getenv("RENDER_CHUNK_SIZE", 30.0))
+
+
+class RenderChunk(NamedTuple):
+    segment_index: int
+    start: float
+    end: float
+
+
+def split_segment(start: float, end: float, chunk_size: float, keyframes: List[float]) -> List[Tuple[float, float]]:
+    """ Splits a segment into chunks of about chunk_size seconds, preferring keyframes as chunk borders. """
+    borders = [start]
+    while end - borders[-1] > chunk_size * 1.5:
+        target = borders[-1] + chunk_size
+        border = target
+        if keyframes:
+            index = bisect.bisect_left(keyframes, target)
+            candidates = [keyframes[i] for i in (index - 1, index) if 0 <= i < len(keyframes)]
+            candidates = [k for k in candidates if borders[-1] + chunk_size / 2 <= k <= end - chunk_size / 2]
+            if candidates:
+                border = min(candidates, key=lambda k: abs(k - target))
+        borders.append(border)
+    borders.append(end)
+    return list(zip(borders[:-1], borders[1:]))
+
+
+def plan_chunks(kept_segments: List[Tuple[float, float]], chunk_size: float, fps: float,
+                keyframes: Optional[List[float]] = None) -> List[RenderChunk]:
+    """ Independent render chunks, split at cut borders and at (preferably) keyframes inside long segments. """
+    chunks = []
+    for segment_index, (start, end) in enumerate(kept_segments):
+        for chunk_start, chunk_end in snap_to_frames(split_segment(start, end, chunk_size, keyframes or []), fps):
+            chunks.append(RenderChunk(segment_index, chunk_start, chunk_end))
+    return chunks
+
+
+def plan_chunk_subtitles(transcription: Transcription, kept_segments: List[Tuple[float, float]],
+                         chunks: List[RenderChunk], save_cuts: bool) -> List[List[TranscribedWord]]:
+    """
+    The subtitles of every chunk on its own timeline. Words are grouped once on the timeline of the
+    output, or of every kept segment with save_cuts, as the serial render does, then sliced per chunk,
+    so chunk borders never split a subtitle group.
+    """
+    if save_cuts:
+        segment_subtitles = [
+            generate_transcription_subtitles(map_transcription_to_segments(transcription, [segment]))
+            for segment in kept_segments
+        ]
+        segment_offsets = [0.0] * len(kept_segments)
+    else:
+        segment_subtitles = [generate_transcription_subtitles(
+            map_transcription_to_segments(transcription, kept_segments)
+        )] * len(kept_segments)
+        segment_offsets = list(itertools.accumulate([0.0] + [end - start for start, end in kept_segments[:-1]]))
+
+    chunk_subtitles = []
+    for chunk in chunks:
+        # Time of the chunk start on the timeline its subtitles were grouped on
+        offset = segment_offsets[chunk.segment_index] + chunk.start - kept_segments[chunk.segment_index][0]
+        chunk_subtitles.append(
+            shift_subtitles(segment_subtitles[chunk.segment_index], offset, offset + chunk.end - chunk.start)
+        )
+    return chunk_subtitles
+
+
+def render_chunk(file_path: str, chunk: RenderChunk, chunk_path: str, subtitles: Optional[List[TranscribedWord]],
+                 threads: int) -> str:
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+    video = VideoFileClip(file_path, audio=False)
+    (clip,) = subclip_frames(video, [(chunk.start, chunk.end)])
+    if subtitles is not None:
+        clip = add_subtitles_to_frames(video=clip, transcription=None, subtitles=subtitles)
+    clip.write_videofile(chunk_path, codec="libx264", audio=False, threads=threads, logger=None)
+    clip.close()
+    video.close()
+    return chunk_path
+
+
+@traced
+def parallel_cut_video(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]],
+                       transcription: Optional[Transcription] = None, save_cuts: bool = True,
+                       workers: int = RENDER_WORKERS, chunk_size: float = RENDER_CHUNK_SIZE):
+    """
+    Renders the kept segments as independent chunks in a process pool, burning the subtitles of each
+    chunk when a transcription is given, then joins the chunks without re-encoding. Audio is rendered
+    once for the whole timeline, so chunk joins never introduce audio gaps.
+    """
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+    video = VideoFileClip(file_path)
+    fps, duration, has_audio = video.fps, video.duration, video.audio is not None
+    video.close()
+
+    file_name = os.path.basename(file_path)
+    result_video_file_path = os.path.join(output_dir_path, f"cut_{file_name}")
+    cuts_dir = os.path.join(output_dir_path, "cuts")
+    os.makedirs(cuts_dir, exist_ok=True)
+
+    try:
+        keyframes = probe_keyframes(file_path)
+    except FFmpegError as e:
+        print(f"Keyframes not available, splitting chunks evenly: {e}")
+        keyframes = []
+
+    kept_segments = get_frame_segments(cuts, duration, fps)
+    chunks = plan_chunks(kept_segments, chunk_size, fps, keyframes)
+    chunk_subtitles = [None] * len(chunks)
+    if transcription is not None:
+        chunk_subtitles = plan_chunk_subtitles(transcription, kept_segments, chunks, save_cuts)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Rendering {len(chunks)} chunks with {workers} workers.")
+
+    with tempfile.TemporaryDirectory(dir=output_dir_path) as work_dir:
+        chunk_paths = [os.path.join(work_dir, f"chunk_{i}.mp4") for i in range(len(chunks))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(render_chunk, file_path, chunk, chunk_path, subtitles, threads)
+                for chunk, chunk_path, subtitles in zip(chunks, chunk_paths, chunk_subtitles)
+            ]
+            for future in futures:
+                future.result()
+
+        if save_cuts:
+            groups = [
+                ([path for chunk, path in zip(chunks, chunk_paths) if chunk.segment_index == i], [segment],
+                 os.path.join(cuts_dir, f"{i}_{file_name}"))
+                for i, segment in enumerate(kept_segments)
+            ]
+        else:
+            groups = [(chunk_paths, kept_segments, result_video_file_path)]
+
+        for group_chunk_paths, segments, output_path in groups:
+            audio_path = None
+            if has_audio:
+                audio_path = os.path.join(work_dir, f"audio_{os.path.basename(output_path)}.m4a")
+                render_audio(file_path, segments, audio_path)
+            concat_files(group_chunk_paths, output_path, audio_path=audio_path)
+
+    return result_video_file_path
+
+
+def test():
+    from benchmarks.synthetic_media import generate_cuts, generate_test_video
+    from editor.ffmpeg_utils import count_frames
+    from editor.video_processor import cut_video_with_subtitles
+
+    transcription = Transcription(words=[
+        TranscribedWord(word=f"w{i}", start=i * 0.3, end=i * 0.3 + 0.25) for i in range(26)
+    ])
+    cuts = [(1.0, 2.0), (5.0, 5.5)]
+    kept_segments = get_kept_segments(cuts, 8.0)
+    chunks = plan_chunks(kept_segments, chunk_size=1.0, fps=10)
+    assert len(chunks) > len(kept_segments)
+
+    # Moved back onto the output timeline, the chunk subtitles are the groups of the serial render
+    serial_subtitles = generate_transcription_subtitles(map_transcription_to_segments(transcription, kept_segments))
+    rebuilt, offset = set(), 0.0
+    for chunk, subtitles in zip(chunks, plan_chunk_subtitles(transcription, kept_segments, chunks, save_cuts=False)):
+        rebuilt.update((s.word, round(s.start + offset, 6), round(s.end + offset, 6)) for s in subtitles)
+        offset += chunk.end - chunk.start
+    assert rebuilt == {(s.word, round(s.start, 6), round(s.end, 6)) for s in serial_subtitles}, rebuilt
+
+    # Many short segments with borders between frames, where unsnapped renders drift apart by a frame per cut
+    many_cuts = generate_cuts(8.0, 16, min_length=0.12, max_length=0.27, seed=1)
+    assert len(get_frame_segments(many_cuts, 8.0, 10)) >= 15
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = generate_test_video(os.path.join(temp_dir, "source", "talk.mp4"), duration=8, fps=10, gop=10,
+                                        size="640x480")
+        for i, render_cuts in enumerate([cuts, many_cuts]):
+            serial_dir, parallel_dir = os.path.join(temp_dir, f"serial_{i}"), os.path.join(temp_dir, f"parallel_{i}")
+            os.makedirs(serial_dir)
+            os.makedirs(parallel_dir)
+            serial_path = cut_video_with_subtitles(file_path, serial_dir, render_cuts, transcription, save_cuts=False)
+            parallel_path = parallel_cut_video(file_path, parallel_dir, render_cuts, transcription, save_cuts=False,
+                                               workers=2, chunk_size=1.0)
+            serial_frames, parallel_frames = count_frames(serial_path), count_frames(parallel_path)
+            expected_frames = round(sum(end - start for start, end in get_frame_segments(render_cuts, 8.0, 10)) * 10)
+            assert abs(serial_frames - parallel_frames) <= 1, (serial_frames, parallel_frames)
+            assert abs(serial_frames - expected_frames) <= 1, (serial_frames, expected_frames)
+            print(f"{len(render_cuts)} cuts, frames {serial_frames}/{parallel_frames} of {expected_frames}")
+    print(f"{len(chunks)} chunks, {len(serial_subtitles)} subtitles")
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,124 @@
+import os
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from audio_extraction.pcm_audio import AudioBuffer, AudioExtractor, write_wav
+from editor import intervals
+from editor.ffmpeg_utils import encode_pcm
+from editor.video_segments_processing import get_kept_segments
+from pipeline.tracing import traced
+
+# Layout moviepy writes audio files with
+SAMPLE_RATE = 44100
+CHANNELS = 2
+# Length of the equal-power crossfade centered on each join, in seconds
+CROSSFADE = 0.01
+
+
+def to_sample_bounds(segments: List[Tuple[float, float]], sample_rate: int, n_samples: int) -> np.ndarray:
+    """ (start, end) seconds as an int64 (n, 2) array of sample indices, without the segments shorter than a sample. """
+    bounds = np.clip(np.round(intervals.to_array(segments) * sample_rate), 0, n_samples).astype(np.int64)
+    return bounds[bounds[:, 1] > bounds[:, 0]]
+
+
+def join_overlaps(bounds: np.ndarray, crossfade_samples: int) -> np.ndarray:
+    """
+    Half length of the crossfade at each join, in samples. The crossfade reads that far into the cut
+    region on both sides of the join. It is shortened to half of the segments around the join, which
+    keeps the joins of a segment from overlapping.
+    """
+    lengths = bounds[:, 1] - bounds[:, 0]
+    halves = np.minimum(np.minimum(lengths[:-1], lengths[1:]) // 2, crossfade_samples // 2)
+    # Segments that touch after rounding already play continuously
+    halves[bounds[1:, 0] == bounds[:-1, 1]] = 0
+    return halves
+
+
+def crossfade(outgoing: np.ndarray, incoming: np.ndarray) -> np.ndarray:
+    t = ((np.arange(len(outgoing)) + 0.5) / len(outgoing) * (np.pi / 2))[:, None]
+    mixed = outgoing * np.cos(t) + incoming * np.sin(t)
+    return np.clip(np.round(mixed), -32768, 32767).astype(np.int16)
+
+
+def iter_joined(samples: np.ndarray, bounds: np.ndarray, halves: np.ndarray) -> Iterator[np.ndarray]:
+    """
+    The kept ranges of samples in order, as zero-copy views of the buffer, and the crossfades mixed at
+    their joins. Each crossfade replaces as many samples as it mixes from each side, so the output is
+    exactly as long as the kept ranges.
+    """
+    for i, (start, end) in enumerate(bounds):
+        body_start = start + (halves[i - 1] if i > 0 else 0)
+        body_end = end - (halves[i] if i < len(halves) else 0)
+        if body_end > body_start:
+            yield samples[body_start:body_end]
+        if i < len(halves) and halves[i] > 0:
+            half, next_start = halves[i], bounds[i + 1][0]
+            yield crossfade(samples[end - half:end + half], samples[next_start - half:next_start + half])
+
+
+def write_pcm(chunks, sample_rate: int, channels: int, n_samples: int, output_path: str) -> str:
+    """ WAV files are written directly, other formats are encoded by ffmpeg from the streamed samples. """
+    if os.path.splitext(output_path)[1].lower() == ".wav":
+        return write_wav(chunks, sample_rate, channels, n_samples, output_path)
+    return encode_pcm(chunks, sample_rate, channels, output_path)
+
+
+@traced
+def numpy_cut_audio(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]], save_cuts: bool = True,
+                    audio_buffer: Optional[AudioBuffer] = None, crossfade_duration: float = CROSSFADE,
+                    audio_extractor: Optional[AudioExtractor] = None) -> str:
+    """
+    Cuts with sample accuracy from the PCM of the file, decoded once into the audio cache and memory-mapped.
+    The result is written in one streaming pass over the kept ranges, with crossfades at the joins.
+    :param audio_buffer: Already decoded audio of the file, the output is written at its sample rate.
+    :param save_cuts: Write each kept range to cuts/<i>_<name> instead, without crossfades.
+    """
+    if audio_buffer is None:
+        audio_buffer = (audio_extractor or AudioExtractor(sample_rate=SAMPLE_RATE, channels=CHANNELS))(file_path)
+    audio_buffer.mark_used("audio_cutting")
+    samples, sample_rate, channels = audio_buffer.samples, audio_buffer.sample_rate, audio_buffer.channels
+
+    file_name = os.path.basename(file_path)
+    result_audio_file_path = os.path.join(output_dir_path, f"cut_{file_name}")
+    cuts_dir = os.path.join(output_dir_path, "cuts")
+    os.makedirs(cuts_dir, exist_ok=True)
+
+    bounds = to_sample_bounds(get_kept_segments(cuts, audio_buffer.duration), sample_rate, len(samples))
+
+    if save_cuts:
+        for i, (start, end) in enumerate(bounds):
+            write_pcm([samples[start:end]], sample_rate, channels, end - start,
+                      os.path.join(cuts_dir, f"{i}_{file_name}"))
+    else:
+        halves = join_overlaps(bounds, int(round(crossfade_duration * sample_rate)))
+        n_samples = int((bounds[:, 1] - bounds[:, 0]).sum())
+        write_pcm(iter_joined(samples, bounds, halves), sample_rate, channels, n_samples, result_audio_file_path)
+
+    return result_audio_file_path
+
+
+def test():
+    samples = np.arange(100, dtype=np.int16).reshape(-1, 1) * 100
+    bounds = to_sample_bounds([(0.0, 0.3), (0.5, 0.6), (0.6, 1.0), (1.0, 1.2)], 100, len(samples))
+    assert bounds.tolist() == [[0, 30], [50, 60], [60, 100]]
+
+    halves = join_overlaps(bounds, 8)
+    assert halves.tolist() == [4, 0]
+    output = np.concatenate(list(iter_joined(samples, bounds, halves)))
+    assert len(output) == 30 + 10 + 40
+    # Untouched away from the joins, a mix of both sides across the crossfade
+    assert (output[:26] == samples[:26]).all() and (output[34:] == samples[54:]).all()
+    assert samples[26] < output[26] < samples[46] and (output[26:34] > samples[26:34]).all()
+
+    # Joins are shortened by short segments
+    assert join_overlaps(np.array([[0, 10], [94, 100]]), 8).tolist() == [3]
+    assert join_overlaps(np.array([[0, 98], [99, 100]]), 8).tolist() == [0]
+
+    # The gains of an equal-power crossfade of a constant signal stay at or above unity
+    constant = np.full((8, 1), 1000, dtype=np.int16)
+    assert (crossfade(constant, constant) >= 1000).all()
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,102 @@
+import os
+from typing import List, Optional, Tuple
+
+from editor.ffmpeg_utils import probe_video, run_ffmpeg
+from editor.video_segments_processing import get_kept_segments
+from media_archive.fingerprint import fingerprint_file, stage_key
+from pipeline import tracing
+
+PREVIEW_HEIGHT = 360
+PREVIEW_PRESET = "ultrafast"
+PREVIEW_CRF = 32
+# Cut points are marked by a flash and a beep of this many seconds
+MARK_DURATION = 0.12
+BEEP_FREQUENCY = 1000
+
+
+def get_cut_points(kept_segments: List[Tuple[float, float]]) -> List[float]:
+    """ Times on the output timeline where two kept segments are joined. """
+    points, output_time = [], 0.0
+    for start, end in kept_segments[:-1]:
+        output_time += end - start
+        points.append(output_time)
+    return points
+
+
+def marks_expression(cut_points: List[float], duration: float = MARK_DURATION) -> str:
+    """ Filter timeline expression, true around the cut points. """
+    return "+".join(f"between(t,{point:.6f},{point + duration:.6f})" for point in cut_points) or "0"
+
+
+@tracing.traced
+def render_preview(file_path: str, kept_segments: List[Tuple[float, float]], output_path: str, fps: Optional[float],
+                   has_audio: bool = True, height: int = PREVIEW_HEIGHT, mark_cuts: bool = False):
+    """
+    Renders the kept segments in one ffmpeg pass, scaled down to height and encoded with the fastest preset.
+    With mark_cuts, every cut point flashes white and beeps. Without fps, only the audio is rendered.
+    """
+    selection = "+".join(f"between(t,{start:.6f},{end:.6f})" for start, end in kept_segments)
+    marks = marks_expression(get_cut_points(kept_segments))
+    output_duration = sum(end - start for start, end in kept_segments)
+
+    filters, maps = [], []
+    if fps is not None:
+        video_filter = f"[0:v]select='{selection}',setpts=N/FRAME_RATE/TB,scale=-2:{height}"
+        if mark_cuts:
+            video_filter += f",drawbox=color=white@0.7:t=fill:enable='{marks}'"
+        filters.append(video_filter + "[v]")
+        maps += ["-map", "[v]", "-r", str(fps), "-c:v", "libx264", "-preset", PREVIEW_PRESET, "-crf", str(PREVIEW_CRF)]
+    if has_audio:
+        audio_filter = f"[0:a]aselect='{selection}',asetpts=N/SR/TB"
+        if mark_cuts:
+            filters.append(audio_filter + "[speech]")
+            filters.append(
+                f"sine=frequency={BEEP_FREQUENCY}:sample_rate=48000:duration={output_duration:.6f},"
+                f"volume=0:enable='not({marks})'[beep]"
+            )
+            audio_filter = "[speech][beep]amix=inputs=2:duration=first:normalize=0"
+        filters.append(audio_filter + "[a]")
+        maps += ["-map", "[a]", "-c:a", "aac", "-b:a", "64k"]
+
+    run_ffmpeg(["-i", file_path, "-filter_complex", ";".join(filters)] + maps + [output_path])
+    return output_path
+
+
+def preview_video(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]],
+                  fingerprint: Optional[str] = None, height: int = PREVIEW_HEIGHT, mark_cuts: bool = False) -> str:
+    """
+    Low resolution proxy of the cut result for reviewing the cuts. Proxies are cached in output_dir_path/previews
+    by source fingerprint, cut list and preview options, so previewing the same cuts again is instant.
+    """
+    fingerprint = fingerprint or fingerprint_file(file_path)
+    key = stage_key("preview", fingerprint, cuts=sorted(cuts), height=height, mark_cuts=mark_cuts,
+                    preset=PREVIEW_PRESET, crf=PREVIEW_CRF)
+    file_name = os.path.splitext(os.path.basename(file_path))[0]
+    preview_dir = os.path.join(output_dir_path, "previews")
+    preview_path = os.path.join(preview_dir, f"preview_{file_name}_{key[:16]}.mp4")
+    if os.path.exists(preview_path):
+        print(f"Preview of {file_name} with these cuts is cached: {preview_path}")
+        tracing.count(cache_hits=1)
+        return preview_path
+    tracing.count(cache_misses=1)
+
+    os.makedirs(preview_dir, exist_ok=True)
+    infos = probe_video(file_path)
+    kept_segments = get_kept_segments(cuts, infos["duration"])
+    # Rendered under a temporary name so an interrupted render is never taken for a cached one
+    temporary_path = f"{preview_path}.partial.mp4"
+    render_preview(file_path, kept_segments, temporary_path, fps=infos["video_fps"] if infos["video_found"] else None,
+                   has_audio=infos["audio_found"], height=height, mark_cuts=mark_cuts)
+    os.replace(temporary_path, preview_path)
+    print(f"Rendered preview of {file_name} with {len(kept_segments)} kept segments: {preview_path}")
+    return preview_path
+
+
+def test():
+    assert get_cut_points([(0, 2), (3, 4), (6, 9)]) == [2, 3]
+    assert marks_expression([]) == "0"
+    assert marks_expression([1.0], 0.5) == "between(t,1.000000,1.500000)"
+
+
+if __name__ == '__main__':
+    test()
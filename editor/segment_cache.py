@@ -0,0 +1,342 @@
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import dotenv
+
+from editor.ffmpeg_utils import concat_files, escape_filter_path, probe_video, render_audio, run_ffmpeg
+from editor.parallel_render import RENDER_WORKERS, plan_chunk_subtitles
+from editor.subtitle_files import to_ass
+from editor.subtitles import FONT_PATH
+from editor.video_segments_processing import get_frame_segments, snap_to_frames
+from media_archive.fingerprint import fingerprint_file, stage_key
+from pipeline import tracing
+from transcriptions.objects import Transcription
+
+dotenv.load_dotenv()
+
+SEGMENT_CACHE_DIR = os.getenv("SEGMENT_CACHE_DIR")
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv("SEGMENT_CACHE_MAX_BYTES", 20 * 2 ** 30))
+# Kept segments are split on this grid of source time, so changing a cut only changes the pieces around it
+SEGMENT_GRID = float(os.getenv("SEGMENT_GRID", 10.0))
+# and their ends are split off up to the nearest multiple of this, so moving a border by less only changes those
+EDGE_GRID = 1.0
+
+# Every piece is encoded with the same parameters, so the pieces can be joined without re-encoding
+SEGMENT_ENCODER_ARGS = ("-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-pix_fmt", "yuv420p")
+
+
+class SegmentPiece(NamedTuple):
+    segment_index: int
+    start: float
+    end: float
+
+
+class SegmentCache:
+    """
+    Rendered video pieces on disk, indexed in SQLite by a key of the source fingerprint, the piece start
+    and end, the subtitles drawn on it and the encoder parameters. Least recently used pieces are evicted
+    once the stored pieces exceed max_bytes, except the pieces pinned by renders still joining them.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = SEGMENT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.pins: Counter = Counter()
+        self.connection = sqlite3.connect(os.path.join(cache_dir, "segments.db"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                "key TEXT PRIMARY KEY, size INTEGER NOT NULL, duration REAL NOT NULL, "
+                "encode_seconds REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS segments_last_used ON segments (last_used)")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_seconds = 0.0
+        self.encoded_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(fingerprint: str, start: float, end: float, subtitles: Optional[str], encoder_args: Iterable[str]) -> str:
+        return stage_key("segment", fingerprint, start=round(start, 6), end=round(end, 6), subtitles=subtitles,
+                         encoder_args=list(encoder_args))
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.mp4")
+
+    def get(self, key: str) -> Optional[str]:
+        """ Path of the cached piece, None when it was never rendered or its file is gone. """
+        with self.lock:
+            row = self.connection.execute("SELECT duration, encode_seconds FROM segments WHERE key = ?",
+                                          (key,)).fetchone()
+            if row is None or not os.path.exists(self.path(key)):
+                with self.connection:
+                    self.connection.execute("DELETE FROM segments WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            with self.connection:
+                self.connection.execute("UPDATE segments SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            self.reused_seconds += row[0]
+            self.saved_seconds += row[1]
+            return self.path(key)
+
+    def put(self, key: str, rendered_path: str, duration: float, encode_seconds: float) -> str:
+        """ Moves a rendered piece into the cache, rendered_path should be on the volume of cache_dir. """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(rendered_path, path)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO segments (key, size, duration, encode_seconds, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, os.path.getsize(path), duration, encode_seconds, time.time())
+            )
+            self.encoded_seconds += duration
+        return path
+
+    @contextmanager
+    def pinned(self, keys: Iterable[str]):
+        """ Keeps the pieces of keys from eviction until the block ends, renders sharing the cache included. """
+        keys = list(keys)
+        with self.lock:
+            self.pins.update(keys)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.pins.subtract(keys)
+                for key in keys:
+                    if self.pins[key] <= 0:
+                        del self.pins[key]
+
+    def evict(self):
+        """ Deletes the least recently used pieces, except the pinned ones, until the cache fits in max_bytes. """
+        with self.lock, self.connection:
+            (total_size,) = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM segments").fetchone()
+            if total_size <= self.max_bytes:
+                return
+            evicted = []
+            for key, size in self.connection.execute("SELECT key, size FROM segments ORDER BY last_used").fetchall():
+                if total_size <= self.max_bytes:
+                    break
+                if key in self.pins:
+                    continue
+                evicted.append((key,))
+                total_size -= size
+                if os.path.exists(self.path(key)):
+                    os.remove(self.path(key))
+            self.connection.executemany("DELETE FROM segments WHERE key = ?", evicted)
+            self.evictions += len(evicted)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            entries, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM segments").fetchone()
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "reused_seconds": self.reused_seconds,
+            "encoded_seconds": self.encoded_seconds,
+            "saved_seconds": self.saved_seconds,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+    def print_stats(self):
+        stats = self.get_stats()
+        print(
+            f"Segment cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+            f"{stats['reused_seconds']:.1f}s of video reused and {stats['encoded_seconds']:.1f}s encoded, "
+            f"{stats['saved_seconds']:.1f}s of encoding saved, {stats['evictions']} evictions, "
+            f"{stats['entries']} pieces in {stats['size_bytes'] / 2 ** 20:.1f} MiB."
+        )
+
+
+@lru_cache(maxsize=None)
+def get_segment_cache() -> Optional[SegmentCache]:
+    """ The shared segment cache, None when SEGMENT_CACHE_DIR is not configured. """
+    if not SEGMENT_CACHE_DIR:
+        return None
+    return SegmentCache(SEGMENT_CACHE_DIR)
+
+
+def split_on_grid(start: float, end: float, grid: float, fps: float, edge: float = EDGE_GRID) -> List[Tuple[float, float]]:
+    """
+    Splits a segment at the multiples of grid seconds of source time, and splits off the ends of the segment
+    up to the nearest multiple of edge seconds, so moving a border by less than edge only changes an edge piece.
+    Borders are snapped to frames.
+    """
+    inner_start, inner_end = math.ceil(start / edge) * edge, math.floor(end / edge) * edge
+    if inner_end <= inner_start:
+        return snap_to_frames([(start, end)], fps)
+    borders = [start, inner_start]
+    border = (math.floor(inner_start / grid) + 1) * grid
+    while border < inner_end:
+        borders.append(border)
+        border += grid
+    borders += [inner_end, end]
+    return snap_to_frames([(a, b) for a, b in zip(borders[:-1], borders[1:]) if b > a], fps)
+
+
+def plan_pieces(kept_segments: List[Tuple[float, float]], grid: float, fps: float) -> List[SegmentPiece]:
+    return [
+        SegmentPiece(segment_index, piece_start, piece_end)
+        for segment_index, (start, end) in enumerate(kept_segments)
+        for piece_start, piece_end in split_on_grid(start, end, grid, fps)
+    ]
+
+
+def render_piece(file_path: str, piece: SegmentPiece, piece_path: str, fps: float,
+                 subtitles_path: Optional[str], threads: int):
+    n_frames = round((piece.end - piece.start) * fps)
+    args = ["-ss", f"{piece.start:.6f}", "-i", file_path, "-frames:v", str(n_frames), "-an"]
+    if subtitles_path is not None:
+        args += ["-vf", f"subtitles=filename={escape_filter_path(subtitles_path)}"
+                        f":fontsdir={escape_filter_path(os.path.abspath(os.path.dirname(FONT_PATH)))}"]
+    run_ffmpeg(args + ["-r", str(fps)] + list(SEGMENT_ENCODER_ARGS) + ["-threads", str(threads), piece_path])
+
+
+@tracing.traced
+def cached_cut_video(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]],
+                     transcription: Optional[Transcription] = None, save_cuts: bool = True,
+                     cache: Optional[SegmentCache] = None, fingerprint: Optional[str] = None,
+                     workers: int = RENDER_WORKERS, grid: float = SEGMENT_GRID):
+    """
+    Renders the kept segments as pieces on a fixed grid of source time, burning the subtitles of each piece
+    when a transcription is given. Subtitles are grouped on the whole output timeline, as by the other engines,
+    and every piece is keyed on its slice of them. Pieces already in the segment cache are reused, only new or
+    changed ones are encoded, and the pieces are joined without re-encoding. Audio is rendered once for the
+    whole timeline. The pieces of the render are pinned until joined, so concurrent renders can't evict them.
+    Without SEGMENT_CACHE_DIR the cache lives in output_dir_path.
+    """
+    cache = cache or get_segment_cache() or SegmentCache(os.path.join(output_dir_path, "segment_cache"))
+    fingerprint = fingerprint or fingerprint_file(file_path)
+    infos = probe_video(file_path)
+    fps, (width, height) = infos["video_fps"], infos["video_size"]
+
+    file_name = os.path.basename(file_path)
+    result_video_file_path = os.path.join(output_dir_path, f"cut_{file_name}")
+    cuts_dir = os.path.join(output_dir_path, "cuts")
+    os.makedirs(cuts_dir, exist_ok=True)
+
+    kept_segments = get_frame_segments(cuts, infos["duration"], fps)
+    pieces = plan_pieces(kept_segments, grid, fps)
+    subtitles = [None] * len(pieces)
+    if transcription is not None:
+        subtitles = [to_ass(piece_subtitles, width=width, height=height)
+                     for piece_subtitles in plan_chunk_subtitles(transcription, kept_segments, pieces, save_cuts)]
+    keys = [cache.key(fingerprint, p.start, p.end, s, SEGMENT_ENCODER_ARGS) for p, s in zip(pieces, subtitles)]
+    with cache.pinned(keys):
+        render_pieces(file_path, cache, pieces, keys, subtitles, kept_segments, infos, result_video_file_path,
+                      cuts_dir, save_cuts, workers)
+        # Still pinned, so the pieces of this render stay for the next one
+        cache.evict()
+    cache.print_stats()
+    return result_video_file_path
+
+
+def render_pieces(file_path: str, cache: SegmentCache, pieces: List[SegmentPiece], keys: List[str],
+                  subtitles: List[Optional[str]], kept_segments: List[Tuple[float, float]], infos: dict,
+                  result_video_file_path: str, cuts_dir: str, save_cuts: bool, workers: int):
+    fps, file_name = infos["video_fps"], os.path.basename(file_path)
+    piece_paths = [cache.get(key) for key in keys]
+    missing = [i for i, path in enumerate(piece_paths) if path is None]
+    missing_seconds = sum(pieces[i].end - pieces[i].start for i in missing)
+    tracing.count(cache_hits=len(pieces) - len(missing), cache_misses=len(missing))
+    total_seconds = sum(p.end - p.start for p in pieces)
+    print(f"Reusing {len(pieces) - len(missing)}/{len(pieces)} cached pieces, "
+          f"encoding {missing_seconds:.1f}s of {total_seconds:.1f}s.")
+
+    # Rendered inside the cache directory, so moving a piece into the cache is a rename on the same volume
+    with tempfile.TemporaryDirectory(dir=cache.cache_dir) as work_dir:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+        def render(i):
+            piece_path = os.path.join(work_dir, f"piece_{i}.mp4")
+            subtitles_path = None
+            if subtitles[i] is not None:
+                subtitles_path = os.path.join(work_dir, f"piece_{i}.ass")
+                with open(subtitles_path, "w", encoding="utf-8") as file:
+                    file.write(subtitles[i])
+            start_time = time.perf_counter()
+            render_piece(file_path, pieces[i], piece_path, fps, subtitles_path, threads)
+            piece_paths[i] = cache.put(keys[i], piece_path, pieces[i].end - pieces[i].start,
+                                       time.perf_counter() - start_time)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(render, missing))
+
+        if save_cuts:
+            groups = [
+                ([path for piece, path in zip(pieces, piece_paths) if piece.segment_index == i], [segment],
+                 os.path.join(cuts_dir, f"{i}_{file_name}"))
+                for i, segment in enumerate(kept_segments)
+            ]
+        else:
+            groups = [(piece_paths, kept_segments, result_video_file_path)]
+
+        for group_piece_paths, segments, output_path in groups:
+            audio_path = None
+            if infos["audio_found"]:
+                audio_path = os.path.join(work_dir, f"audio_{os.path.basename(output_path)}.m4a")
+                render_audio(file_path, segments, audio_path)
+            concat_files(group_piece_paths, output_path, audio_path=audio_path)
+
+
+def test():
+    assert split_on_grid(3.0, 25.0, 10.0, 25) == [(3.0, 10.0), (10.0, 20.0), (20.0, 25.0)]
+    assert split_on_grid(2.6, 25.4, 10.0, 25) == [(2.6, 3.0), (3.0, 10.0), (10.0, 20.0), (20.0, 25.0), (25.0, 25.4)]
+    assert split_on_grid(10.2, 10.8, 10.0, 25) == [(10.2, 10.8)]
+    # Moving a cut border by less than the edge grid only changes the edge piece next to it
+    before = plan_pieces([(0.0, 14.0), (15.2, 40.0)], 10.0, 25)
+    after = plan_pieces([(0.0, 14.0), (15.5, 40.0)], 10.0, 25)
+    assert set(before) - set(after) == {SegmentPiece(1, 15.2, 16.0)}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = SegmentCache(temp_dir, max_bytes=2500)
+        keys = [cache.key("fingerprint", i, i + 1, None, SEGMENT_ENCODER_ARGS) for i in range(3)]
+        assert cache.key("fingerprint", 0, 1, "subtitles", SEGMENT_ENCODER_ARGS) != keys[0]
+        for key in keys[:2]:
+            assert cache.get(key) is None
+            rendered_path = os.path.join(temp_dir, "rendered.mp4")
+            with open(rendered_path, "wb") as file:
+                file.write(b"x" * 1000)
+            cache.put(key, rendered_path, duration=1.0, encode_seconds=2.0)
+        assert cache.get(keys[0]) is not None
+        with open(rendered_path, "wb") as file:
+            file.write(b"x" * 1000)
+        cache.put(keys[2], rendered_path, duration=1.0, encode_seconds=2.0)
+        # keys[1] is the least recently used
+        cache.evict()
+        assert cache.get(keys[1]) is None and not os.path.exists(cache.path(keys[1]))
+        assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+        # Pieces pinned by a render in flight survive eviction, whatever their age
+        cache.max_bytes = 0
+        with cache.pinned([keys[0]]), cache.pinned([keys[0]]):
+            cache.evict()
+            assert cache.get(keys[0]) is not None and cache.get(keys[2]) is None
+        assert not cache.pins
+        cache.evict()
+        assert cache.get(keys[0]) is None
+        cache.print_stats()
+        cache.connection.close()
+
+
+if __name__ == '__main__':
+    test()
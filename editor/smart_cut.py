@@ -0,0 +1,182 @@
+import bisect
+import os
+import tempfile
+from typing import List, NamedTuple, Tuple
+
+from editor.ffmpeg_utils import FFmpegError, concat_files, probe_keyframes, probe_video_stream, render_audio, run_ffmpeg
+from editor.video_segments_processing import get_frame_segments
+from pipeline.tracing import traced
+
+# Source codecs whose boundary pieces we can re-encode with matching parameters.
+SMART_CUT_ENCODERS = {"h264": "libx264"}
+X264_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+}
+BOUNDARY_CRF = 18
+BOUNDARY_PRESET = "medium"
+# Stream parameters stored once in the avcC of the joined MP4, every re-encoded piece must match them
+PIECE_PARAMETERS = [
+    "codec_name", "profile", "level", "width", "height", "pix_fmt", "has_b_frames", "refs", "sample_aspect_ratio",
+    "color_range", "color_space", "color_transfer", "color_primaries",
+]
+COLOR_OPTIONS = {
+    "color_range": "-color_range",
+    "color_space": "-colorspace",
+    "color_transfer": "-color_trc",
+    "color_primaries": "-color_primaries",
+}
+
+
+class SmartCutUnsupported(Exception):
+    pass
+
+
+class CutPiece(NamedTuple):
+    start: float
+    end: float
+    copy: bool
+
+
+def plan_smart_cut(kept_segments: List[Tuple[float, float]], keyframes: List[float]) -> List[List[CutPiece]]:
+    """
+    Splits every kept segment into pieces: the partial GOPs before the first and after the last keyframe
+    inside the segment are re-encoded, everything between those keyframes is stream-copied.
+    """
+    plan = []
+    for start, end in kept_segments:
+        first = bisect.bisect_left(keyframes, start)
+        last = bisect.bisect_right(keyframes, end) - 1
+
+        if first > last or keyframes[first] >= keyframes[last]:
+            plan.append([CutPiece(start, end, copy=False)])
+            continue
+
+        copy_start, copy_end = keyframes[first], keyframes[last]
+        pieces = []
+        if start < copy_start:
+            pieces.append(CutPiece(start, copy_start, copy=False))
+        pieces.append(CutPiece(copy_start, copy_end, copy=True))
+        if copy_end < end:
+            pieces.append(CutPiece(copy_end, end, copy=False))
+        plan.append(pieces)
+    return plan
+
+
+def encoder_args(stream: dict) -> List[str]:
+    """ Encoder settings that reproduce the source stream parameters, so pieces can be joined without re-encoding. """
+    args = [
+        "-c:v", SMART_CUT_ENCODERS[stream["codec_name"]],
+        "-preset", BOUNDARY_PRESET,
+        "-crf", str(BOUNDARY_CRF),
+        "-pix_fmt", stream["pix_fmt"],
+        "-r", str(stream["fps"]),
+    ]
+    profile = X264_PROFILES.get(stream.get("profile"))
+    if profile is not None:
+        args += ["-profile:v", profile]
+    if (stream.get("level") or 0) > 0:
+        # ffprobe reports H.264 levels times ten
+        args += ["-level:v", f"{stream['level'] / 10:g}"]
+    if stream.get("has_b_frames") == 0:
+        args += ["-bf", "0"]
+    if stream.get("refs"):
+        args += ["-refs", str(stream["refs"])]
+    if get_parameter(stream, "sample_aspect_ratio") is not None:
+        args += ["-vf", f"setsar={stream['sample_aspect_ratio'].replace(':', '/')}"]
+    for key, option in COLOR_OPTIONS.items():
+        if get_parameter(stream, key) is not None:
+            args += [option, stream[key]]
+    return args
+
+
+def get_parameter(stream: dict, key: str):
+    """ A stream parameter, None when ffprobe does not know it. """
+    value = stream.get(key)
+    return None if value in ("unknown", "N/A", "0:1") else value
+
+
+def render_piece(file_path: str, piece: CutPiece, piece_path: str, stream: dict):
+    # Limiting by frame count rather than duration keeps copied pieces exact: with closed GOPs the packets
+    # preceding the next keyframe in decode order are exactly the frames of the copied range.
+    n_frames = round((piece.end - piece.start) * stream["fps"])
+    args = ["-ss", f"{piece.start:.6f}", "-i", file_path, "-frames:v", str(n_frames), "-an"]
+    if piece.copy:
+        args += ["-c:v", "copy", "-bsf:v", "h264_mp4toannexb"]
+    else:
+        args += encoder_args(stream)
+    run_ffmpeg(args + ["-f", "mpegts", piece_path])
+
+
+def check_piece_parameters(piece_path: str, stream: dict):
+    piece_stream = probe_video_stream(piece_path)
+    for key in PIECE_PARAMETERS:
+        if get_parameter(piece_stream, key) != get_parameter(stream, key):
+            raise SmartCutUnsupported(
+                f"Re-encoded piece {key} {piece_stream.get(key)} does not match source {stream.get(key)}"
+            )
+
+
+def render_segments(file_path: str, plan: List[List[CutPiece]], segments: List[Tuple[float, float]],
+                    output_path: str, stream: dict, work_dir: str):
+    name = os.path.splitext(os.path.basename(output_path))[0]
+    piece_paths = []
+    for pieces in plan:
+        for piece in pieces:
+            piece_path = os.path.join(work_dir, f"{name}_{len(piece_paths)}.ts")
+            render_piece(file_path, piece, piece_path, stream)
+            if not piece.copy:
+                check_piece_parameters(piece_path, stream)
+            piece_paths.append(piece_path)
+
+    audio_path = None
+    if stream["has_audio"]:
+        audio_path = os.path.join(work_dir, f"{name}_audio.m4a")
+        render_audio(file_path, segments, audio_path)
+
+    concat_files(piece_paths, output_path, audio_path=audio_path)
+    return output_path
+
+
+@traced
+def smart_cut_video(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]], save_cuts: bool = True):
+    """
+    Cuts a video by re-encoding only the partial GOPs at each cut border and stream-copying
+    the GOPs in between. Raises SmartCutUnsupported when the source can not be cut this way.
+    """
+    try:
+        stream = probe_video_stream(file_path)
+        keyframes = probe_keyframes(file_path)
+    except FFmpegError as e:
+        raise SmartCutUnsupported(str(e)) from e
+
+    if stream["codec_name"] not in SMART_CUT_ENCODERS:
+        raise SmartCutUnsupported(f"No matching encoder for source codec {stream['codec_name']}")
+    if not keyframes:
+        raise SmartCutUnsupported("No keyframes found in source")
+
+    file_name = os.path.basename(file_path)
+    result_video_file_path = os.path.join(output_dir_path, f"cut_{file_name}")
+    cuts_dir = os.path.join(output_dir_path, "cuts")
+    os.makedirs(cuts_dir, exist_ok=True)
+
+    kept_segments = get_frame_segments(cuts, stream["duration"], float(stream["fps"]))
+    plan = plan_smart_cut(kept_segments, keyframes)
+    copied = sum(piece.end - piece.start for pieces in plan for piece in pieces if piece.copy)
+    total = sum(end - start for start, end in kept_segments)
+    print(f"Smart cut: stream-copying {copied:.1f}s of {total:.1f}s kept video.")
+
+    with tempfile.TemporaryDirectory(dir=output_dir_path) as work_dir:
+        try:
+            if save_cuts:
+                for i, (pieces, segment) in enumerate(zip(plan, kept_segments)):
+                    cut_file_path = os.path.join(cuts_dir, f"{i}_{file_name}")
+                    render_segments(file_path, [pieces], [segment], cut_file_path, stream, work_dir)
+            else:
+                render_segments(file_path, plan, kept_segments, result_video_file_path, stream, work_dir)
+        except FFmpegError as e:
+            raise SmartCutUnsupported(str(e)) from e
+
+    return result_video_file_path
@@ -0,0 +1,145 @@
+import os
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+from editor.subtitles import FONT_PATH, generate_transcription_subtitles
+from transcriptions.objects import TranscribedWord, Transcription
+
+SRT = "srt"
+VTT = "vtt"
+ASS = "ass"
+SUBTITLE_FORMATS = (SRT, VTT, ASS)
+
+# Style of add_subtitles_to_frames, in pixels of the video
+FONT_SIZE = 100
+H_POS = 260
+
+
+def format_timestamp(seconds: float, decimal_separator: str = ",") -> str:
+    """ HH:MM:SS,mmm as used by SRT, or with "." by WebVTT. """
+    milliseconds = max(int(round(seconds * 1000)), 0)
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_separator}{milliseconds:03d}"
+
+
+def format_ass_timestamp(seconds: float) -> str:
+    """ H:MM:SS.cc, ASS counts in centiseconds. """
+    centiseconds = max(int(round(seconds * 100)), 0)
+    hours, centiseconds = divmod(centiseconds, 360_000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    seconds, centiseconds = divmod(centiseconds, 100)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
+
+
+def to_srt(subtitles: List[TranscribedWord]) -> str:
+    blocks = [
+        f"{i}\n{format_timestamp(subtitle.start)} --> {format_timestamp(subtitle.end)}\n{subtitle.word}\n"
+        for i, subtitle in enumerate(subtitles, start=1)
+    ]
+    return "\n".join(blocks)
+
+
+def to_vtt(subtitles: List[TranscribedWord]) -> str:
+    blocks = [
+        f"{format_timestamp(subtitle.start, '.')} --> {format_timestamp(subtitle.end, '.')}\n{subtitle.word}\n"
+        for subtitle in subtitles
+    ]
+    return "\n".join(["WEBVTT\n"] + blocks)
+
+
+@lru_cache(maxsize=None)
+def get_font_name(font_path: str) -> str:
+    """ The family name libass matches the font by, read from the font file. """
+    from PIL import ImageFont
+    return ImageFont.truetype(font_path).getname()[0]
+
+
+def to_ass(subtitles: List[TranscribedWord], font_path: str = FONT_PATH, font_size: int = FONT_SIZE,
+           h_pos: int = H_POS, width: int = 1920, height: int = 1080) -> str:
+    """
+    The subtitles with the style of add_subtitles_to_frames: white text of font_size pixels, without
+    outline, centered horizontally with its middle h_pos pixels above the bottom of a width x height video.
+    """
+    header = "\n".join([
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 2",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+        "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, "
+        "MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,{get_font_name(font_path)},{font_size},&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,"
+        f"0,0,0,0,100,100,0,0,1,0,0,2,0,0,{max(h_pos - font_size // 2, 0)},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ])
+    events = [
+        f"Dialogue: 0,{format_ass_timestamp(subtitle.start)},{format_ass_timestamp(subtitle.end)},Default,,0,0,0,,"
+        + subtitle.word.replace("\n", "\\N").replace("{", "(").replace("}", ")")
+        for subtitle in subtitles
+    ]
+    return "\n".join([header] + events) + "\n"
+
+
+def write_subtitles(transcription: Transcription, path: str, subtitle_format: Optional[str] = None,
+                    **style) -> str:
+    """
+    Writes the subtitles add_subtitles_to_frames would draw for the transcription.
+    :param subtitle_format: "srt", "vtt" or "ass", by default taken from the file extension.
+    :param style: font_path, font_size, h_pos, width and height of the ASS style.
+    """
+    subtitle_format = subtitle_format or os.path.splitext(path)[1].lstrip(".").lower()
+    subtitles = generate_transcription_subtitles(
+        Transcription(words=sorted(transcription.words, key=lambda x: x.start))
+    )
+    if subtitle_format == SRT:
+        content = to_srt(subtitles)
+    elif subtitle_format == VTT:
+        content = to_vtt(subtitles)
+    elif subtitle_format == ASS:
+        content = to_ass(subtitles, **style)
+    else:
+        raise ValueError(f"Unsupported subtitle format: {subtitle_format}")
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+    return path
+
+
+def export_subtitles(transcription: Transcription, video_path: str, formats: Sequence[str] = SUBTITLE_FORMATS,
+                     **style) -> List[str]:
+    """ Writes sidecar subtitle files next to the video, named after it. """
+    base_path = os.path.splitext(video_path)[0]
+    paths = [write_subtitles(transcription, f"{base_path}.{subtitle_format}", subtitle_format, **style)
+             for subtitle_format in formats]
+    print(f"Exported subtitles {[os.path.basename(path) for path in paths]}")
+    return paths
+
+
+def test():
+    transcription = Transcription(words=[
+        TranscribedWord(word="Hello", start=0.0, end=0.3),
+        TranscribedWord(word="there", start=0.35, end=0.6),
+        TranscribedWord(word="friend", start=3661.25, end=3662.0),
+    ])
+    subtitles = generate_transcription_subtitles(transcription)
+    assert format_timestamp(3661.25) == "01:01:01,250" and format_ass_timestamp(3661.25) == "1:01:01.25"
+
+    srt = to_srt(subtitles)
+    assert srt.startswith("1\n00:00:00,000 --> 00:00:00,600\nHello there\n\n2\n01:01:01,250 --> 01:01:02,000\nfriend")
+    vtt = to_vtt(subtitles)
+    assert vtt.startswith("WEBVTT\n\n00:00:00.000 --> 00:00:00.600\nHello there")
+    ass = to_ass(subtitles, width=1280, height=720)
+    assert "PlayResY: 720" in ass and "Dialogue: 0,0:00:00.00,0:00:00.60,Default,,0,0,0,,Hello there" in ass
+    print(ass)
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,96 @@
+import bisect
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from transcriptions.objects import TranscribedWord
+
+
+class SubtitleSprite:
+    """ A subtitle rasterized once: the glyph coverage cropped to its bounding box, ready for blending. """
+
+    def __init__(self, text: str, font: ImageFont.FreeTypeFont, fill: Tuple[int, int, int] = (255, 255, 255)):
+        draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+        self.width, self.height = draw.textsize(text, font=font)
+
+        mask = Image.new("L", (max(self.width, 1), max(self.height, 1)), 0)
+        ImageDraw.Draw(mask).text((0, 0), text, font=font, fill=255)
+        bbox = mask.getbbox() or (0, 0, 0, 0)
+        self.offset_x, self.offset_y = bbox[0], bbox[1]
+
+        alpha = np.asarray(mask.crop(bbox), dtype=np.uint16)[:, :, np.newaxis]
+        self.inverse_alpha = 255 - alpha
+        self.premultiplied_fill = alpha * np.array(fill, dtype=np.uint16)
+
+    def blend(self, frame: np.ndarray, h_pos: int) -> np.ndarray:
+        """ Alpha-blends the sprite into the frame in place, touching only the sprite's bounding box. """
+        frame_height, frame_width = frame.shape[:2]
+        x = (frame_width - self.width) // 2 + self.offset_x
+        y = frame_height - self.height // 2 - h_pos + self.offset_y
+        sprite_height, sprite_width = self.inverse_alpha.shape[:2]
+
+        # Clip the sprite to the frame, as drawing with PIL would
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + sprite_width, frame_width), min(y + sprite_height, frame_height)
+        if x0 >= x1 or y0 >= y1:
+            return frame
+
+        sprite_slice = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        region = frame[y0:y1, x0:x1, :3]
+        blended = region * self.inverse_alpha[sprite_slice] + self.premultiplied_fill[sprite_slice] + 127
+        region[...] = blended // 255
+        return frame
+
+
+class SubtitleOverlay:
+    """
+    Draws subtitles on frames through a sorted interval index and a cache of pre-rasterized sprites.
+    Where subtitles overlap in time, the one that starts first is shown.
+    """
+    max_cached_sprites: int = 64
+
+    def __init__(self, subtitles: List[TranscribedWord], font: ImageFont.FreeTypeFont, h_pos: int = 260):
+        self.font = font
+        self.h_pos = h_pos
+        self.subtitles = sorted(subtitles, key=lambda x: x.start)
+        self.sprites: "OrderedDict[int, SubtitleSprite]" = OrderedDict()
+
+        # Disjoint intervals, each owned by the first subtitle covering it
+        self.starts, self.ends, self.owners = [], [], []
+        covered_until = float("-inf")
+        for index, subtitle in enumerate(self.subtitles):
+            start = max(subtitle.start, covered_until)
+            if subtitle.end >= start and subtitle.end > covered_until:
+                self.starts.append(start)
+                self.ends.append(subtitle.end)
+                self.owners.append(index)
+            covered_until = max(covered_until, subtitle.end)
+
+    def find(self, t: float) -> Optional[int]:
+        position = bisect.bisect_right(self.starts, t) - 1
+        if position >= 0 and t <= self.ends[position]:
+            return self.owners[position]
+        return None
+
+    def get_sprite(self, index: int) -> SubtitleSprite:
+        sprite = self.sprites.get(index)
+        if sprite is None:
+            sprite = SubtitleSprite(self.subtitles[index].word, self.font)
+            self.sprites[index] = sprite
+            if len(self.sprites) > self.max_cached_sprites:
+                self.sprites.popitem(last=False)
+        else:
+            self.sprites.move_to_end(index)
+        return sprite
+
+    def __call__(self, get_frame, t):
+        frame = get_frame(t)
+        index = self.find(t)
+        if index is None:
+            return frame
+
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        return self.get_sprite(index).blend(frame, self.h_pos)
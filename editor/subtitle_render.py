@@ -0,0 +1,83 @@
+import os
+from typing import List, Sequence, Tuple
+
+from editor.cut_media import SMART_ENGINE, cut_video
+from editor.ffmpeg_utils import FFmpegError, cut_and_burn_subtitles, mux_subtitles, probe_video
+from editor.subtitle_files import ASS, SRT, export_subtitles, write_subtitles
+from editor.subtitles import FONT_PATH
+from editor.video_segments_processing import get_frame_segments, map_transcription_to_segments
+from pipeline.tracing import traced
+from transcriptions.objects import Transcription
+
+# How subtitles get into the result: drawn on every frame in Python, muxed as a soft track
+# without re-encoding, or burned in by ffmpeg's subtitles filter
+FRAMES_SUBTITLES = "frames"
+SOFT_SUBTITLES = "soft"
+BURN_SUBTITLES = "burn"
+
+
+@traced
+def soft_subtitle_video(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]],
+                        transcription: Transcription, save_cuts: bool = True, engine: str = SMART_ENGINE,
+                        formats: Sequence[str] = (SRT,)):
+    """
+    Cuts the video with the given engine, then exports the subtitles of the result as sidecar files and
+    muxes the first of them as a subtitle track, copying the video and audio streams. Only the smart
+    engine cuts without re-encoding the whole video.
+    """
+    if engine != SMART_ENGINE:
+        print(f"Soft subtitles with the {engine} cut engine re-encode the whole video, "
+              f"the {SMART_ENGINE} engine only re-encodes the cut borders.")
+    infos = probe_video(file_path)
+    kept_segments = get_frame_segments(cuts, infos["duration"], infos["video_fps"])
+    result_video_path = cut_video(file_path=file_path, output_dir_path=output_dir_path, cuts=cuts,
+                                  save_cuts=save_cuts, engine=engine)
+    style = {"font_path": FONT_PATH, "width": infos["video_size"][0], "height": infos["video_size"][1]}
+
+    if save_cuts:
+        file_name = os.path.basename(file_path)
+        outputs = [(os.path.join(output_dir_path, "cuts", f"{i}_{file_name}"), [segment])
+                   for i, segment in enumerate(kept_segments)]
+    else:
+        outputs = [(result_video_path, kept_segments)]
+
+    for video_path, segments in outputs:
+        subtitles_paths = export_subtitles(map_transcription_to_segments(transcription, segments), video_path,
+                                           formats, **style)
+        muxed_path = f"{os.path.splitext(video_path)[0]}.subs{os.path.splitext(video_path)[1]}"
+        try:
+            mux_subtitles(video_path, subtitles_paths[0], muxed_path)
+        except FFmpegError as e:
+            print(f"Subtitles kept as sidecar files only: {e}")
+            continue
+        os.replace(muxed_path, video_path)
+    return result_video_path
+
+
+@traced
+def burn_subtitles_video(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]],
+                         transcription: Transcription, save_cuts: bool = True, font_path: str = FONT_PATH):
+    """
+    Applies the cuts and burns the subtitles in one ffmpeg pass through the subtitles filter, so no frame
+    goes through Python. The subtitles are written as ASS with the style of add_subtitles_to_frames.
+    """
+    infos = probe_video(file_path)
+    kept_segments = get_frame_segments(cuts, infos["duration"], infos["video_fps"])
+    file_name = os.path.basename(file_path)
+    result_video_file_path = os.path.join(output_dir_path, f"cut_{file_name}")
+    style = {"font_path": font_path, "width": infos["video_size"][0], "height": infos["video_size"][1]}
+
+    if save_cuts:
+        cuts_dir = os.path.join(output_dir_path, "cuts")
+        os.makedirs(cuts_dir, exist_ok=True)
+        outputs = [(os.path.join(cuts_dir, f"{i}_{file_name}"), [segment]) for i, segment in enumerate(kept_segments)]
+    else:
+        os.makedirs(output_dir_path, exist_ok=True)
+        outputs = [(result_video_file_path, kept_segments)]
+
+    for video_path, segments in outputs:
+        subtitles_path = write_subtitles(map_transcription_to_segments(transcription, segments),
+                                         f"{os.path.splitext(video_path)[0]}.{ASS}", ASS, **style)
+        cut_and_burn_subtitles(file_path, segments, subtitles_path, video_path, fps=infos["video_fps"],
+                               has_audio=infos["audio_found"], fonts_dir=os.path.dirname(font_path))
+    return result_video_file_path
@@ -1,13 +1,18 @@
-from typing import List
+from typing import List, Optional, TYPE_CHECKING
 
 import numpy as np
 from PIL import ImageFont, Image, ImageDraw
-from moviepy.video.VideoClip import VideoClip
 
+from editor.subtitle_overlay import SubtitleOverlay
 from transcriptions.objects import TranscribedWord, Transcription
 
 
+if TYPE_CHECKING:
+    from moviepy.video.VideoClip import VideoClip
+
 FONT_PATH = "./fonts/arial.ttf"
+PIL_ENGINE = "pil"
+SPRITE_ENGINE = "sprite"
 
 
 def generate_transcription_subtitles(transcription: Transcription, window: float = 0.5) -> List[TranscribedWord]:
@@ -47,13 +52,34 @@ def generate_transcription_subtitles(transcription: Transcription, window: float
     return subtitles
 
 
-def add_subtitles_to_frames(video: VideoClip, transcription: Transcription, font_path: str = FONT_PATH, font_size=100, h_pos=260) -> VideoClip:
+def shift_subtitles(subtitles: List[TranscribedWord], start: float, end: float) -> List[TranscribedWord]:
+    """ The subtitles shown between start and end, on a timeline starting at start. """
+    return [
+        TranscribedWord(word=subtitle.word, start=subtitle.start - start, end=subtitle.end - start)
+        for subtitle in subtitles if subtitle.end >= start and subtitle.start < end
+    ]
+
+
+def add_subtitles_to_frames(video: "VideoClip", transcription: Optional[Transcription], font_path: str = FONT_PATH,
+                            font_size=100, h_pos=260, engine: str = SPRITE_ENGINE,
+                            subtitles: Optional[List[TranscribedWord]] = None) -> "VideoClip":
+    """
+    :param engine: "sprite" blends cached pre-rasterized subtitles into the frames with numpy,
+        "pil" draws the text on every frame through PIL.
+    :param subtitles: Subtitles already grouped, on the timeline of the video, drawn instead of the transcription.
+    """
     print("Adding subtitles")
-    # Sort the transcription list by start time to ensure they are in the correct order
-    transcription.words.sort(key=lambda x: x.start)
     font = ImageFont.truetype(font_path, size=font_size)  # Adjust size as needed
 
-    subtitles = generate_transcription_subtitles(transcription)
+    if subtitles is None:
+        # Sort the transcription list by start time to ensure they are in the correct order
+        transcription.words.sort(key=lambda x: x.start)
+        subtitles = generate_transcription_subtitles(transcription)
+
+    if engine == SPRITE_ENGINE:
+        return video.fl(SubtitleOverlay(subtitles=subtitles, font=font, h_pos=h_pos))
+    elif engine != PIL_ENGINE:
+        raise ValueError(f"Unsupported subtitles engine: {engine}")
 
     def attach_subtitles(get_frame, t):
         frame = get_frame(t)
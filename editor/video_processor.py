@@ -1,29 +1,61 @@
 from editor.cut_media import cut_video
 from editor.subtitles import add_subtitles_to_frames
-from editor.cut_media import cut_media
-from editor.video_segments_processing import merge_overlapping_cuts, sync_transcription_to_pauses
+from editor.cut_media import cut_media, AUDIO_EXTENSIONS, CACHED_ENGINE, MOVIEPY_ENGINE, NUMPY_ENGINE, \
+    PARALLEL_ENGINE, SMART_ENGINE
+from editor import pcm_cut
+from editor.segment_cache import cached_cut_video, get_segment_cache
+from editor.parallel_render import parallel_cut_video
+from editor.preview import PREVIEW_HEIGHT, preview_video
+from editor import edit_decisions
+from editor.edit_decisions import EDIT_JSON, build_timeline
+from editor.subtitle_files import SRT, export_subtitles
+from editor.subtitle_render import BURN_SUBTITLES, FRAMES_SUBTITLES, SOFT_SUBTITLES, burn_subtitles_video, \
+    soft_subtitle_video
+from editor.ffmpeg_utils import probe_video
+from editor.video_segments_processing import merge_overlapping_cuts, sync_transcription_to_pauses, get_frame_segments, \
+    map_transcription_to_segments, subclip_frames
 from transcriptions.transcript import merge_transcript_words
 from transcriptions.text_processing import process_special_characters
-from typing import List, Tuple
-from transcriptions import transcriptor
-from transcriptions.api_client import TranscriptClient
-from media_archive import archive
-from media_archive.media_archive import MediaArchive
+from typing import List, Optional, Tuple, TYPE_CHECKING
+from audio_extraction import get_extractor
+from audio_extraction.pcm_audio import AudioBuffer, AudioExtractor
+from transcriptions import get_transcriptor
+from media_archive import get_archive
+from media_archive.fingerprint import fingerprint_file, stage_key
+from media_archive.media_archive import MediaArchive, Media
 from transcriptions.objects import Language, Transcription
-from voice_segmentation import detector
+from voice_segmentation import get_detector
 from voice_segmentation.voice_activity_detection import VoiceDetector
-from moviepy.editor import VideoFileClip
-from llm.calls import find_repetitions_timestamps, find_parts, correct_transcription
+from pipeline.scheduler import CPU, ENCODE, NETWORK, Stage, StageScheduler
+from pipeline import tracing
+from llm.cache import get_llm_cache
+from llm.calls import detect_repetitions
+from llm.windowing import correct_transcription_windowed, find_parts_windowed, find_repetitions_windowed
+from llm.prompts import IDEAS_SUMMARY, HIGHLIGHT_MISTAKES, HIGHLIGHT_REPETITIONS, SPLIT_TRANSCRIPT_INDICES, \
+    CORRECT_WORDS_INDICES, EXTRACT_CUT_INDICES, CONFIRM_REPETITIONS
+from transcriptions.repetitions import MAX_NGRAM, MAX_RESTART_WORDS, MIN_RESTART_MATCH, MIN_UNPAUSED_RESTART_MATCH, \
+    RESTART_PAUSE, SENTENCE_ENDS
+from functools import partial
 import os
+import threading
 import dotenv
 
+if TYPE_CHECKING:
+    from transcriptions.api_client import TranscriptClient
+
 dotenv.load_dotenv()
 
 SOURCE_VIDEOS_DIR = os.getenv("SOURCE_VIDEOS_DIR")
 RESULT_VIDEOS_DIR = os.getenv("RESULT_VIDEOS_DIR")
 
+LOCAL_REPETITIONS = "local"
+LLM_REPETITIONS = "llm"
+
 
+@tracing.traced
 def add_subtitles_to_video(file_path: str, output_dir_path: str, transcription: Transcription):
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
     video = VideoFileClip(file_path)
     file_name = os.path.basename(file_path)
 
@@ -39,21 +71,145 @@ def add_subtitles_to_video(file_path: str, output_dir_path: str, transcription:
     return result_video_file_path
 
 
+@tracing.traced
+def cut_video_with_subtitles(file_path: str, output_dir_path: str, cuts: List[Tuple[float, float]],
+                             transcription: Transcription, save_cuts: bool = True):
+    """
+    Applies the cuts and burns the subtitles in a single decode and encode. Subtitle timings are mapped
+    onto the output timeline, and frames inside the cuts are never decoded or rasterized.
+    """
+    from moviepy.video.compositing.concatenate import concatenate_videoclips
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+    video = VideoFileClip(file_path)
+    file_name = os.path.basename(file_path)
+
+    result_video_filename = f"cut_{file_name}"
+    result_video_file_path = os.path.join(output_dir_path, result_video_filename)
+
+    cuts_dir = os.path.join(output_dir_path, "cuts")
+    os.makedirs(cuts_dir, exist_ok=True)
+
+    kept_segments = get_frame_segments(cuts, video.duration, video.fps)
+    video_cuts = subclip_frames(video, kept_segments)
+
+    if save_cuts:
+        for i, (clip, segment) in enumerate(zip(video_cuts, kept_segments)):
+            clip_transcription = map_transcription_to_segments(transcription, [segment])
+            subbed_clip = add_subtitles_to_frames(video=clip, transcription=clip_transcription)
+            subbed_clip.write_videofile(os.path.join(cuts_dir, f"{i}_{file_name}"), codec="libx264")
+    else:
+        result_transcription = map_transcription_to_segments(transcription, kept_segments)
+        result_video = concatenate_videoclips(video_cuts)
+        result_video = add_subtitles_to_frames(video=result_video, transcription=result_transcription)
+        result_video.write_videofile(result_video_file_path, codec="libx264")
+        result_video.close()
+
+    video.close()
+    for clip in video_cuts:
+        clip.close()
+
+    return result_video_file_path
+
+
+def count_render_output(file_path: str, result_video_path: str):
+    """ Adds the bytes read and written and the frames rendered by a render to the current trace span. """
+    if not tracing.is_enabled() or not os.path.exists(result_video_path):
+        return
+    infos = probe_video(result_video_path)
+    tracing.count(
+        bytes_read=os.path.getsize(file_path),
+        bytes_written=os.path.getsize(result_video_path),
+        frames=int(round(infos["duration"] * infos["video_fps"])) if infos["video_found"] else 0
+    )
+
+
+@tracing.traced
 def process_video(
         file_path: str,
         output_dir_path: str,
         cuts: List[Tuple[float, float]],
         transcription: Transcription,
         save_cuts: bool = True,
-        generate_subtitles: bool = True
-
+        generate_subtitles: bool = True,
+        cut_engine: Optional[str] = None,
+        single_pass: bool = True,
+        audio_buffer: Optional[AudioBuffer] = None,
+        subtitles_mode: str = FRAMES_SUBTITLES,
+        subtitle_formats: Tuple[str, ...] = ()
 ):
+    """
+    :param single_pass: Burn subtitles and apply cuts in one render. Otherwise a fully subtitled
+        intermediate video is written first and then cut.
+    :param cut_engine: With "parallel", the single pass render is split into chunks across a process pool.
+        With "cached", only the pieces of the output missing from the segment cache are rendered.
+        By default "smart" with soft subtitles, so the video is mostly stream-copied, and "moviepy" otherwise.
+    :param subtitles_mode: "frames" draws the subtitles on the frames in Python, "soft" cuts with cut_engine
+        and muxes the subtitles as a track without re-encoding, "burn" cuts and burns them in with ffmpeg.
+    :param subtitle_formats: Sidecar subtitle files ("srt", "vtt", "ass") to write next to the result.
+    """
+    if cut_engine is None:
+        cut_engine = SMART_ENGINE if generate_subtitles and subtitles_mode == SOFT_SUBTITLES else MOVIEPY_ENGINE
+
+    if generate_subtitles and subtitles_mode == SOFT_SUBTITLES:
+        result_video_path = soft_subtitle_video(
+            file_path=file_path,
+            output_dir_path=output_dir_path,
+            cuts=cuts,
+            transcription=transcription,
+            save_cuts=save_cuts,
+            engine=cut_engine,
+            formats=subtitle_formats or (SRT,)
+        )
+        # The sidecar files are written with the track
+        subtitle_formats = ()
 
-    if not generate_subtitles:
+    elif generate_subtitles and subtitles_mode == BURN_SUBTITLES:
+        result_video_path = burn_subtitles_video(
+            file_path=file_path,
+            output_dir_path=output_dir_path,
+            cuts=cuts,
+            transcription=transcription,
+            save_cuts=save_cuts
+        )
+
+    elif generate_subtitles and subtitles_mode != FRAMES_SUBTITLES:
+        raise ValueError(f"Unsupported subtitles mode: {subtitles_mode}")
+
+    elif not generate_subtitles:
         result_video_path = cut_media(
             file_path=file_path,
             output_dir_path=output_dir_path,
             cuts=cuts,
+            save_cuts=save_cuts,
+            engine=cut_engine,
+            audio_buffer=audio_buffer
+        )
+
+    elif single_pass and cut_engine == PARALLEL_ENGINE:
+        result_video_path = parallel_cut_video(
+            file_path=file_path,
+            output_dir_path=output_dir_path,
+            cuts=cuts,
+            transcription=transcription,
+            save_cuts=save_cuts
+        )
+
+    elif single_pass and cut_engine == CACHED_ENGINE:
+        result_video_path = cached_cut_video(
+            file_path=file_path,
+            output_dir_path=output_dir_path,
+            cuts=cuts,
+            transcription=transcription,
+            save_cuts=save_cuts
+        )
+
+    elif single_pass:
+        result_video_path = cut_video_with_subtitles(
+            file_path=file_path,
+            output_dir_path=output_dir_path,
+            cuts=cuts,
+            transcription=transcription,
             save_cuts=save_cuts
         )
 
@@ -68,122 +224,460 @@ def process_video(
             file_path=subbed_video_path,
             output_dir_path=output_dir_path,
             cuts=cuts,
-            save_cuts=save_cuts
+            save_cuts=save_cuts,
+            engine=cut_engine
         )
 
+    if subtitle_formats:
+        infos = probe_video(file_path)
+        kept_segments = get_frame_segments(cuts, infos["duration"], infos["video_fps"])
+        export_subtitles(map_transcription_to_segments(transcription, kept_segments), result_video_path,
+                         subtitle_formats, width=infos["video_size"][0], height=infos["video_size"][1])
+
+    count_render_output(file_path, result_video_path)
     return result_video_path
 
 
 class VideoProcessor:
     pause_margin: Tuple[float, float] = (0.0, 0.2)
+    openai_model_id: str = 'gpt-4'
+    stage_workers: int = 4
+    # (duration, overlap) in seconds of the transcript windows sent to the LLM concurrently
+    llm_window: Tuple[float, float] = (300.0, 30.0)
+    # "local" finds repetitions offline and only asks the LLM about ambiguous ones, "llm" asks for all of them
+    repetition_engine: str = LOCAL_REPETITIONS
 
     def __init__(
             self,
-            media_archive: MediaArchive = archive,
-            voice_detector: VoiceDetector = detector,
-            transcript_client: TranscriptClient = transcriptor,
+            media_archive: Optional[MediaArchive] = None,
+            voice_detector: Optional[VoiceDetector] = None,
+            transcript_client: Optional["TranscriptClient"] = None,
+            audio_extractor: Optional[AudioExtractor] = None,
             source_videos_dir: str = SOURCE_VIDEOS_DIR,
             result_videos_dir: str = RESULT_VIDEOS_DIR
     ):
-        self.media_archive = media_archive
-        self.transcript_client = transcript_client
-        self.voice_detector = voice_detector
+        """ Components that are not given are the shared instances, only built when a stage first needs them. """
+        self._media_archive = media_archive
+        self._transcript_client = transcript_client
+        self._voice_detector = voice_detector
+        self._audio_extractor = audio_extractor
         self.source_videos_dir = source_videos_dir
         self.result_videos_dir = result_videos_dir
+        self.stage_lock = threading.Lock()
+
+    @property
+    def media_archive(self) -> MediaArchive:
+        if self._media_archive is None:
+            self._media_archive = get_archive()
+        return self._media_archive
+
+    @property
+    def transcript_client(self) -> "TranscriptClient":
+        if self._transcript_client is None:
+            self._transcript_client = get_transcriptor()
+        return self._transcript_client
+
+    @property
+    def voice_detector(self) -> VoiceDetector:
+        if self._voice_detector is None:
+            self._voice_detector = get_detector()
+        return self._voice_detector
+
+    @property
+    def audio_extractor(self) -> AudioExtractor:
+        if self._audio_extractor is None:
+            self._audio_extractor = get_extractor()
+        return self._audio_extractor
+
+    def print_audio_report(self, file_path: str):
+        """ Prints the audio decode report of the file, when the extractor was used at all. """
+        if self._audio_extractor is not None:
+            self._audio_extractor.print_report(file_path)
+
+    def stage_is_fresh(self, media: Media, field: str, key: str) -> bool:
+        with self.stage_lock:
+            return media.is_fresh(field, key)
+
+    def save_stage(self, media: Media, key: str, **fields):
+        """ Stores the stage results and archives the media right away, stages finish from several threads. """
+        with self.stage_lock:
+            for field, value in fields.items():
+                media.set_stage(field, value, key)
+            self.media_archive.add_media(media)
 
-    def process_video(
-            self,
-            file_name: str,
-            language: str = Language.english,
-            correct_grammar: bool = True,
-            generate_subtitles: bool = True,
-            find_repetitions: bool = True,
-            save_cuts: bool = False,
-            extract_relevant: bool = False,
-            split_into_parts: bool = True
-    ):
-
-        file_path = os.path.join(self.source_videos_dir, file_name)
-        result_dir = os.path.join(self.result_videos_dir, file_name.split(".")[0])
-
-        if self.media_archive.media_exists(file_path):
-            print("Loading cached media.")
-            media = self.media_archive.get_media(file_path)
+    def source_stage(self, file_path: str) -> dict:
+        """ Fingerprints the file and, when it is not archived yet, decodes its audio for the upload and VAD. """
+        fingerprint = fingerprint_file(file_path)
+        with self.stage_lock:
+            media = self.media_archive.find_media(file_path, fingerprint)
+        audio = self.audio_extractor(file_path, fingerprint) if media is None else None
+        return {"archived_media": media, "fingerprint": fingerprint, "audio": audio}
+
+    def media_stage(self, file_path: str, language: str, archived_media: Optional[Media], fingerprint: str,
+                    audio: Optional[AudioBuffer]) -> dict:
+        media = archived_media
+        if media is not None:
+            print(f"Loading cached media {os.path.basename(file_path)}.")
             assert media.language == language, "Languages mismatch from ached media."
         else:
-            print("Uploading media to Transcriptions API.")
-            media = self.transcript_client.submit(file_path, language)
+            print(f"Uploading media {os.path.basename(file_path)} to Transcriptions API.")
+            media = self.transcript_client.submit(file_path, language, fingerprint=fingerprint, audio=audio)
+        return {"media": media}
 
-        if media.transcription is None:
+    def transcription_stage(self, media: Media, fingerprint: str) -> dict:
+        transcription_key = stage_key("transcription", fingerprint, language=media.language)
+        if not self.stage_is_fresh(media, "transcription", transcription_key):
             print("Processing  transcription.")
             transcription = self.transcript_client.get_transcription_with_wait(media, max_wait=20)
-            transcription = process_special_characters(transcription, language)
-            print(f"Transcription for video {file_name}:\n{transcription}")
-            media.transcription = transcription
-            self.media_archive.add_media(media)
-
-        if media.speech_segments is None:
+            transcription = process_special_characters(transcription, media.language)
+            print(f"Transcription for video {os.path.basename(media.file_path)}:\n{transcription}")
+            self.save_stage(media, transcription_key, transcription=transcription)
+        return {"transcription": media.transcription, "transcription_key": transcription_key}
+
+    def speech_stage(self, media: Media, fingerprint: str) -> dict:
+        speech_key = stage_key(
+            "speech_segments", fingerprint,
+            model_id=self.voice_detector.model_id,
+            pause_margin=self.pause_margin,
+            window=(self.voice_detector.window_duration, self.voice_detector.window_overlap)
+        )
+        if not self.stage_is_fresh(media, "speech_segments", speech_key) \
+                or not self.stage_is_fresh(media, "pause_segments", speech_key):
             print("Identifying speech pauses.")
-            speech_segments, pause_segments = self.voice_detector(file_path, pause_margin=self.pause_margin)
-            transcription = sync_transcription_to_pauses(
-                transcription=media.transcription,
-                speech_segments=speech_segments)
-            media.transcription = transcription
-            media.pause_segments = pause_segments
-            media.speech_segments = speech_segments
-            self.media_archive.add_media(media)
-
+            audio = self.audio_extractor(media.file_path, fingerprint)
+            with tracing.span("voice_activity_detection", model_id=self.voice_detector.model_id):
+                speech_segments, pause_segments = self.voice_detector(
+                    media.file_path,
+                    pause_margin=self.pause_margin,
+                    audio=audio
+                )
+            self.save_stage(media, speech_key, speech_segments=speech_segments, pause_segments=pause_segments)
+        return {"speech_segments": media.speech_segments, "pause_segments": media.pause_segments,
+                "speech_key": speech_key}
+
+    @staticmethod
+    def text_stage(transcription: Transcription, transcription_key: str, speech_segments: List[Tuple[float, float]],
+                   speech_key: str) -> dict:
+        synced_transcription = sync_transcription_to_pauses(
+            transcription=transcription,
+            speech_segments=speech_segments)
         paragraphs = merge_transcript_words(
-            transcribed_words=media.transcription.words,
-            speech_segments=media.speech_segments
+            transcribed_words=synced_transcription.words,
+            speech_segments=speech_segments
         )
-        text = "\n".join(paragraphs)
-
-        if correct_grammar and media.corrected_transcription is None:
+        return {
+            "synced_transcription": synced_transcription,
+            "text": "\n".join(paragraphs),
+            "text_key": stage_key("text", transcription_key, speech_key)
+        }
+
+    def correction_stage(self, media: Media, synced_transcription: Transcription,
+                         speech_segments: List[Tuple[float, float]], text_key: str, enabled: bool) -> dict:
+        correction_key = stage_key(
+            "corrected_transcription", text_key,
+            model_id=self.openai_model_id,
+            prompts=[HIGHLIGHT_MISTAKES, CORRECT_WORDS_INDICES],
+            window=self.llm_window
+        )
+        if enabled and not self.stage_is_fresh(media, "corrected_transcription", correction_key):
             print("Correcting transcription grammar.")
-            corrected_transcription = correct_transcription(
-                text_str=text,
-                transcription=media.transcription,
-                language=media.language
+            corrected_transcription = correct_transcription_windowed(
+                transcription=synced_transcription,
+                speech_segments=speech_segments,
+                language=media.language,
+                openai_model_id=self.openai_model_id,
+                window_duration=self.llm_window[0],
+                overlap=self.llm_window[1]
             )
-            media.corrected_transcription = corrected_transcription
-            self.media_archive.add_media(media)
-
-        transcription = media.corrected_transcription if media.corrected_transcription is not None else media.transcription
-
-        if find_repetitions and media.repetition_segments is None:
-            print("Identifying repetitions.")
-            repetition_segments = find_repetitions_timestamps(
-                text_str=text,
-                transcription=transcription,
-                language=media.language
+            self.save_stage(media, correction_key, corrected_transcription=corrected_transcription)
+
+        if self.stage_is_fresh(media, "corrected_transcription", correction_key):
+            return {"source_transcription": media.corrected_transcription, "source_key": correction_key}
+        return {"source_transcription": synced_transcription, "source_key": text_key}
+
+    def repetitions_stage(self, media: Media, source_transcription: Transcription,
+                          speech_segments: List[Tuple[float, float]], source_key: str, enabled: bool) -> dict:
+        if self.repetition_engine not in (LOCAL_REPETITIONS, LLM_REPETITIONS):
+            raise ValueError(f"Unsupported repetition engine: {self.repetition_engine}")
+        if self.repetition_engine == LOCAL_REPETITIONS:
+            repetitions_key = stage_key(
+                "repetition_segments", source_key,
+                engine=LOCAL_REPETITIONS,
+                model_id=self.openai_model_id,
+                prompts=[CONFIRM_REPETITIONS],
+                detector=(MAX_NGRAM, MAX_RESTART_WORDS, MIN_RESTART_MATCH, MIN_UNPAUSED_RESTART_MATCH, RESTART_PAUSE,
+                          SENTENCE_ENDS)
+            )
+        else:
+            repetitions_key = stage_key(
+                "repetition_segments", source_key,
+                model_id=self.openai_model_id,
+                prompts=[HIGHLIGHT_REPETITIONS, EXTRACT_CUT_INDICES],
+                window=self.llm_window
             )
-            media.repetition_segments = repetition_segments
-            self.media_archive.add_media(media)
 
-        if split_into_parts and media.parts is None:
+        if enabled and not self.stage_is_fresh(media, "repetition_segments", repetitions_key):
+            print("Identifying repetitions.")
+            if self.repetition_engine == LOCAL_REPETITIONS:
+                repetition_segments = detect_repetitions(
+                    transcription=source_transcription,
+                    language=media.language,
+                    openai_model_id=self.openai_model_id
+                )
+            else:
+                repetition_segments = find_repetitions_windowed(
+                    transcription=source_transcription,
+                    speech_segments=speech_segments,
+                    language=media.language,
+                    openai_model_id=self.openai_model_id,
+                    window_duration=self.llm_window[0],
+                    overlap=self.llm_window[1]
+                )
+            self.save_stage(media, repetitions_key, repetition_segments=repetition_segments)
+
+        if self.stage_is_fresh(media, "repetition_segments", repetitions_key):
+            return {"repetition_segments": media.repetition_segments, "repetitions_key": repetitions_key}
+        return {"repetition_segments": None, "repetitions_key": None}
+
+    def parts_stage(self, media: Media, source_transcription: Transcription,
+                    speech_segments: List[Tuple[float, float]], source_key: str, enabled: bool) -> dict:
+        parts_key = stage_key(
+            "parts", source_key,
+            model_id=self.openai_model_id,
+            prompts=[IDEAS_SUMMARY, SPLIT_TRANSCRIPT_INDICES],
+            window=self.llm_window
+        )
+        if enabled and not self.stage_is_fresh(media, "parts", parts_key):
             print("Identifying parts.")
-            parts_transcriptions = find_parts(
-                text_str=text,
-                transcription=transcription,
-                language=media.language
+            parts_transcriptions = find_parts_windowed(
+                transcription=source_transcription,
+                speech_segments=speech_segments,
+                language=media.language,
+                openai_model_id=self.openai_model_id,
+                window_duration=self.llm_window[0],
+                overlap=self.llm_window[1]
             )
-            media.parts = parts_transcriptions
-            self.media_archive.add_media(media)
-
-        cuts = media.pause_segments if media.repetition_segments is None else \
-            merge_overlapping_cuts(media.repetition_segments + media.pause_segments)
-
+            self.save_stage(media, parts_key, parts=parts_transcriptions)
+
+        return {"parts": media.parts if self.stage_is_fresh(media, "parts", parts_key) else None}
+
+    @staticmethod
+    def get_cuts(pause_segments: List[Tuple[float, float]],
+                 repetition_segments: Optional[List[Tuple[float, float]]]) -> List[Tuple[float, float]]:
+        if repetition_segments is None:
+            return pause_segments
+        return merge_overlapping_cuts(repetition_segments + pause_segments)
+
+    def render_stage(self, media: Media, fingerprint: str, result_dir: str, source_transcription: Transcription,
+                     source_key: str, pause_segments: List[Tuple[float, float]], speech_key: str,
+                     repetition_segments: Optional[List[Tuple[float, float]]], repetitions_key: Optional[str],
+                     **render_options) -> dict:
+        render_key = stage_key(
+            "render", source_key, speech_key, repetitions_key,
+            result_dir=result_dir,
+            **render_options
+        )
+        if self.stage_is_fresh(media, "result_video_path", render_key) and os.path.exists(media.result_video_path):
+            print(f"Result of {os.path.basename(media.file_path)} already rendered.")
+            return {"result_video_path": media.result_video_path}
+
+        cuts = self.get_cuts(pause_segments, repetition_segments)
+        audio_buffer = None
+        if os.path.splitext(media.file_path)[1].lower() in AUDIO_EXTENSIONS \
+                and render_options.get("cut_engine") == NUMPY_ENGINE:
+            # The numpy engine cuts audio files from the extractor's PCM, decoded at the source rate for the deliverable
+            audio_buffer = self.audio_extractor(media.file_path, fingerprint,
+                                                sample_rate=probe_video(media.file_path)["audio_fps"],
+                                                channels=pcm_cut.CHANNELS)
         result_video_path = process_video(
-            file_path=file_path,
+            file_path=media.file_path,
             cuts=cuts,
-            transcription=transcription,
+            transcription=source_transcription,
             output_dir_path=result_dir,
-            generate_subtitles=generate_subtitles,
-            save_cuts=save_cuts
+            audio_buffer=audio_buffer,
+            **render_options
         )
+        self.save_stage(media, render_key, result_video_path=result_video_path)
+        return {"result_video_path": result_video_path}
+
+    def preview_stage(self, media: Media, fingerprint: str, result_dir: str, pause_segments: List[Tuple[float, float]],
+                      repetition_segments: Optional[List[Tuple[float, float]]],
+                      height: int = PREVIEW_HEIGHT, mark_cuts: bool = False) -> dict:
+        """ Renders a low resolution proxy of the cuts instead of the result, cached by cut list. """
+        cuts = self.get_cuts(pause_segments, repetition_segments)
+        preview_path = preview_video(media.file_path, result_dir, cuts, fingerprint=fingerprint, height=height,
+                                     mark_cuts=mark_cuts)
+        return {"result_video_path": preview_path}
+
+    def edit_stage(self, media: Media, fingerprint: str, result_dir: str, source_transcription: Transcription,
+                   pause_segments: List[Tuple[float, float]],
+                   repetition_segments: Optional[List[Tuple[float, float]]], **render_options) -> dict:
+        """
+        Exports the kept segments and the subtitles as a json edit for render_edit, an ffmpeg concat script,
+        a CMX3600 EDL and an OpenTimelineIO timeline, so the result can be rendered later or elsewhere.
+        """
+        timeline = build_timeline(media.file_path, self.get_cuts(pause_segments, repetition_segments),
+                                  transcription=source_transcription, fingerprint=fingerprint, **render_options)
+        return {"edit_paths": edit_decisions.export_edit(timeline, result_dir)}
+
+    def build_stages(
+            self,
+            correct_grammar: bool = True,
+            find_repetitions: bool = True,
+            split_into_parts: bool = True,
+            render: bool = True,
+            preview: bool = False,
+            mark_cuts: bool = False,
+            export_edit: bool = False,
+            profile_stage: Optional[str] = None,
+            profiler: str = tracing.CPROFILE,
+            **render_options
+    ) -> List[Stage]:
+        """
+        The processing graph: VAD runs while the transcription is pending, and the repetition and part
+        searches run concurrently once the (corrected) text is known. Each stage names the resource it
+        mostly uses, network, cpu or encode, so batches can give each resource its own pool.
+        With preview, a low resolution proxy of the cuts is rendered instead of the result. With export_edit,
+        the edit is also exported for rendering later, on its own or with render=False. With profile_stage,
+        that stage runs under the profiler ("cprofile" or "sampling") and its profile is dumped next to the result.
+        """
+        stages = [
+            Stage("source", self.source_stage,
+                  inputs=("file_path",), outputs=("archived_media", "fingerprint", "audio"), resource=CPU),
+            Stage("media", self.media_stage,
+                  inputs=("file_path", "language", "archived_media", "fingerprint", "audio"), outputs=("media",),
+                  resource=NETWORK),
+            Stage("transcription", self.transcription_stage,
+                  inputs=("media", "fingerprint"), outputs=("transcription", "transcription_key"), resource=NETWORK),
+            Stage("speech_segments", self.speech_stage,
+                  inputs=("media", "fingerprint"), outputs=("speech_segments", "pause_segments", "speech_key"),
+                  resource=CPU),
+            Stage("text", self.text_stage,
+                  inputs=("transcription", "transcription_key", "speech_segments", "speech_key"),
+                  outputs=("synced_transcription", "text", "text_key"), resource=CPU),
+            Stage("corrected_transcription", partial(self.correction_stage, enabled=correct_grammar),
+                  inputs=("media", "synced_transcription", "speech_segments", "text_key"),
+                  outputs=("source_transcription", "source_key"), resource=NETWORK),
+            Stage("repetition_segments", partial(self.repetitions_stage, enabled=find_repetitions),
+                  inputs=("media", "source_transcription", "speech_segments", "source_key"),
+                  outputs=("repetition_segments", "repetitions_key"), resource=NETWORK),
+            Stage("parts", partial(self.parts_stage, enabled=split_into_parts),
+                  inputs=("media", "source_transcription", "speech_segments", "source_key"), outputs=("parts",),
+                  resource=NETWORK),
+        ]
+        if export_edit:
+            stages.append(
+                Stage("edit", partial(self.edit_stage, **render_options),
+                      inputs=("media", "fingerprint", "result_dir", "source_transcription", "pause_segments",
+                              "repetition_segments"),
+                      outputs=("edit_paths",), resource=CPU)
+            )
+        if render and preview:
+            stages.append(
+                Stage("preview", partial(self.preview_stage, mark_cuts=mark_cuts),
+                      inputs=("media", "fingerprint", "result_dir", "pause_segments", "repetition_segments"),
+                      outputs=("result_video_path",), resource=ENCODE)
+            )
+        elif render:
+            stages.append(
+                Stage("render", partial(self.render_stage, **render_options),
+                      inputs=("media", "fingerprint", "result_dir", "source_transcription", "source_key",
+                              "pause_segments", "speech_key", "repetition_segments", "repetitions_key"),
+                      outputs=("result_video_path",), resource=ENCODE)
+            )
+        if profile_stage is not None:
+            if profile_stage not in [stage.name for stage in stages]:
+                raise ValueError(f"Unknown stage to profile: {profile_stage}")
+            stages = [tracing.profile_stage(stage, profiler) if stage.name == profile_stage else stage
+                      for stage in stages]
+        return stages
+
+    def get_result_dir(self, file_path: str) -> str:
+        return os.path.join(self.result_videos_dir, os.path.basename(file_path).split(".")[0])
 
-        return result_video_path
+    def process_video(
+            self,
+            file_name: str,
+            language: str = Language.english,
+            correct_grammar: bool = True,
+            generate_subtitles: bool = True,
+            find_repetitions: bool = True,
+            save_cuts: bool = False,
+            extract_relevant: bool = False,
+            split_into_parts: bool = True,
+            cut_engine: Optional[str] = None,
+            single_pass: bool = True,
+            render: bool = True,
+            subtitles_mode: str = FRAMES_SUBTITLES,
+            subtitle_formats: Tuple[str, ...] = (),
+            preview: bool = False,
+            mark_cuts: bool = False,
+            export_edit: bool = False,
+            trace: Optional[str] = None,
+            profile_stage: Optional[str] = None,
+            profiler: str = tracing.CPROFILE
+    ):
+        """
+        Runs the analysis stages that are not archived yet, then renders the result.
+        Every stage result is archived with a key of its inputs and parameters,
+        so changing one of them only recomputes that stage and the stages depending on it.
+        :param render: When False, stop after the analysis stages and return None.
+        :param preview: Render a downscaled ultrafast proxy of the cuts instead of the result, for reviewing
+            them before the final render. Proxies are cached per cut list, so repeated previews are instant.
+        :param mark_cuts: Mark every cut point of the preview with a short flash and beep.
+        :param export_edit: Export the edit (json job, concat script, EDL, OTIO, SRT) next to the result.
+            With render=False, the path of the json job is returned, to be rendered later by render_edit.
+        :param trace: Record the spans of the run (wall and CPU time, bytes, frames, tokens, cache hits) and
+            export them next to the result as trace_<name>.jsonl ("jsonl") or trace_<name>.json ("chrome").
+            Only one run of the process can be traced at a time, trace several videos with BatchRunner.
+        :param profile_stage: Name of a stage to run under the profiler, "cprofile" or "sampling".
+        """
+        if trace and trace not in tracing.TRACE_FORMATS:
+            raise ValueError(f"Unsupported trace format: {trace}")
+
+        file_path = os.path.join(self.source_videos_dir, file_name)
+        result_dir = self.get_result_dir(file_path)
+        stages = self.build_stages(
+            correct_grammar=correct_grammar,
+            find_repetitions=find_repetitions,
+            split_into_parts=split_into_parts,
+            render=render,
+            preview=preview,
+            mark_cuts=mark_cuts,
+            export_edit=export_edit,
+            generate_subtitles=generate_subtitles,
+            save_cuts=save_cuts,
+            cut_engine=cut_engine,
+            single_pass=single_pass,
+            subtitles_mode=subtitles_mode,
+            subtitle_formats=subtitle_formats,
+            profile_stage=profile_stage,
+            profiler=profiler
+        )
+        scheduler = StageScheduler(stages, workers=self.stage_workers)
+        tracer = tracing.start_trace() if trace else None
+        try:
+            with tracing.span("video", file=file_name):
+                results = scheduler.run(file_path=file_path, language=language, result_dir=result_dir)
+        finally:
+            if tracer is not None:
+                tracing.stop_trace()
+                os.makedirs(result_dir, exist_ok=True)
+                tracer.export(os.path.join(result_dir, f"trace_{os.path.splitext(file_name)[0]}."
+                                                       f"{tracing.TRACE_EXTENSIONS[trace]}"), trace)
+        scheduler.print_report()
+        if tracer is not None:
+            tracer.print_report()
+        if get_llm_cache() is not None:
+            get_llm_cache().print_stats()
+        if get_segment_cache() is not None:
+            get_segment_cache().print_stats()
+
+        self.print_audio_report(file_path)
+
+        if not render and export_edit:
+            return results["edit_paths"][EDIT_JSON]
+        return results.get("result_video_path")
 
 
 if __name__ == '__main__':
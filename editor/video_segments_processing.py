@@ -1,64 +1,108 @@
 from typing import List, Tuple
 
+import numpy as np
+
+from editor import intervals
 from transcriptions.objects import TranscribedWord, Transcription
+from transcriptions.word_table import WordTable
+
+# Seconds cut from the end of a rendered clip, far below a frame, so float errors never round up to one
+FRAME_EPSILON = 1e-6
 
 
 def merge_overlapping_cuts(cuts: List[Tuple[float, float]], min_duration: float = 0.3) -> List[Tuple[float, float]]:
-    cuts = sorted(cuts, key=lambda x: x[0])
-
-    overlaps = []
-    current_overlap = []
-
-    for i in range(len(cuts) - 1):
-        if cuts[i][1] + min_duration > cuts[i + 1][0]:
-            if not current_overlap:
-                current_overlap = [i]
-            current_overlap.append(i + 1)
-        else:
-            if current_overlap:
-                overlaps.append(current_overlap)
-                current_overlap = []
-
-    # Add the last overlapping group if any
-    if current_overlap:
-        overlaps.append(current_overlap)
-
-    print(f"Found {len(overlaps)} overlapping cuts {overlaps}")
-    merged_cuts = []
-    skip_indices = set()
-
-    for idx, group in enumerate(overlaps):
-        # Calculate the merged start and end for the current overlapping group
-        start = cuts[group[0]][0]
-        end = max(cuts[i][1] for i in group)
-        merged_cuts.append((start, end))
-        skip_indices.update(group)
-
-    # Add non-overlapping cuts
-    for i in range(len(cuts)):
-        if i not in skip_indices:
-            merged_cuts.append(cuts[i])
-
-    # Return sorted merged cuts
-    return sorted(merged_cuts, key=lambda x: x[0])
-
-
-def sync_transcribed_word(word: TranscribedWord, speech_segments: List[Tuple[float, float]]) -> TranscribedWord:
-    for segment_start, segment_end in speech_segments:
-        if segment_start <= word.start <= segment_end:
-            if segment_end < word.end:
-                corrected_word = TranscribedWord(
-                    word=word.word,
-                    start=word.start,
-                    end=segment_end
-                )
-                print(f"Synced {word.word} ({word.start}-{word.end}) to ({corrected_word.start}-{corrected_word.end})")
-                return corrected_word
-            return word
-    return word
+    """ Joins the cuts that overlap or are less than min_duration apart. """
+    merged_cuts = intervals.union(intervals.to_array(cuts), gap=min_duration)
+    print(f"Merged {len(cuts)} cuts into {len(merged_cuts)}.")
+    return intervals.to_list(merged_cuts)
 
 
 def sync_transcription_to_pauses(transcription: Transcription, speech_segments: List[Tuple[float, float]]):
+    """ Clips the end of every word starting in a speech segment to the end of that segment. """
     print("\nSyncing transcription to speech pauses.")
-    corrected_words = [sync_transcribed_word(word, speech_segments) for word in transcription.words]
+    segments = intervals.to_array(speech_segments)
+    starts = np.array([word.start for word in transcription.words], dtype=np.float64)
+    ends = np.array([word.end for word in transcription.words], dtype=np.float64)
+    index = intervals.containing(starts, segments)
+    segment_ends = np.where(index >= 0, segments[index, 1] if len(segments) else 0.0, np.inf)
+
+    corrected_words = []
+    for word, segment_end, synced in zip(transcription.words, segment_ends.tolist(), (segment_ends < ends).tolist()):
+        if synced:
+            word = TranscribedWord(word=word.word, start=word.start, end=segment_end)
+            print(f"Synced {word.word} to ({word.start}-{word.end})")
+        corrected_words.append(word)
     return Transcription(words=corrected_words)
+
+
+def get_kept_segments(cuts: List[Tuple[float, float]], duration: float) -> List[Tuple[float, float]]:
+    """ Inverts a list of cuts into the (start, end) segments that remain in the result. """
+    return intervals.to_list(intervals.complement(intervals.to_array(cuts), 0.0, duration))
+
+
+def snap_to_frames(segments: List[Tuple[float, float]], fps: float) -> List[Tuple[float, float]]:
+    """ Rounds segment borders to the frame grid so the video and audio tracks are cut at the same instants. """
+    snapped = []
+    for start, end in segments:
+        start, end = round(start * fps) / fps, round(end * fps) / fps
+        if end > start:
+            snapped.append((start, end))
+    return snapped
+
+
+def get_frame_segments(cuts: List[Tuple[float, float]], duration: float, fps: float) -> List[Tuple[float, float]]:
+    """
+    The kept segments on the frame grid of the video, as every video cut engine renders them. Subtitles are
+    mapped onto these, so they don't drift from the cut video by a fraction of a frame per cut.
+    """
+    return snap_to_frames(get_kept_segments(cuts, duration), fps)
+
+
+def subclip_frames(video, segments: List[Tuple[float, float]]) -> list:
+    """
+    Moviepy subclips of frame-snapped segments that render exactly their frames. Moviepy draws a frame at every
+    multiple of 1 / fps before the end of a clip, so an end a float error past the last frame adds a frame.
+    """
+    return [video.subclip(start, start + round((end - start) * video.fps) / video.fps - FRAME_EPSILON)
+            for start, end in segments]
+
+
+def map_transcription_to_segments(transcription: Transcription, kept_segments: List[Tuple[float, float]]) -> Transcription:
+    """
+    Maps word timings from the source timeline onto the timeline of the concatenated kept segments.
+    Words inside cuts are dropped, words overlapping a cut are clipped to the kept segment they overlap most.
+    Computed on the columns of a WordTable, the words are only built again for the result.
+    """
+    table = WordTable.from_transcription(transcription)
+    if not kept_segments or not len(table):
+        return Transcription(words=[])
+    offsets = []
+    output_start = 0.0
+    for start, end in kept_segments:
+        offsets.append(output_start - start)
+        output_start += end - start
+    segment_starts, segment_ends = intervals.to_array(kept_segments).T
+    offsets = np.array(offsets)
+
+    # Every word is compared with the segments from the one it starts in to the last one starting before its end
+    first = np.maximum(np.searchsorted(segment_starts, table.starts, side="right") - 1, 0)
+    last = np.searchsorted(segment_starts, table.ends, side="right") - 1
+    best_index = np.full(len(table), -1)
+    best_overlap = np.zeros(len(table))
+    instant = table.starts == table.ends
+    for step in range(int((last - first).max(initial=0)) + 1):
+        index = np.minimum(first + step, len(kept_segments) - 1)
+        overlap = np.minimum(table.ends, segment_ends[index]) - np.maximum(table.starts, segment_starts[index])
+        better = (first + step <= last) & ((overlap > best_overlap) | ((best_index < 0) & (overlap == 0) & instant))
+        best_index = np.where(better, index, best_index)
+        best_overlap = np.where(better, overlap, best_overlap)
+
+    mapped = np.nonzero(best_index >= 0)[0]
+    best_index = best_index[mapped]
+    words = table.take(mapped)
+    return WordTable(
+        np.maximum(words.starts, segment_starts[best_index]) + offsets[best_index],
+        np.minimum(words.ends, segment_ends[best_index]) + offsets[best_index],
+        words.text,
+        words.offsets
+    ).to_transcription()
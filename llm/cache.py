@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
+import dotenv
+
+dotenv.load_dotenv()
+
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 2 ** 20))
+
+
+class LLMCache:
+    """
+    Disk-backed cache of LLM responses in SQLite, keyed by the model, temperature, prompt template
+    and the inputs it is formatted with. Least recently used responses are evicted once the stored
+    responses exceed max_bytes.
+    """
+
+    def __init__(self, db_file: str, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.db_file = db_file
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model_id TEXT NOT NULL, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "latency REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(template: str, inputs: dict, openai_model_id: str, temperature: float) -> str:
+        # Inputs are formatted into the prompt with str(), so their string form identifies the prompt
+        payload = json.dumps([openai_model_id, temperature, template, inputs], sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute("SELECT response, latency FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self.connection:
+                self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            self.saved_seconds += row[1]
+            return row[0]
+
+    def put(self, key: str, response: str, openai_model_id: str, latency: float):
+        size = len(response.encode())
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model_id, response, size, latency, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, openai_model_id, response, size, latency, time.time())
+            )
+            self.evict()
+
+    def evict(self):
+        """ Deletes the least recently used responses until the cache fits in max_bytes. """
+        (total_size,) = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total_size <= self.max_bytes:
+            return
+        rows = self.connection.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total_size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total_size -= size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            entries, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+            "saved_seconds": self.saved_seconds,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+    def print_stats(self):
+        stats = self.get_stats()
+        print(
+            f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+            f"{stats['saved_seconds']:.1f}s of model latency saved, {stats['evictions']} evictions, "
+            f"{stats['entries']} entries in {stats['size_bytes'] / 2 ** 20:.1f} MiB."
+        )
+
+
+@lru_cache(maxsize=None)
+def get_llm_cache() -> Optional[LLMCache]:
+    """ The shared response cache, None when LLM_CACHE_FILE is not configured. """
+    if not LLM_CACHE_FILE:
+        return None
+    return LLMCache(LLM_CACHE_FILE)
+
+
+def test():
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = LLMCache(os.path.join(temp_dir, "llm_cache.db"), max_bytes=2000)
+        keys = [cache.key("Summarize {text}", {"text": f"text {i}"}, "gpt-4", 0) for i in range(4)]
+        assert len(set(keys)) == 4
+        assert cache.key("Summarize {text}", {"text": "text 0"}, "gpt-4", 0.5) != keys[0]
+
+        for key in keys[:2]:
+            assert cache.get(key) is None
+            cache.put(key, "x" * 800, "gpt-4", latency=3.0)
+        assert cache.get(keys[0]) == "x" * 800
+        # keys[1] is now the least recently used, and is evicted when keys[2] does not fit
+        cache.put(keys[2], "y" * 800, "gpt-4", latency=3.0)
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+        cache.print_stats()
+        cache.connection.close()
+
+
+if __name__ == '__main__':
+    test()
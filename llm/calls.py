@@ -1,11 +1,22 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
 load_dotenv()
 from pydantic import BaseModel
-from typing import List, Tuple
-from transcriptions.objects import Transcription, TranscribedWord
-from llm.prompts import IDEAS_SUMMARY, HIGHLIGHT_MISTAKES, CORRECT_TRANSCRIPTION, HIGHLIGHT_REPETITIONS, EXTRACT_TIMESTAMPS, SPLIT_TRANSCRIPT
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+from llm.cache import LLMCache, get_llm_cache
+from pipeline import tracing
+from transcriptions.objects import Transcription
+from llm.indexed_words import ResponseFormatError, encode_indexed_words, parse_cut_indices, parse_part_indices, \
+    parse_word_corrections, parse_json_list
+from llm.prompts import IDEAS_SUMMARY, HIGHLIGHT_MISTAKES, HIGHLIGHT_REPETITIONS, SPLIT_TRANSCRIPT_INDICES, \
+    CORRECT_WORDS_INDICES, EXTRACT_CUT_INDICES, CONFIRM_REPETITIONS
+from transcriptions.repetitions import RepetitionCandidate, find_repetition_candidates, merge_candidate_cuts
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+# Caps the requests in flight across all stages, videos and windows of the process
+llm_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
 
 
 def parse_output_as_code(output_str: str, language: str = 'json') -> str:
@@ -16,57 +27,67 @@ def parse_output_as_code(output_str: str, language: str = 'json') -> str:
     return output_str
 
 
+def invoke_prompt(template: str, inputs: dict, openai_model_id: str, temperature: float = 0,
+                  cache: Optional[LLMCache] = None) -> str:
+    """ Responses are served from the cache when given, or the shared cache when LLM_CACHE_FILE is set. """
+    cache = cache if cache is not None else get_llm_cache()
+    if cache is not None:
+        key = cache.key(template, inputs, openai_model_id, temperature)
+        cached_response = cache.get(key)
+        if cached_response is not None:
+            tracing.count(cache_hits=1)
+            return cached_response
+        tracing.count(cache_misses=1)
+
+    # Imported on first use, langchain is slow to import and not needed by cached runs
+    from langchain_openai import ChatOpenAI
+    from langchain_core.prompts import ChatPromptTemplate
+
+    start_time = time.perf_counter()
+    model = ChatOpenAI(model=openai_model_id, temperature=temperature)
+    prompt_template = ChatPromptTemplate.from_messages(
+        [("user", template)]
+    )
+    with llm_semaphore, tracing.span("llm_call", model=openai_model_id):
+        response = model.invoke(prompt_template.format_prompt(**inputs))
+        usage = getattr(response, "usage_metadata", None) or {}
+        tracing.count(tokens_sent=usage.get("input_tokens", 0), tokens_received=usage.get("output_tokens", 0))
+
+    if cache is not None:
+        cache.put(key, response.content, openai_model_id, latency=time.perf_counter() - start_time)
+    return response.content
+
+
 def find_parts(text_str, transcription: Transcription, language, openai_model_id='gpt-4') -> Transcription:
     print("\nSearching for parts in the speech.")
 
-    model = ChatOpenAI(model=openai_model_id, temperature=0)
-    prompt_template = ChatPromptTemplate.from_messages(
-        [("user", IDEAS_SUMMARY)]
+    ideas_summary = invoke_prompt(
+        template=IDEAS_SUMMARY,
+        inputs={
+            "text": text_str,
+            "language": language,
+        },
+        openai_model_id=openai_model_id
     )
-    response = model.invoke(
-        prompt_template.format_prompt(
-            **{
-                "text": text_str,
-                "language": language,
-            }
-        )
-    )
-    ideas_summary = response.content
     print(f"Ideas in the text:\n{ideas_summary}\n")
 
-    model = ChatOpenAI(model=openai_model_id, temperature=0)
-    prompt_template = ChatPromptTemplate.from_messages(
-        [("user", SPLIT_TRANSCRIPT)]
-    )
-    response = model.invoke(
-        prompt_template.format_prompt(
-            **{
-                "text": text_str,
-                "ideas": ideas_summary,
-                "language": language,
-                "timestamps": transcription
-            }
-        )
+    content = invoke_prompt(
+        template=SPLIT_TRANSCRIPT_INDICES,
+        inputs={
+            "text": text_str,
+            "ideas": ideas_summary,
+            "language": language,
+            "indexed_words": encode_indexed_words(transcription)
+        },
+        openai_model_id=openai_model_id
     )
-    content = response.content
     print(content)
-    content = parse_output_as_code(content, 'json')
 
     try:
-        parts = eval(content)
-        assert isinstance(parts, List)
-        parts_list = []
-        for part_dict in parts:
-            parts_list .append(
-                TranscribedWord(
-                    word=part_dict["idea"],
-                    start=part_dict["start"],
-                    end=part_dict["end"]
-                )
-            )
+        parts_list = parse_part_indices(content, transcription)
         print(parts_list)
         return parts_list
-    except Exception as e:
+    except ResponseFormatError as e:
         print(f'Unable to parse LLM response {content}: {e}')
         return []
 
@@ -74,45 +95,31 @@ def find_parts(text_str, transcription: Transcription, language, openai_model_id
 def find_repetitions_timestamps(text_str, transcription: Transcription, language, openai_model_id='gpt-4') -> List[Tuple[float, float]]:
     print("\nSearching for repetitions in speech. ")
 
-    model = ChatOpenAI(model=openai_model_id, temperature=0)
-    prompt_template = ChatPromptTemplate.from_messages(
-        [("user", HIGHLIGHT_REPETITIONS)]
-    )
-    response = model.invoke(
-        prompt_template.format_prompt(
-            **{
-                "text": text_str,
-                "language": language,
-            }
-        )
+    repetitions = invoke_prompt(
+        template=HIGHLIGHT_REPETITIONS,
+        inputs={
+            "text": text_str,
+            "language": language,
+        },
+        openai_model_id=openai_model_id
     )
-    repetitions = response.content
 
     print(repetitions)
 
-    model = ChatOpenAI(model=openai_model_id, temperature=0)
-    prompt_template = ChatPromptTemplate.from_messages(
-        [("user", EXTRACT_TIMESTAMPS)]
-    )
-    response = model.invoke(
-        prompt_template.format_prompt(
-            **{
-                "text": text_str,
-                "repetitions": repetitions,
-                "language": language,
-                "timestamps": transcription
-            }
-        )
+    content = invoke_prompt(
+        template=EXTRACT_CUT_INDICES,
+        inputs={
+            "text": text_str,
+            "repetitions": repetitions,
+            "language": language,
+            "indexed_words": encode_indexed_words(transcription)
+        },
+        openai_model_id=openai_model_id
     )
-    content = response.content
-    content = parse_output_as_code(content, 'json')
 
     try:
-        cuts = eval(content)
-        assert isinstance(cuts, List)
-        cuts = [(cut["cut_start"], cut["cut_end"]) for cut in cuts]
-        return cuts
-    except Exception as e:
+        return parse_cut_indices(content, transcription)
+    except ResponseFormatError as e:
         print(f'Unable to parse LLM response {content}: {e}')
         return []
 
@@ -120,55 +127,75 @@ def find_repetitions_timestamps(text_str, transcription: Transcription, language
 def correct_transcription(text_str, transcription: Transcription, language, openai_model_id='gpt-4') -> Transcription:
     print("\nCorrecting transcription")
 
-    model = ChatOpenAI(model=openai_model_id, temperature=0)
-    prompt_template = ChatPromptTemplate.from_messages(
-        [("user", HIGHLIGHT_MISTAKES)]
+    mistakes = invoke_prompt(
+        template=HIGHLIGHT_MISTAKES,
+        inputs={
+            "text": text_str,
+            "language": language,
+        },
+        openai_model_id=openai_model_id
     )
-    response = model.invoke(
-        prompt_template.format_prompt(
-            **{
-                "text": text_str,
-                "language": language,
-            }
-        )
-    )
-    mistakes = response.content
 
     print(mistakes)
 
-    model = ChatOpenAI(model=openai_model_id, temperature=0)
-    prompt_template = ChatPromptTemplate.from_messages(
-        [("user", CORRECT_TRANSCRIPTION)]
-    )
-    response = model.invoke(
-        prompt_template.format_prompt(
-            **{
-                "text": text_str,
-                "mistakes": mistakes,
-                "language": language,
-                "timestamps": transcription
-            }
-        )
+    content = invoke_prompt(
+        template=CORRECT_WORDS_INDICES,
+        inputs={
+            "text": text_str,
+            "mistakes": mistakes,
+            "language": language,
+            "indexed_words": encode_indexed_words(transcription)
+        },
+        openai_model_id=openai_model_id
     )
-    content = response.content
-    content = parse_output_as_code(content, 'json')
 
     try:
-        corrected_transcript = eval(content)
-        assert isinstance(corrected_transcript, List)
-        corrected_transcript_words = []
-        for word_dict in corrected_transcript:
-            corrected_transcript_words.append(
-                TranscribedWord(
-                    word=word_dict["word"],
-                    start=word_dict["start"],
-                    end=word_dict["end"]
-                )
-            )
-        return Transcription(words=corrected_transcript_words)
-    except Exception as e:
+        return parse_word_corrections(content, transcription)
+    except ResponseFormatError as e:
         print(f'Unable to parse LLM response {content}: {e}')
         return []
 
 
+def confirm_repetition_candidates(candidates: List[RepetitionCandidate], transcription: Transcription, language,
+                                  openai_model_id='gpt-4', context_words: int = 8) -> List[RepetitionCandidate]:
+    """ Asks the model which of the candidates are abandoned attempts, in a single call. """
+    if not candidates:
+        return []
+    words = [word.word for word in transcription.words]
+    passages = []
+    for i, candidate in enumerate(candidates):
+        before = words[max(0, candidate.first_index - context_words):candidate.first_index]
+        cut = words[candidate.first_index:candidate.last_index + 1]
+        after = words[candidate.last_index + 1:candidate.last_index + 1 + context_words]
+        passages.append(f"{i}: {' '.join(before)} [[{' '.join(cut)}]] {' '.join(after)}")
+
+    content = invoke_prompt(
+        template=CONFIRM_REPETITIONS,
+        inputs={
+            "candidates": "\n".join(passages),
+            "language": language,
+        },
+        openai_model_id=openai_model_id
+    )
 
+    try:
+        confirmed = {item["id"] for item in parse_json_list(content, {"id": int})}
+    except ResponseFormatError as e:
+        print(f'Unable to parse LLM response {content}: {e}')
+        return []
+    return [candidate for i, candidate in enumerate(candidates) if i in confirmed]
+
+
+def detect_repetitions(transcription: Transcription, language, openai_model_id: Optional[str] = 'gpt-4') \
+        -> List[Tuple[float, float]]:
+    """
+    Repetition cuts from the local detector. Clear candidates are cut directly, ambiguous ones only
+    when the model confirms them, or never when no openai_model_id is given.
+    """
+    candidates = find_repetition_candidates(transcription)
+    ambiguous = [candidate for candidate in candidates if candidate.ambiguous]
+    confirmed = confirm_repetition_candidates(ambiguous, transcription, language, openai_model_id) \
+        if openai_model_id and ambiguous else []
+    print(f"Found {len(candidates) - len(ambiguous)} repetitions, confirmed {len(confirmed)} of {len(ambiguous)} "
+          f"ambiguous ones.")
+    return merge_candidate_cuts([candidate for candidate in candidates if not candidate.ambiguous] + confirmed)
@@ -0,0 +1,128 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+from transcriptions.objects import TranscribedWord, Transcription
+
+PARAGRAPH_GAP = 0.8
+
+
+class ResponseFormatError(ValueError):
+    pass
+
+
+def encode_indexed_words(transcription: Transcription, paragraph_gap: float = PARAGRAPH_GAP) -> str:
+    """
+    Compact prompt form of a transcription: "index:word" tokens, with a new line wherever the speaker
+    pauses for more than paragraph_gap seconds. Timestamps are left out, answers refer to word indices.
+    """
+    lines, line = [], []
+    for index, word in enumerate(transcription.words):
+        if line and word.start - transcription.words[index - 1].end > paragraph_gap:
+            lines.append(" ".join(line))
+            line = []
+        line.append(f"{index}:{word.word}")
+    if line:
+        lines.append(" ".join(line))
+    return "\n".join(lines)
+
+
+def parse_json_list(content: str, fields: Dict[str, type]) -> List[dict]:
+    """
+    Strictly parses a JSON list of objects holding the given fields, accepting only a surrounding
+    markdown code fence around it.
+    """
+    content = content.strip()
+    fence = re.fullmatch(r"```(?:json)?\s*(.*?)\s*```", content, flags=re.DOTALL)
+    if fence:
+        content = fence.group(1)
+    try:
+        items = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ResponseFormatError(f"Response is not valid JSON: {e}") from e
+
+    if not isinstance(items, list):
+        raise ResponseFormatError(f"Expected a JSON list, got {type(items).__name__}")
+    for item in items:
+        if not isinstance(item, dict):
+            raise ResponseFormatError(f"Expected a JSON object, got {item!r}")
+        for field, field_type in fields.items():
+            # bool is an int subclass, but never a valid index
+            if not isinstance(item.get(field), field_type) or isinstance(item.get(field), bool):
+                raise ResponseFormatError(f"Field {field} of {item!r} is not a {field_type.__name__}")
+    return items
+
+
+def check_index(index: int, words: List[TranscribedWord]):
+    if not 0 <= index < len(words):
+        raise ResponseFormatError(f"Word index {index} out of range 0-{len(words) - 1}")
+
+
+def index_range_times(item: dict, words: List[TranscribedWord]) -> Tuple[float, float]:
+    """ The exact (start, end) time of the words from item["first"] to item["last"]. """
+    first, last = item["first"], item["last"]
+    check_index(first, words)
+    check_index(last, words)
+    if last < first:
+        raise ResponseFormatError(f"Word range {first}-{last} is reversed")
+    return words[first].start, words[last].end
+
+
+def parse_cut_indices(content: str, transcription: Transcription) -> List[Tuple[float, float]]:
+    items = parse_json_list(content, {"first": int, "last": int})
+    return [index_range_times(item, transcription.words) for item in items]
+
+
+def parse_part_indices(content: str, transcription: Transcription) -> List[TranscribedWord]:
+    items = parse_json_list(content, {"first": int, "last": int, "idea": str})
+    parts = []
+    for item in items:
+        start, end = index_range_times(item, transcription.words)
+        parts.append(TranscribedWord(word=item["idea"], start=start, end=end))
+    return parts
+
+
+def parse_word_corrections(content: str, transcription: Transcription) -> Transcription:
+    """ Applies the corrected words to the transcription, an empty word removes the word. """
+    items = parse_json_list(content, {"index": int, "word": str})
+    corrections = {}
+    for item in items:
+        check_index(item["index"], transcription.words)
+        corrections[item["index"]] = item["word"].strip()
+
+    words = []
+    for index, word in enumerate(transcription.words):
+        corrected = corrections.get(index, word.word)
+        if corrected:
+            words.append(TranscribedWord(word=corrected, start=word.start, end=word.end))
+    return Transcription(words=words)
+
+
+def test():
+    transcription = Transcription(words=[
+        TranscribedWord(word="So", start=0.0, end=0.2),
+        TranscribedWord(word="we", start=0.3, end=0.4),
+        TranscribedWord(word="so", start=1.5, end=1.7),
+        TranscribedWord(word="we", start=1.8, end=1.9),
+        TranscribedWord(word="start", start=2.0, end=2.4),
+    ])
+    assert encode_indexed_words(transcription) == "0:So 1:we\n2:so 3:we 4:start"
+
+    assert parse_cut_indices('```json\n[{"first": 0, "last": 1}]\n```', transcription) == [(0.0, 0.4)]
+    parts = parse_part_indices('[{"first": 2, "last": 4, "idea": "Start"}]', transcription)
+    assert (parts[0].start, parts[0].end, parts[0].word) == (1.5, 2.4, "Start")
+    corrected = parse_word_corrections('[{"index": 4, "word": "start."}, {"index": 1, "word": ""}]', transcription)
+    assert [w.word for w in corrected.words] == ["So", "so", "we", "start."]
+
+    for content in ['[{"first": 0, "last": 9}]', '[{"first": 1.0, "last": 2}]', '{"first": 0}',
+                    'Here are the cuts: []', '[{"first": 3, "last": 1}]', '[{"first": true, "last": 1}]']:
+        try:
+            parse_cut_indices(content, transcription)
+        except ResponseFormatError as e:
+            print(f"Rejected {content}: {e}")
+        else:
+            raise AssertionError(f"Accepted {content}")
+
+
+if __name__ == '__main__':
+    test()
@@ -117,3 +117,97 @@ Return a JSON list of dicts with the fields:
 
 Return only the JSON dict without any additional text or explanation. If no highlights exist, return an empty list.
 """
+
+
+# Index based variants of the timestamp prompts. The words are given as "index:word", one paragraph
+# per line, and the model answers with word indices that are mapped back to exact timestamps.
+
+SPLIT_TRANSCRIPT_INDICES = """
+Here is a transcript of an audio in {language} representing a monologue / discussion on a specific topic.
+'''
+{text}
+'''
+Here are the main ideas i the text:
+'''
+{ideas}
+'''
+
+We now need to split the transcript into the parts corresponding to each idea.
+These are the words of the transcript, each preceded by its index, one paragraph per line:
+'''
+{indexed_words}
+'''
+
+List the first and last word index of each idea.
+Return a JSON list of objects with the fields:
+- first: index of the first word of the part
+- last: index of the last word of the part
+- idea: idea summary
+
+Return only the JSON list without any additional text or explanation
+"""
+
+
+CORRECT_WORDS_INDICES = """
+Here is a transcript of an audio file with a speech in {language}:
+'''
+{text}
+'''
+There are some mistakes from the speech-to-text engine that was used. 
+Some words were mistakenly interpreted, probably because they sounded similar to other words. 
+There might also be grammar or semantic problems. 
+
+We have identified some parts where this happens:
+{mistakes}
+
+These are the words of the transcript, each preceded by its index, one paragraph per line:
+{indexed_words}
+
+List only the words that need to change. If punctuation was added, make it part of the word it follows.
+Return a JSON list of objects with the fields:
+- index: index of the word
+- word: corrected word, or an empty string to remove the word
+
+Return only the JSON list without any additional text or explanation. If nothing needs to change, return an empty list.
+"""
+
+
+EXTRACT_CUT_INDICES = """
+Here is a transcript of an audio file with a speech in {language}:
+'''
+{text}
+'''
+The speaker sometimes starts a sentence, stops midway, and restarts it. 
+This can happen multiple times for the same sentence as the speaker tries to find the correct formulation. 
+The final successful attempt is where the sentence is fully completed without interruption.
+
+We have identified some parts where this happens:
+{repetitions}
+
+We now need to identify the exact words to cut.
+These are the words of the transcript, each preceded by its index, one paragraph per line:
+{indexed_words}
+
+Return a JSON list of objects with the fields:
+- first: index of the first word to cut
+- last: index of the last word to cut
+
+Return only the JSON list without any additional text or explanation. If no highlights exist, return an empty list.
+"""
+
+
+CONFIRM_REPETITIONS = """
+Here is a transcript of an audio file with a speech in {language}.
+The speaker sometimes starts a sentence, stops midway, and restarts it.
+
+These passages were flagged as possible abandoned attempts. In each one, the words between [[ and ]]
+would be cut and the sentence would continue with the words after them:
+{candidates}
+
+Confirm only the passages where the words between [[ and ]] are really an abandoned attempt that
+the speaker repeats or restarts, and not words said twice on purpose.
+Return a JSON list of objects with the field:
+- id: id of a confirmed passage
+
+Return only the JSON list without any additional text or explanation. If no passage is confirmed, return an empty list.
+"""
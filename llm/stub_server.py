@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import time
+import uuid
+
+from aiohttp import web
+
+STUB_SUMMARY = "The speaker presents a single idea."
+
+
+class StubLLMServer:
+    """
+    Local stand-in for the OpenAI chat completions API, served under /v1. Prompts asking for a JSON
+    list are answered with an empty list, the others with a fixed summary, after response_delay seconds.
+    Point langchain at it with the OPENAI_API_BASE environment variable.
+    """
+    api_prefix = "/v1"
+
+    def __init__(self, response_delay: float = 0.5):
+        self.response_delay = response_delay
+        self.requests = 0
+        self.prompt_chars = 0
+        self.runner = None
+        self.base_url = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(f"{self.api_prefix}/chat/completions", self.handle_completion)
+        return app
+
+    @staticmethod
+    def respond(prompt: str) -> str:
+        return "[]" if "JSON" in prompt else STUB_SUMMARY
+
+    async def handle_completion(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        body = await request.json()
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        self.prompt_chars += len(prompt)
+        await asyncio.sleep(self.response_delay)
+
+        content = self.respond(prompt)
+        return web.json_response({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        })
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "StubLLMServer":
+        self.runner = web.AppRunner(self.make_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        bound_port = self.runner.addresses[0][1]
+        self.base_url = f"http://{host}:{bound_port}{self.api_prefix}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+        self.runner = None
+
+
+def test():
+    import aiohttp
+
+    async def run():
+        server = await StubLLMServer(response_delay=0.1).start()
+        async with aiohttp.ClientSession() as session:
+            contents = []
+            for prompt in ["Summarize the ideas of the text.", "Return a JSON list of objects with the fields:"]:
+                async with session.post(f"{server.base_url}/chat/completions", json={
+                    "model": "gpt-4", "messages": [{"role": "user", "content": prompt}]
+                }) as response:
+                    contents.append((await response.json())["choices"][0]["message"]["content"])
+        assert contents == [STUB_SUMMARY, "[]"], contents
+        print(f"{server.requests} requests, {server.prompt_chars} prompt characters.")
+        await server.stop()
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--response-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    server = StubLLMServer(response_delay=args.response_delay)
+    print(f"Serving on http://{args.host}:{args.port}{server.api_prefix}")
+    web.run_app(server.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
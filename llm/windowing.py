@@ -0,0 +1,176 @@
+import contextvars
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Tuple, TypeVar
+
+import dotenv
+import numpy as np
+
+from editor import intervals
+from llm.calls import correct_transcription, find_parts, find_repetitions_timestamps
+from transcriptions.objects import TranscribedWord, Transcription
+
+dotenv.load_dotenv()
+
+LLM_WINDOW_WORKERS = int(os.getenv("LLM_WINDOW_WORKERS", 8))
+WINDOW_DURATION = 300.0
+WINDOW_OVERLAP = 30.0
+
+T = TypeVar("T")
+
+
+class TranscriptWindow(NamedTuple):
+    """
+    A part of the transcript sent in one LLM call. The window holds whole paragraphs: the ones it
+    owns, between core_start and core_end, plus the neighbouring ones within the overlap as context.
+    Cores of consecutive windows partition the timeline.
+    """
+    core_start: float
+    core_end: float
+    text: str
+    transcription: Transcription
+
+    def owns(self, start: float, end: float) -> bool:
+        """ Whether a result spanning (start, end) belongs to this window, decided by its midpoint. """
+        return self.core_start <= (start + end) / 2 < self.core_end
+
+
+def split_paragraphs(transcription: Transcription, speech_segments: List[Tuple[float, float]]) \
+        -> List[List[TranscribedWord]]:
+    """ The words of each speech segment, a word belonging to the first segment that ends after it. """
+    ends = np.array([word.end for word in transcription.words], dtype=np.float64)
+    paragraphs = [[] for _ in speech_segments]
+    for word, index in zip(transcription.words, intervals.assign(ends, intervals.to_array(speech_segments)).tolist()):
+        paragraphs[index].append(word)
+    return paragraphs
+
+
+def split_into_windows(
+        transcription: Transcription,
+        speech_segments: List[Tuple[float, float]],
+        window_duration: float = WINDOW_DURATION,
+        overlap: float = WINDOW_OVERLAP
+) -> List[TranscriptWindow]:
+    """ Groups consecutive paragraphs into windows of about window_duration seconds, aligned to speech segments. """
+    if not speech_segments:
+        return [TranscriptWindow(-math.inf, math.inf, " ".join(w.word for w in transcription.words), transcription)]
+
+    paragraphs = split_paragraphs(transcription, speech_segments)
+    groups, group_start = [], 0
+    for i, (start, end) in enumerate(speech_segments):
+        if i > group_start and end - speech_segments[group_start][0] > window_duration:
+            groups.append((group_start, i))
+            group_start = i
+    groups.append((group_start, len(speech_segments)))
+
+    windows = []
+    for group_index, (first, last) in enumerate(groups):
+        core_start = speech_segments[first][0] if group_index > 0 else -math.inf
+        core_end = speech_segments[last][0] if last < len(speech_segments) else math.inf
+        context_first, context_last = first, last
+        while context_first > 0 and speech_segments[context_first - 1][1] > speech_segments[first][0] - overlap:
+            context_first -= 1
+        while context_last < len(speech_segments) \
+                and speech_segments[context_last][0] < speech_segments[last - 1][1] + overlap:
+            context_last += 1
+
+        window_paragraphs = [p for p in paragraphs[context_first:context_last] if p]
+        windows.append(TranscriptWindow(
+            core_start=core_start,
+            core_end=core_end,
+            text="\n".join(" ".join(word.word for word in paragraph) for paragraph in window_paragraphs),
+            transcription=Transcription(words=[word for paragraph in window_paragraphs for word in paragraph])
+        ))
+    return windows
+
+
+def map_windows(function: Callable[[TranscriptWindow], T], windows: List[TranscriptWindow],
+                max_workers: int = LLM_WINDOW_WORKERS) -> List[T]:
+    """
+    Runs the window calls concurrently, returning the results in window order. Each call runs in a copy of
+    the caller's context, so the trace spans of the calls nest in the caller's span. The requests themselves
+    are capped by LLM_MAX_CONCURRENCY across all the calls of the process, whatever max_workers is.
+    """
+    if len(windows) == 1:
+        return [function(windows[0])]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, function, window) for window in windows]
+        return [future.result() for future in futures]
+
+
+def merge_cuts(cuts: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    return intervals.to_list(intervals.union(intervals.to_array(cuts)))
+
+
+def find_repetitions_windowed(transcription: Transcription, speech_segments: List[Tuple[float, float]], language,
+                              openai_model_id='gpt-4', window_duration: float = WINDOW_DURATION,
+                              overlap: float = WINDOW_OVERLAP) -> List[Tuple[float, float]]:
+    """ find_repetitions_timestamps over windows, keeping the cuts each window owns. """
+    windows = split_into_windows(transcription, speech_segments, window_duration, overlap)
+    results = map_windows(
+        lambda window: find_repetitions_timestamps(window.text, window.transcription, language, openai_model_id),
+        windows
+    )
+    cuts = [cut for window, window_cuts in zip(windows, results) for cut in window_cuts if window.owns(*cut)]
+    return merge_cuts(cuts)
+
+
+def correct_transcription_windowed(transcription: Transcription, speech_segments: List[Tuple[float, float]],
+                                   language, openai_model_id='gpt-4', window_duration: float = WINDOW_DURATION,
+                                   overlap: float = WINDOW_OVERLAP) -> Transcription:
+    """
+    correct_transcription over windows, keeping the corrected words each window owns.
+    A window whose response can not be parsed keeps its original words.
+    """
+    windows = split_into_windows(transcription, speech_segments, window_duration, overlap)
+    results = map_windows(
+        lambda window: correct_transcription(window.text, window.transcription, language, openai_model_id),
+        windows
+    )
+    words = []
+    for window, corrected in zip(windows, results):
+        window_words = corrected.words if isinstance(corrected, Transcription) and corrected.words \
+            else window.transcription.words
+        words += [word for word in window_words if window.owns(word.start, word.end)]
+    return Transcription(words=sorted(words, key=lambda word: word.start))
+
+
+def find_parts_windowed(transcription: Transcription, speech_segments: List[Tuple[float, float]], language,
+                        openai_model_id='gpt-4', window_duration: float = WINDOW_DURATION,
+                        overlap: float = WINDOW_OVERLAP) -> List[TranscribedWord]:
+    """
+    find_parts over windows, keeping the parts each window owns. A part crossing a window border is
+    returned by the window holding most of it.
+    """
+    windows = split_into_windows(transcription, speech_segments, window_duration, overlap)
+    results = map_windows(
+        lambda window: find_parts(window.text, window.transcription, language, openai_model_id),
+        windows
+    )
+    parts = [part for window, window_parts in zip(windows, results) for part in window_parts
+             if window.owns(part.start, part.end)]
+    return sorted(parts, key=lambda part: part.start)
+
+
+def test():
+    speech_segments = [(i * 60.0, i * 60.0 + 55.0) for i in range(20)]
+    words = [TranscribedWord(word=f"w{i}", start=i * 5.0, end=i * 5.0 + 4.0) for i in range(240) if i % 12 != 11]
+    transcription = Transcription(words=words)
+    windows = split_into_windows(transcription, speech_segments, window_duration=300, overlap=30)
+    print(f"{len(windows)} windows: {[(w.core_start, w.core_end, len(w.transcription.words)) for w in windows]}")
+
+    # Every word is owned by exactly one window, and each window sees the neighbouring paragraphs
+    owners = [sum(window.owns(word.start, word.end) for window in windows) for word in words]
+    assert all(count == 1 for count in owners)
+    assert all(len(window.transcription.words) > 55 for window in windows[1:-1])
+
+    # A cut found by two overlapping windows is kept once
+    cut = (299.0, 302.0)
+    kept = [cut for window in windows[:2] if window.owns(*cut)]
+    assert len(kept) == 1
+    assert merge_cuts([(1, 3), (2, 4), (5, 6)]) == [(1, 4), (5, 6)]
+
+
+if __name__ == '__main__':
+    test()
@@ -1,3 +1,15 @@
+from functools import lru_cache
+
 from media_archive.media_archive import MediaArchive
 
-archive = MediaArchive()
+
+@lru_cache(maxsize=None)
+def get_archive() -> MediaArchive:
+    """ The shared archive, loaded on first use. """
+    return MediaArchive()
+
+
+def __getattr__(name):
+    if name == "archive":
+        return get_archive()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
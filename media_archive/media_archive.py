@@ -1,14 +1,16 @@
 import os
+import threading
 import dotenv
-import json
-from typing import Optional, List, Tuple
+from typing import Any, Dict, Optional, List, Tuple
 from pydantic import BaseModel
+from media_archive.storage import MediaStorage, get_storage
 from transcriptions.objects import Transcription
 
 dotenv.load_dotenv()
 
 API_KEY = os.getenv("VATIS_API_KEY")
 CACHE_FILE = os.getenv("CACHE_FILE")
+ARCHIVE_DB_FILE = os.getenv("ARCHIVE_DB_FILE")
 
 
 class Media(BaseModel):
@@ -22,29 +24,59 @@ class Media(BaseModel):
     repetition_segments: Optional[List[Tuple[float, float]]] = None
     relevant_segments: Optional[List[Tuple[float, float]]] = None
     parts: Optional[List[Transcription]] = None
+    result_video_path: Optional[str] = None
+    fingerprint: Optional[str] = None
+    stage_keys: Dict[str, str] = {}
+
+    def is_fresh(self, field: str, key: str) -> bool:
+        """
+        Whether the stored field was produced by the inputs and parameters summarized by key.
+        Results archived before stage keys existed are adopted as fresh.
+        """
+        if getattr(self, field) is None:
+            return False
+        stored_key = self.stage_keys.get(field)
+        if stored_key is None:
+            self.stage_keys[field] = key
+            return True
+        return stored_key == key
+
+    def set_stage(self, field: str, value: Any, key: str):
+        setattr(self, field, value)
+        self.stage_keys[field] = key
 
 
 class MediaArchive:
-    def __init__(self, cache_file: str = CACHE_FILE):
+    def __init__(self, cache_file: str = CACHE_FILE, db_file: Optional[str] = ARCHIVE_DB_FILE,
+                 storage: Optional[MediaStorage] = None):
+        """
+        Media are stored in the JSON cache_file, or one record per row in the SQLite db_file when given.
+        An existing JSON cache is migrated into a new SQLite database on first use.
+        """
         self.cache_file = cache_file
+        # Records are added from concurrent pipeline stages
+        self.lock = threading.RLock()
+        self.storage = storage if storage is not None else get_storage(cache_file, db_file)
         self.cache = self.load()
+        self.fingerprints = {media.fingerprint: key for key, media in self.cache.items() if media.fingerprint}
 
     def load(self):
-        if not os.path.exists(self.cache_file):
-            return {}
-        with open(self.cache_file, 'r') as file:
-            data = json.load(file)
+        data = self.storage.load()
         cache = {key: Media.parse_obj(value) for key, value in data.items()}
         return cache
 
-    def save(self):
-        serializable_cache = {key: value.dict() for key, value in self.cache.items()}
-        with open(self.cache_file, 'w') as file:
-            json.dump(serializable_cache, file, indent=4)
+    def save(self, media: Optional[Media] = None):
+        """ Persists the given media only, or every cached media when none is given. """
+        with self.lock:
+            medias = [media] if media is not None else list(self.cache.values())
+            self.storage.put({item.file_path: item.dict() for item in medias})
 
     def add_media(self, media: Media):
-        self.cache[media.file_path] = media
-        self.save()
+        with self.lock:
+            self.cache[media.file_path] = media
+            if media.fingerprint:
+                self.fingerprints[media.fingerprint] = media.file_path
+            self.save(media)
 
     def get_media(self, file_path: str) -> Optional[Media]:
         media = self.cache.get(file_path, None)
@@ -53,6 +85,22 @@ class MediaArchive:
     def media_exists(self, file_path: str) -> bool:
         return self.get_media(file_path) is not None
 
+    def find_media(self, file_path: str, fingerprint: str) -> Optional[Media]:
+        """
+        Looks media up by content: a file edited in place is not matched, while a renamed or moved
+        file is matched and returned re-keyed to its new path.
+        """
+        media = self.get_media(file_path)
+        if media is not None and media.fingerprint in (None, fingerprint):
+            media.fingerprint = fingerprint
+            return media
+
+        key = self.fingerprints.get(fingerprint)
+        if key is None or self.cache[key].fingerprint != fingerprint:
+            return None
+        print(f"Found cached media for {os.path.basename(file_path)} under {key}.")
+        return self.cache[key].copy(update={"file_path": file_path}, deep=True)
+
     def add_transcript_to_media(self, transcription: Transcription, file_path: str):
         media = self.get_media(file_path)
         if media is None:
@@ -0,0 +1,83 @@
+import json
+import os
+import sqlite3
+from typing import Dict, Optional
+
+
+class MediaStorage:
+    """ Persists serialized media records, keyed by file path. """
+
+    def load(self) -> Dict[str, dict]:
+        raise NotImplementedError
+
+    def put(self, records: Dict[str, dict]):
+        raise NotImplementedError
+
+
+class JsonStorage(MediaStorage):
+    """ All records in one JSON file, rewritten atomically on every change. """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.records = {}
+
+    def load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.file_path):
+            return {}
+        with open(self.file_path, 'r') as file:
+            self.records = json.load(file)
+        return dict(self.records)
+
+    def put(self, records: Dict[str, dict]):
+        self.records.update(records)
+        temp_file_path = f"{self.file_path}.tmp"
+        with open(temp_file_path, 'w') as file:
+            json.dump(self.records, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file_path, self.file_path)
+
+
+class SqliteStorage(MediaStorage):
+    """
+    One row per record in an SQLite database. Each put is a single transaction that writes only
+    the given records, so a crash leaves either the old or the new version of a record.
+    """
+
+    def __init__(self, db_file: str, legacy_json_file: Optional[str] = None):
+        self.db_file = db_file
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS media (key TEXT PRIMARY KEY, record TEXT NOT NULL)")
+        if legacy_json_file:
+            self.migrate_json(legacy_json_file)
+
+    def migrate_json(self, json_file: str):
+        """ One-time import of a JSON cache file, done only while the database is still empty. """
+        if not os.path.exists(json_file):
+            return
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM media").fetchone()
+        if count:
+            return
+        records = JsonStorage(json_file).load()
+        print(f"Migrating {len(records)} archived media from {json_file} to {self.db_file}.")
+        self.put(records)
+
+    def load(self) -> Dict[str, dict]:
+        rows = self.connection.execute("SELECT key, record FROM media").fetchall()
+        return {key: json.loads(record) for key, record in rows}
+
+    def put(self, records: Dict[str, dict]):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO media (key, record) VALUES (?, ?)",
+                [(key, json.dumps(record)) for key, record in records.items()]
+            )
+
+
+def get_storage(cache_file: str, db_file: Optional[str] = None) -> MediaStorage:
+    if db_file:
+        return SqliteStorage(db_file, legacy_json_file=cache_file)
+    return JsonStorage(cache_file)
@@ -0,0 +1,233 @@
+import argparse
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import dotenv
+
+from editor.segment_cache import get_segment_cache
+from editor.subtitle_files import SUBTITLE_FORMATS
+from editor.subtitle_render import BURN_SUBTITLES, FRAMES_SUBTITLES, SOFT_SUBTITLES
+from llm.cache import get_llm_cache
+from pipeline import tracing
+from pipeline.scheduler import CPU, ENCODE, NETWORK, StageScheduler, namespace_stages
+from transcriptions.objects import Language
+
+dotenv.load_dotenv()
+
+BATCH_NETWORK_WORKERS = int(os.getenv("BATCH_NETWORK_WORKERS", 16))
+BATCH_CPU_WORKERS = int(os.getenv("BATCH_CPU_WORKERS", 1))
+BATCH_ENCODE_WORKERS = int(os.getenv("BATCH_ENCODE_WORKERS", 2))
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".avi", ".webm", ".m4v")
+
+
+class ResourcePool:
+    """ A bounded thread pool for one resource, keeping queue depth and busy time statistics. """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.max_queued = 0
+        self.wait_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        submit_time = time.perf_counter()
+
+        def run():
+            start_time = time.perf_counter()
+            with self.lock:
+                self.queued -= 1
+                self.running += 1
+                self.wait_seconds += start_time - submit_time
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.busy_seconds += time.perf_counter() - start_time
+
+        with self.lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        return self.executor.submit(run)
+
+    def status(self) -> str:
+        return f"{self.name}: {self.running}/{self.workers} running, {self.queued} queued"
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def list_videos(source: str) -> List[str]:
+    """
+    The video files of a directory, or the files listed in a manifest (one path per line, relative
+    paths are relative to the manifest, lines starting with # are ignored).
+    """
+    if os.path.isdir(source):
+        return [
+            os.path.join(source, file_name) for file_name in sorted(os.listdir(source))
+            if file_name.lower().endswith(VIDEO_EXTENSIONS)
+        ]
+
+    manifest_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r') as file:
+        lines = [line.strip() for line in file]
+    return [os.path.join(manifest_dir, line) for line in lines if line and not line.startswith("#")]
+
+
+class BatchRunner:
+    """
+    Processes many videos at once, with the stages of every video scheduled onto separate bounded
+    pools for network calls (transcription API, LLM), CPU inference (VAD) and encoding. A slow
+    encode only occupies the encode pool, uploads and analysis of the other videos keep going.
+    Every stage result is archived as it finishes, so a batch interrupted by a crash is resumed
+    by running it again.
+    """
+    report_interval: float = 30.0
+
+    def __init__(
+            self,
+            video_processor=None,
+            network_workers: int = BATCH_NETWORK_WORKERS,
+            cpu_workers: int = BATCH_CPU_WORKERS,
+            encode_workers: int = BATCH_ENCODE_WORKERS
+    ):
+        if video_processor is None:
+            from editor.video_processor import VideoProcessor
+            video_processor = VideoProcessor()
+        self.video_processor = video_processor
+        self.pool_workers = {NETWORK: network_workers, CPU: cpu_workers, ENCODE: encode_workers}
+        self.pools: Dict[str, ResourcePool] = {}
+        self.scheduler: Optional[StageScheduler] = None
+
+    def run(self, source: str, language: str, trace: Optional[str] = None, **options) -> Dict[str, Optional[str]]:
+        """
+        :param source: A directory of videos or a manifest file.
+        :param trace: Record the spans of the batch and export them to the result directory, as JSON lines
+            ("jsonl") or a Chrome trace ("chrome").
+        :param options: Options of VideoProcessor.build_stages.
+        :return: The result video path of every file, None for the files that failed or were not rendered.
+        """
+        if trace and trace not in tracing.TRACE_FORMATS:
+            raise ValueError(f"Unsupported trace format: {trace}")
+        file_paths = list_videos(source)
+        print(f"Processing {len(file_paths)} videos.")
+
+        stages, values = [], {}
+        for i, file_path in enumerate(file_paths):
+            namespace = str(i)
+            stages += namespace_stages(self.video_processor.build_stages(**options), namespace)
+            values[f"{namespace}/file_path"] = file_path
+            values[f"{namespace}/language"] = language
+            values[f"{namespace}/result_dir"] = self.video_processor.get_result_dir(file_path)
+
+        self.pools = {name: ResourcePool(name, workers) for name, workers in self.pool_workers.items()}
+        self.scheduler = StageScheduler(stages, pools=self.pools, fail_fast=False)
+
+        done = threading.Event()
+        monitor = threading.Thread(target=self.monitor, args=(done,), daemon=True)
+        monitor.start()
+        tracer = tracing.start_trace() if trace else None
+        try:
+            with tracing.span("batch", videos=len(file_paths)):
+                results = self.scheduler.run(**values)
+        finally:
+            done.set()
+            monitor.join()
+            for pool in self.pools.values():
+                pool.shutdown()
+            if tracer is not None:
+                tracing.stop_trace()
+                self.export_trace(tracer, trace)
+
+        self.print_report(file_paths)
+        if tracer is not None:
+            tracer.print_report()
+        return {file_path: results.get(f"{i}/result_video_path") for i, file_path in enumerate(file_paths)}
+
+    def export_trace(self, tracer: tracing.Tracer, trace_format: str) -> str:
+        result_dir = self.video_processor.result_videos_dir
+        os.makedirs(result_dir, exist_ok=True)
+        file_name = f"trace_batch_{time.strftime('%Y%m%d_%H%M%S')}.{tracing.TRACE_EXTENSIONS[trace_format]}"
+        return tracer.export(os.path.join(result_dir, file_name), trace_format)
+
+    def monitor(self, done: threading.Event):
+        while not done.wait(self.report_interval):
+            print(" | ".join(pool.status() for pool in self.pools.values()))
+
+    def get_report(self, file_paths: List[str]) -> str:
+        wall_time = self.scheduler.wall_time
+        stage_stats = defaultdict(list)
+        for timing in self.scheduler.timings:
+            stage_stats[timing.name.split("/", 1)[1]].append(timing.duration)
+
+        lines = [f"Batch of {len(file_paths)} videos in {wall_time:.1f}s.",
+                 f"{'stage':<28}{'runs':>6}{'per min':>10}{'mean s':>9}{'max s':>9}"]
+        for name, durations in stage_stats.items():
+            lines.append(
+                f"{name:<28}{len(durations):>6}{len(durations) / max(wall_time, 1e-9) * 60:>10.1f}"
+                f"{sum(durations) / len(durations):>9.2f}{max(durations):>9.2f}"
+            )
+
+        lines.append(f"{'pool':<12}{'workers':>8}{'tasks':>7}{'max queue':>11}{'mean wait s':>13}{'utilization':>13}")
+        for pool in self.pools.values():
+            lines.append(
+                f"{pool.name:<12}{pool.workers:>8}{pool.completed:>7}{pool.max_queued:>11}"
+                f"{pool.wait_seconds / max(pool.completed, 1):>13.2f}"
+                f"{pool.busy_seconds / (pool.workers * max(wall_time, 1e-9)):>13.0%}"
+            )
+
+        failed = sorted({int(name.split("/", 1)[0]) for name in self.scheduler.errors})
+        for i in failed:
+            errors = {name.split("/", 1)[1]: e for name, e in self.scheduler.errors.items() if name.startswith(f"{i}/")}
+            lines.append(f"Failed {os.path.basename(file_paths[i])}: {errors}")
+        return "\n".join(lines)
+
+    def print_report(self, file_paths: List[str]):
+        print(self.get_report(file_paths))
+        for file_path in file_paths:
+            self.video_processor.print_audio_report(file_path)
+        if get_llm_cache() is not None:
+            get_llm_cache().print_stats()
+        if get_segment_cache() is not None:
+            get_segment_cache().print_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process a directory or manifest of videos.")
+    parser.add_argument("source", nargs="?", default=os.getenv("SOURCE_VIDEOS_DIR"))
+    parser.add_argument("--language", default=Language.english)
+    parser.add_argument("--no-render", action="store_true")
+    parser.add_argument("--subtitles-mode", default=FRAMES_SUBTITLES,
+                        choices=[FRAMES_SUBTITLES, SOFT_SUBTITLES, BURN_SUBTITLES])
+    parser.add_argument("--subtitle-formats", nargs="*", default=[], choices=SUBTITLE_FORMATS)
+    parser.add_argument("--preview", action="store_true", help="Render low resolution proxies of the cuts.")
+    parser.add_argument("--mark-cuts", action="store_true", help="Flash and beep at every cut of the previews.")
+    parser.add_argument("--export-edit", action="store_true",
+                        help="Export the edits (json, ffconcat, EDL, OTIO, SRT), render them later with "
+                             "python -m editor.edit_decisions.")
+    parser.add_argument("--trace", choices=tracing.TRACE_FORMATS,
+                        help="Record per-stage spans (time, CPU, bytes, frames, tokens, cache hits) to a trace file.")
+    parser.add_argument("--profile-stage", help="Run this stage (speech_segments, render, ...) under the profiler and "
+                                                "dump its profile next to every result.")
+    parser.add_argument("--profiler", default=tracing.CPROFILE, choices=tracing.PROFILERS)
+    args = parser.parse_args()
+
+    BatchRunner().run(args.source, args.language, render=not args.no_render, subtitles_mode=args.subtitles_mode,
+                      subtitle_formats=tuple(args.subtitle_formats), preview=args.preview, mark_cuts=args.mark_cuts,
+                      export_edit=args.export_edit, trace=args.trace, profile_stage=args.profile_stage,
+                      profiler=args.profiler)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from pipeline import tracing
+
+NETWORK = "network"
+CPU = "cpu"
+ENCODE = "encode"
+
+
+class Stage(NamedTuple):
+    """
+    A pipeline step. run is called with the declared inputs as keyword arguments
+    and returns a dict holding (at least) the declared outputs.
+    resource names the pool the stage runs on, when the scheduler is given pools.
+    """
+    name: str
+    run: Callable[..., Dict[str, Any]]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    resource: str = CPU
+
+
+def namespace_stages(stages: List[Stage], namespace: str) -> List[Stage]:
+    """ Prefixes the stage names, inputs and outputs, so the graphs of several items can be scheduled together. """
+    def prefixed(stage: Stage) -> Stage:
+        def run(**inputs):
+            outputs = stage.run(**{name.split("/", 1)[1]: value for name, value in inputs.items()})
+            return {f"{namespace}/{name}": value for name, value in outputs.items()}
+
+        return Stage(
+            name=f"{namespace}/{stage.name}",
+            run=run,
+            inputs=tuple(f"{namespace}/{name}" for name in stage.inputs),
+            outputs=tuple(f"{namespace}/{name}" for name in stage.outputs),
+            resource=stage.resource
+        )
+
+    return [prefixed(stage) for stage in stages]
+
+
+class StageTiming(NamedTuple):
+    name: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class StageScheduler:
+    """
+    Runs a graph of stages in a thread pool, starting each stage as soon as all of its inputs
+    are available, so independent stages overlap.
+    :param pools: Executors by resource. Stages whose resource has no pool run in the scheduler's own pool.
+    :param fail_fast: Raise the first stage exception. Otherwise failures are collected in errors,
+        and only the stages depending on a failed stage are skipped.
+    """
+
+    def __init__(self, stages: List[Stage], workers: int = 4, pools: Optional[Dict[str, Executor]] = None,
+                 fail_fast: bool = True):
+        self.stages = stages
+        self.workers = workers
+        self.pools = pools or {}
+        self.fail_fast = fail_fast
+        self.producers = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"Output {output} produced by both {self.producers[output]} and {stage.name}.")
+                self.producers[output] = stage.name
+        self.timings: List[StageTiming] = []
+        self.errors: Dict[str, Exception] = {}
+        self.wall_time: Optional[float] = None
+
+    def check_inputs(self, available: set):
+        """ Fails before running anything when an input can never become available, including through cycles. """
+        available = set(available)
+        remaining = list(self.stages)
+        while remaining:
+            ready = [stage for stage in remaining if available.issuperset(stage.inputs)]
+            if not ready:
+                missing = {stage.name: sorted(set(stage.inputs) - available) for stage in remaining}
+                raise ValueError(f"Stages can not be scheduled, missing inputs: {missing}")
+            for stage in ready:
+                available.update(stage.outputs)
+                remaining.remove(stage)
+
+    def run(self, **values) -> Dict[str, Any]:
+        """ Runs every stage, given the initial values, and returns all the values. """
+        self.check_inputs(set(values))
+        values = dict(values)
+        self.timings = []
+        self.errors = {}
+        pending = list(self.stages)
+        running: Dict[Future, Stage] = {}
+        start_time = time.perf_counter()
+        # Pool threads do not inherit the caller's context, stage spans are nested in its span explicitly
+        parent_span = tracing.current_span()
+
+        def run_stage(stage: Stage, inputs: dict) -> Tuple[dict, float]:
+            stage_start = time.perf_counter()
+            with tracing.span(stage.name, parent=parent_span, resource=stage.resource):
+                outputs = stage.run(**inputs)
+            return outputs, stage_start
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                for stage in [stage for stage in pending if all(name in values for name in stage.inputs)]:
+                    pending.remove(stage)
+                    inputs = {name: values[name] for name in stage.inputs}
+                    pool = self.pools.get(stage.resource, executor)
+                    running[pool.submit(run_stage, stage, inputs)] = stage
+                if not running:
+                    # What is left depends on failed stages
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        outputs, stage_start = future.result()
+                    except Exception as e:
+                        # With fail_fast, scheduling stops and the stages already running are let to finish
+                        if self.fail_fast:
+                            pending.clear()
+                            raise
+                        print(f"Stage {stage.name} failed: {e!r}")
+                        self.errors[stage.name] = e
+                        continue
+                    self.timings.append(
+                        StageTiming(stage.name, stage_start - start_time, time.perf_counter() - start_time)
+                    )
+                    missing = set(stage.outputs) - set(outputs)
+                    if missing:
+                        raise ValueError(f"Stage {stage.name} did not return outputs {sorted(missing)}.")
+                    values.update(outputs)
+
+        self.wall_time = time.perf_counter() - start_time
+        return values
+
+    def get_report(self) -> str:
+        lines = [f"{'stage':<28}{'start':>9}{'end':>9}{'seconds':>9}"]
+        for timing in sorted(self.timings, key=lambda t: t.start):
+            lines.append(f"{timing.name:<28}{timing.start:>9.2f}{timing.end:>9.2f}{timing.duration:>9.2f}")
+        stage_time = sum(timing.duration for timing in self.timings)
+        lines.append(
+            f"Wall-clock {self.wall_time:.2f}s for {stage_time:.2f}s of stage time "
+            f"({stage_time / max(self.wall_time, 1e-9):.2f}x overlap)."
+        )
+        return "\n".join(lines)
+
+    def print_report(self):
+        print(self.get_report())
+
+
+def test():
+    def sleeper(seconds, **outputs):
+        def run(**inputs):
+            time.sleep(seconds)
+            return outputs
+        return run
+
+    scheduler = StageScheduler([
+        Stage("transcription", sleeper(0.3, transcription=1), inputs=("media",), outputs=("transcription",)),
+        Stage("speech", sleeper(0.3, speech=1), inputs=("media",), outputs=("speech",)),
+        Stage("text", sleeper(0.1, text=1), inputs=("transcription", "speech"), outputs=("text",)),
+        Stage("repetitions", sleeper(0.3, repetitions=1), inputs=("text",), outputs=("repetitions",)),
+        Stage("parts", sleeper(0.3, parts=1), inputs=("text",), outputs=("parts",)),
+    ])
+    values = scheduler.run(media=0)
+    scheduler.print_report()
+    assert {"transcription", "speech", "text", "repetitions", "parts"} <= set(values)
+    assert scheduler.wall_time < 1.0, "Independent stages did not overlap."
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,351 @@
+import cProfile
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+JSONL = "jsonl"
+CHROME = "chrome"
+TRACE_FORMATS = (JSONL, CHROME)
+TRACE_EXTENSIONS = {JSONL: "jsonl", CHROME: "json"}
+
+CPROFILE = "cprofile"
+SAMPLING = "sampling"
+PROFILERS = (CPROFILE, SAMPLING)
+SAMPLING_INTERVAL = 0.005
+
+
+class Span:
+    """
+    A timed region of a run. Wall time is measured between entering and leaving it, CPU time is the
+    time of its thread, child CPU time the time of the child processes (ffmpeg) that finished meanwhile.
+    Counters hold the bytes, frames, tokens and cache hits recorded while it was the current span.
+    """
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], attributes: dict):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.thread_id = threading.get_ident()
+        self.thread_name = threading.current_thread().name
+        self.counters: Counter = Counter()
+        self.start = time.perf_counter()
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.child_cpu_seconds = 0.0
+        self._thread_time = time.thread_time()
+        self._child_time = child_cpu_time()
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self.start
+        self.cpu_seconds = time.thread_time() - self._thread_time
+        self.child_cpu_seconds = child_cpu_time() - self._child_time
+
+
+def child_cpu_time() -> float:
+    """ CPU time of the finished child processes, 0.0 where the resource module is missing (Windows). """
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Tracer:
+    """ Collects the spans of a run, exported as JSON lines or as a Chrome trace (chrome://tracing, Perfetto). """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans: List[Span] = []
+        self.ids = itertools.count(1)
+        self.origin = time.perf_counter()
+        self.origin_epoch = time.time()
+
+    def start_span(self, name: str, parent: Optional[Span], attributes: dict) -> Span:
+        with self.lock:
+            span = Span(name, next(self.ids), parent.span_id if parent is not None else None, attributes)
+            self.spans.append(span)
+        return span
+
+    def count(self, span: Span, counters: Dict[str, int]):
+        with self.lock:
+            span.counters.update(counters)
+
+    def to_records(self) -> List[dict]:
+        return [{
+            "name": span.name,
+            "id": span.span_id,
+            "parent": span.parent_id,
+            "thread": span.thread_name,
+            "start": span.start - self.origin,
+            "wall_seconds": span.wall_seconds,
+            "cpu_seconds": span.cpu_seconds,
+            "child_cpu_seconds": span.child_cpu_seconds,
+            "counters": dict(span.counters),
+            "attributes": span.attributes,
+        } for span in sorted(self.spans, key=lambda s: s.start)]
+
+    def to_chrome_trace(self) -> dict:
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in {span.thread_id: span.thread_name for span in self.spans}.items()]
+        for span in sorted(self.spans, key=lambda s: s.start):
+            events.append({
+                "name": span.name,
+                "cat": span.attributes.get("resource", "span"),
+                "ph": "X",
+                "ts": (span.start - self.origin) * 1e6,
+                "dur": span.wall_seconds * 1e6,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {"cpu_seconds": span.cpu_seconds, "child_cpu_seconds": span.child_cpu_seconds,
+                         **span.counters, **span.attributes},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"start_epoch": self.origin_epoch}}
+
+    def export(self, path: str, trace_format: str = JSONL) -> str:
+        with self.lock:
+            if trace_format == JSONL:
+                with open(path, "w") as file:
+                    for record in self.to_records():
+                        file.write(json.dumps(record) + "\n")
+            elif trace_format == CHROME:
+                with open(path, "w") as file:
+                    json.dump(self.to_chrome_trace(), file)
+            else:
+                raise ValueError(f"Unsupported trace format: {trace_format}")
+        print(f"Trace of {len(self.spans)} spans written to {path}")
+        return path
+
+    def get_report(self) -> str:
+        """ Totals per span name: wall and CPU time and the summed counters. """
+        totals = defaultdict(lambda: {"count": 0, "wall": 0.0, "cpu": 0.0, "child_cpu": 0.0, "counters": Counter()})
+        with self.lock:
+            for span in self.spans:
+                total = totals[span.name]
+                total["count"] += 1
+                total["wall"] += span.wall_seconds
+                total["cpu"] += span.cpu_seconds
+                total["child_cpu"] += span.child_cpu_seconds
+                total["counters"].update(span.counters)
+
+        lines = [f"{'span':<32}{'count':>6}{'wall s':>9}{'cpu s':>9}{'child s':>9}  counters"]
+        for name, total in sorted(totals.items(), key=lambda item: -item[1]["wall"]):
+            counters = ", ".join(f"{key}={value}" for key, value in sorted(total["counters"].items()))
+            lines.append(f"{name:<32}{total['count']:>6}{total['wall']:>9.2f}{total['cpu']:>9.2f}"
+                         f"{total['child_cpu']:>9.2f}  {counters}")
+        return "\n".join(lines)
+
+    def print_report(self):
+        print(self.get_report())
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def start_trace() -> Tracer:
+    """
+    Starts recording spans, until stop_trace. Without an active trace spans and counters cost nothing.
+    The tracer is shared by the whole process, so only one trace can be active at a time: a batch traces
+    all of its videos in a single trace.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is not None:
+            raise RuntimeError("A trace is already active, stop it before starting another one")
+        _tracer = Tracer()
+        return _tracer
+
+
+def stop_trace() -> Optional[Tracer]:
+    global _tracer
+    with _tracer_lock:
+        tracer, _tracer = _tracer, None
+    return tracer
+
+
+def is_enabled() -> bool:
+    return _tracer is not None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, parent: Optional[Span] = None, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Records a span nested in the current span of the thread, or in parent when given, for threads
+    that do not inherit the context of the code that started them.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield None
+        return
+    new_span = tracer.start_span(name, parent if parent is not None else _current_span.get(), attributes)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    finally:
+        _current_span.reset(token)
+        new_span.finish()
+
+
+def traced(function):
+    """ Records every call of the function as a span named after it. """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def count(**counters: int):
+    """ Adds to the counters (bytes_read, bytes_written, frames, tokens_sent, ...) of the current span. """
+    tracer, current = _tracer, _current_span.get()
+    if tracer is not None and current is not None:
+        tracer.count(current, {key: value for key, value in counters.items() if value})
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread every interval seconds, written in the collapsed stack format of
+    flamegraph.pl and speedscope: one "frame;frame;frame count" line per distinct stack.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLING_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.done.set()
+        self.thread.join()
+
+    def dump(self, path: str):
+        with open(path, "w") as file:
+            for stack, samples in self.stacks.most_common():
+                file.write(f"{stack} {samples}\n")
+
+
+def run_profiled(function, profile_path: str, profiler: str = CPROFILE, **kwargs):
+    """
+    Calls the function under the profiler and dumps its profile to profile_path: pstats data with cProfile
+    (snakeviz, python -m pstats), collapsed stacks with the sampling profiler. Only the calling thread is profiled.
+    """
+    if profiler == CPROFILE:
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, **kwargs)
+        finally:
+            profile.dump_stats(profile_path)
+            print(f"Profile written to {profile_path}")
+    elif profiler == SAMPLING:
+        sampler = SamplingProfiler(threading.get_ident())
+        try:
+            with sampler:
+                return function(**kwargs)
+        finally:
+            sampler.dump(profile_path)
+            print(f"Profile of {sum(sampler.stacks.values())} samples written to {profile_path}")
+    raise ValueError(f"Unsupported profiler: {profiler}")
+
+
+def profile_stage(stage, profiler: str = CPROFILE):
+    """
+    The stage run under the profiler, its profile dumped next to the result as profile_<stage>.prof
+    (cProfile) or profile_<stage>.folded (sampling). The stage gets result_dir as an input if it had not.
+    """
+    needs_result_dir = "result_dir" in stage.inputs
+    extension = "prof" if profiler == CPROFILE else "folded"
+
+    def run(result_dir: str, **inputs):
+        os.makedirs(result_dir, exist_ok=True)
+        profile_path = os.path.join(result_dir, f"profile_{stage.name.rsplit('/', 1)[-1]}.{extension}")
+        if needs_result_dir:
+            inputs["result_dir"] = result_dir
+        return run_profiled(stage.run, profile_path, profiler, **inputs)
+
+    return stage._replace(run=run, inputs=stage.inputs if needs_result_dir else stage.inputs + ("result_dir",))
+
+
+def test():
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    @traced
+    def render():
+        count(frames=3)
+
+    def stage(parent):
+        with span("stage", parent=parent):
+            render()
+
+    tracer = start_trace()
+    try:
+        start_trace()
+        raise AssertionError("A second trace must not replace the active one")
+    except RuntimeError:
+        pass
+    with span("run", file="a.mp4") as root:
+        count(bytes_read=10)
+        with span("llm_call"):
+            count(tokens_sent=5, tokens_received=2, cache_misses=0)
+        with ThreadPoolExecutor(1) as executor:
+            executor.submit(render).result()
+            executor.submit(stage, root).result()
+    stop_trace()
+    with span("ignored"):
+        count(frames=1)
+
+    records = tracer.to_records()
+    names = [record["name"] for record in records]
+    assert names == ["run", "llm_call", "render", "stage", "render"], names
+    run, llm_call, unnested_render, stage_span, render_span = records
+    assert run["counters"] == {"bytes_read": 10} and run["parent"] is None
+    assert llm_call["counters"] == {"tokens_sent": 5, "tokens_received": 2} and llm_call["parent"] == run["id"]
+    # Threads started without the context of a span are only nested when given the parent
+    assert unnested_render["parent"] is None and unnested_render["counters"] == {"frames": 3}
+    assert stage_span["parent"] == run["id"] and render_span["parent"] == stage_span["id"]
+
+    trace = tracer.to_chrome_trace()
+    assert [event["name"] for event in trace["traceEvents"] if event["ph"] == "X"] == names
+    tracer.print_report()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for profiler in PROFILERS:
+            path = os.path.join(temp_dir, f"profile.{profiler}")
+            assert run_profiled(lambda n: sum(i * i for i in range(n)), path, profiler, n=3_000_000) > 0
+            assert os.path.getsize(path) > 0
+
+
+if __name__ == '__main__':
+    test()
@@ -1,3 +1,17 @@
-from transcriptions.api_client import TranscriptClient
+from functools import lru_cache
 
-transcriptor = TranscriptClient()
+
+@lru_cache(maxsize=None)
+def get_transcriptor():
+    """ The shared transcription client, built on first use. """
+    from transcriptions.api_client import TranscriptClient
+    return TranscriptClient()
+
+
+def __getattr__(name):
+    if name == "transcriptor":
+        return get_transcriptor()
+    if name == "TranscriptClient":
+        from transcriptions.api_client import TranscriptClient
+        return TranscriptClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
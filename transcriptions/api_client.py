@@ -3,8 +3,10 @@ import dotenv
 from typing import List, Tuple, Optional
 import json
 import requests
-from media_archive import archive
+from media_archive import get_archive
 from media_archive.media_archive import MediaArchive, Media
+from audio_extraction.pcm_audio import AudioBuffer
+from pipeline import tracing
 import time
 
 from transcriptions.objects import Language, TranscribedWord, Transcription
@@ -24,16 +26,20 @@ class TranscriptClient:
     queued = "QUEUED"
     trasncripting = "TRANSCRIPTING"
 
-    def __init__(self, api_key: str = API_KEY, media_archive: MediaArchive = archive):
-        self.media_archive = media_archive
+    def __init__(self, api_key: str = API_KEY, media_archive: Optional[MediaArchive] = None):
+        self.media_archive = media_archive if media_archive is not None else get_archive()
         self.api_key = api_key
 
-    def submit(self, file_path: str, language: str = Language.romanian) -> Media:
-        """Trigger the transcription process for the uploaded file."""
+    def submit(self, file_path: str, language: str = Language.romanian, fingerprint: Optional[str] = None,
+               audio: Optional[AudioBuffer] = None) -> Media:
+        """
+        Trigger the transcription process for the uploaded file.
+        When the decoded audio is given, only its WAV file is uploaded instead of the whole media file.
+        """
 
-        if self.media_archive.media_exists(file_path):
+        media = self.media_archive.get_media(file_path)
+        if media is not None and (fingerprint is None or media.fingerprint in (None, fingerprint)):
             print("Media already processed.")
-            media = self.media_archive.get_media(file_path)
             return media
 
         print("Processing new media.")
@@ -45,15 +51,22 @@ class TranscriptClient:
         headers = {
             'Authorization': f'Bearer {self.api_key}'
         }
-        files = {
-            'file': (os.path.basename(file_path), open(file_path, 'rb'))
-        }
-        response = requests.post(
-            url=self.post_file_url,
-            headers=headers,
-            data=payload,
-            files=files
-        )
+        upload_path, upload_name = file_path, os.path.basename(file_path)
+        if audio is not None:
+            audio.mark_used("transcription_upload")
+            upload_path, upload_name = audio.wav_path, f"{os.path.splitext(upload_name)[0]}.wav"
+
+        with open(upload_path, 'rb') as file, tracing.span("transcription_upload"):
+            files = {
+                'file': (upload_name, file)
+            }
+            response = requests.post(
+                url=self.post_file_url,
+                headers=headers,
+                data=payload,
+                files=files
+            )
+            tracing.count(bytes_read=os.path.getsize(upload_path))
         if response.status_code != 200:
             raise Exception("Failed to start transcription:", response.text)
 
@@ -62,7 +75,8 @@ class TranscriptClient:
         media = Media(
             file_path=file_path,
             transcription_uuid=transcription_uid,
-            language=language
+            language=language,
+            fingerprint=fingerprint
         )
         self.media_archive.add_media(media)
         return media
@@ -72,7 +86,8 @@ class TranscriptClient:
         headers = {
             'Authorization': f'Bearer {self.api_key}'
         }
-        response = requests.get(url, headers=headers)
+        with tracing.span("transcription_poll"):
+            response = requests.get(url, headers=headers)
         if response.status_code != 200:
             raise Exception("Failed to check transcription status:", response.text)
         data = response.json()
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import random
+import time
+from typing import List, Optional, Tuple, Union
+
+import aiohttp
+
+from audio_extraction.pcm_audio import AudioBuffer
+from media_archive import get_archive
+from media_archive.media_archive import MediaArchive, Media
+from transcriptions.api_client import API_KEY, POST_FILE_URL, GET_TRANSCRIPT_URL, TranscriptClient, process_transcript
+from transcriptions.objects import Language, Transcription
+
+
+class AsyncTranscriptClient:
+    """
+    Asyncio counterpart of TranscriptClient. Uploads are streamed from disk, connections are pooled
+    in one session, status polls back off exponentially with jitter, and at most max_concurrency
+    files are in flight at once. Use as an async context manager.
+    """
+    transcripted = TranscriptClient.transcripted
+    max_concurrency: int = 8
+    poll_initial_delay: float = 2.0
+    poll_max_delay: float = 60.0
+    poll_backoff: float = 2.0
+
+    def __init__(
+            self,
+            api_key: str = API_KEY,
+            media_archive: Optional[MediaArchive] = None,
+            post_file_url: str = POST_FILE_URL,
+            get_transcript_url: str = GET_TRANSCRIPT_URL,
+            max_concurrency: Optional[int] = None
+    ):
+        self.media_archive = media_archive if media_archive is not None else get_archive()
+        self.api_key = api_key
+        self.post_file_url = post_file_url
+        self.get_transcript_url = get_transcript_url
+        self.max_concurrency = max_concurrency or self.max_concurrency
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncTranscriptClient":
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            headers={'Authorization': f'Bearer {self.api_key}'}
+        )
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.session = None
+
+    async def submit(self, file_path: str, language: str = Language.romanian, fingerprint: Optional[str] = None,
+                     audio: Optional[AudioBuffer] = None) -> Media:
+        """ Trigger the transcription process for the file, see TranscriptClient.submit. """
+        media = self.media_archive.get_media(file_path)
+        if media is not None and (fingerprint is None or media.fingerprint in (None, fingerprint)):
+            print(f"Media {os.path.basename(file_path)} already processed.")
+            return media
+
+        upload_path, upload_name = file_path, os.path.basename(file_path)
+        if audio is not None:
+            audio.mark_used("transcription_upload")
+            upload_path, upload_name = audio.wav_path, f"{os.path.splitext(upload_name)[0]}.wav"
+
+        with open(upload_path, 'rb') as file:
+            form = aiohttp.FormData()
+            form.add_field('language', language)
+            form.add_field('transcribe', 'true')
+            # A file object is sent in chunks, the upload is never loaded in memory
+            form.add_field('file', file, filename=upload_name)
+            async with self.session.post(self.post_file_url, data=form) as response:
+                text = await response.text()
+                if response.status != 200:
+                    raise Exception("Failed to start transcription:", text)
+                data = await response.json(content_type=None)
+
+        media = Media(
+            file_path=file_path,
+            transcription_uuid=data["uid"],
+            language=language,
+            fingerprint=fingerprint
+        )
+        self.media_archive.add_media(media)
+        return media
+
+    async def get_transcription(self, media: Media) -> Tuple[str, Transcription]:
+        url = f"{self.get_transcript_url}{media.transcription_uuid}"
+        async with self.session.get(url) as response:
+            if response.status != 200:
+                raise Exception("Failed to check transcription status:", await response.text())
+            data = await response.json(content_type=None)
+        state = data['status']
+        if state != self.transcripted:
+            return state, Transcription(words=[])
+        return state, Transcription(words=process_transcript(data['data']['words']))
+
+    async def get_transcription_with_wait(self, media: Media, max_wait: float = 600) -> Transcription:
+        start_time = time.monotonic()
+        delay = self.poll_initial_delay
+        state, transcript = await self.get_transcription(media)
+
+        while state != self.transcripted:
+            remaining = max_wait - (time.monotonic() - start_time)
+            if remaining <= 0:
+                raise Exception(f"Transcription is not yet ready from Service API - state: {state}")
+            await asyncio.sleep(min(delay * random.uniform(0.5, 1.0), remaining))
+            delay = min(delay * self.poll_backoff, self.poll_max_delay)
+            state, transcript = await self.get_transcription(media)
+
+        return transcript
+
+    async def transcribe(self, file_path: str, language: str = Language.romanian, max_wait: float = 600,
+                         fingerprint: Optional[str] = None) -> Tuple[Media, Transcription]:
+        """ Submits the file and waits for its transcription, counting against the concurrency limit. """
+        async with self.semaphore:
+            media = await self.submit(file_path, language, fingerprint=fingerprint)
+            transcription = await self.get_transcription_with_wait(media, max_wait=max_wait)
+            print(f"Transcription of {os.path.basename(file_path)} finished.")
+            return media, transcription
+
+    async def transcribe_many(self, file_paths: List[str], language: str = Language.romanian,
+                              max_wait: float = 600) -> List[Union[Tuple[Media, Transcription], Exception]]:
+        """ Transcribes the files concurrently. Failures are returned in place of the result of their file. """
+        return await asyncio.gather(
+            *[self.transcribe(file_path, language, max_wait=max_wait) for file_path in file_paths],
+            return_exceptions=True
+        )
+
+
+def transcribe_files(file_paths: List[str], language: str = Language.romanian, max_concurrency: int = None,
+                     **client_kwargs) -> List[Union[Tuple[Media, Transcription], Exception]]:
+    """ Blocking entry point for transcribe_many. """
+    async def run():
+        async with AsyncTranscriptClient(max_concurrency=max_concurrency, **client_kwargs) as client:
+            return await client.transcribe_many(file_paths, language)
+
+    return asyncio.run(run())
@@ -0,0 +1,132 @@
+from typing import List, NamedTuple, Tuple
+
+from editor import intervals
+from transcriptions.objects import TranscribedWord, Transcription
+from transcriptions.text_processing import normalize_text
+
+REPEAT = "repeat"
+RESTART = "restart"
+MAX_NGRAM = 6
+MAX_RESTART_WORDS = 12
+MIN_RESTART_MATCH = 2
+MIN_UNPAUSED_RESTART_MATCH = 3
+SENTENCE_ENDS = (".", "?", "!")
+RESTART_PAUSE = 0.3
+
+
+class RepetitionCandidate(NamedTuple):
+    """ Words first_index..last_index, an attempt the speaker abandoned, timed in milliseconds. """
+    first_index: int
+    last_index: int
+    start_ms: int
+    end_ms: int
+    kind: str
+    ambiguous: bool
+
+    @property
+    def cut(self) -> Tuple[float, float]:
+        return self.start_ms / 1000, self.end_ms / 1000
+
+
+def word_tokens(words: List[TranscribedWord]) -> List[str]:
+    """ One comparable token per word, normalized with normalize_text. """
+    return ["".join(normalize_text(word.word)) for word in words]
+
+
+def match_length(tokens: List[str], i: int, j: int, limit: int) -> int:
+    """ Number of equal tokens from positions i and j onwards, stopping at limit. """
+    length = 0
+    while length < limit and j + length < len(tokens) and tokens[i + length] == tokens[j + length] \
+            and tokens[i + length]:
+        length += 1
+    return length
+
+
+def find_repetition_candidates(
+        transcription: Transcription,
+        max_ngram: int = MAX_NGRAM,
+        max_restart_words: int = MAX_RESTART_WORDS,
+        min_restart_match: int = MIN_RESTART_MATCH,
+        restart_pause: float = RESTART_PAUSE
+) -> List[RepetitionCandidate]:
+    """
+    Finds the abandoned attempts in the word stream, keeping the last attempt of each sentence:
+    - repeat: an n-gram immediately said again ("we need we need to"), cutting the first occurrence.
+      A single repeated word is ambiguous, it is often said twice on purpose.
+    - restart: the start of a sentence said again within max_restart_words words ("we need the we need to"),
+      cutting from the first start to the restart. Without a pause before restarting, the match needs to be
+      longer and the candidate is ambiguous. Attempts holding a finished sentence are never restarts.
+    """
+    words = transcription.words
+    tokens = word_tokens(words)
+    candidates = []
+    i = 0
+    while i < len(tokens):
+        candidate = None
+        for j in range(i + 1, min(i + max_restart_words, len(tokens) - 1) + 1):
+            length = match_length(tokens, i, j, max(max_ngram, min_restart_match))
+            if length == 0:
+                continue
+            if length >= j - i and j - i <= max_ngram:
+                candidate = (j, REPEAT, j - i == 1)
+                break
+            if any(word.word.endswith(SENTENCE_ENDS) for word in words[i:j]):
+                # A finished sentence was not abandoned
+                break
+            paused = words[j].start - words[j - 1].end >= restart_pause
+            if length >= (min_restart_match if paused else MIN_UNPAUSED_RESTART_MATCH):
+                candidate = (j, RESTART, not paused)
+                break
+
+        if candidate is None:
+            i += 1
+            continue
+        j, kind, ambiguous = candidate
+        candidates.append(RepetitionCandidate(
+            first_index=i,
+            last_index=j - 1,
+            start_ms=int(round(words[i].start * 1000)),
+            end_ms=int(round(words[j].start * 1000)),
+            kind=kind,
+            ambiguous=ambiguous
+        ))
+        # The new attempt may be abandoned again
+        i = j
+    return candidates
+
+
+def merge_candidate_cuts(candidates: List[RepetitionCandidate]) -> List[Tuple[float, float]]:
+    """ The cut ranges of the candidates in seconds, adjacent ranges joined. """
+    cuts_ms = intervals.union(intervals.to_array([(c.start_ms, c.end_ms) for c in candidates]))
+    return intervals.to_list(cuts_ms / 1000)
+
+
+def test():
+    def transcribe(text: str, pauses=()) -> Transcription:
+        words, t = [], 0.0
+        for i, word in enumerate(text.split()):
+            if i in pauses:
+                t += 0.5
+            words.append(TranscribedWord(word=word, start=round(t, 3), end=round(t + 0.3, 3)))
+            t += 0.4
+        return Transcription(words=words)
+
+    candidates = find_repetition_candidates(transcribe("So we need, we need to go home."))
+    assert [(c.first_index, c.last_index, c.kind, c.ambiguous) for c in candidates] == [(1, 2, REPEAT, False)]
+    assert candidates[0].start_ms == 400 and candidates[0].end_ms == 1200
+
+    candidates = find_repetition_candidates(transcribe("The idea is that the idea here is simple", pauses=(4,)))
+    assert [(c.first_index, c.last_index, c.kind, c.ambiguous) for c in candidates] == [(0, 3, RESTART, False)]
+
+    candidates = find_repetition_candidates(transcribe("It is very very good"))
+    assert [(c.kind, c.ambiguous) for c in candidates] == [(REPEAT, True)]
+
+    assert find_repetition_candidates(transcribe("We went to the market and then to the park")) == []
+    assert find_repetition_candidates(transcribe("Go to the market. Go to the park", pauses=(4,))) == []
+
+    candidates = find_repetition_candidates(transcribe("I think I think that I think that this works"))
+    assert merge_candidate_cuts(candidates) == [(0.0, 2.0)]
+
+
+if __name__ == '__main__':
+    test()
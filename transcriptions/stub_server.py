@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import itertools
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+from transcriptions.api_client import TranscriptClient
+
+STUB_WORDS = ["acesta", "este", "un", "test", "de", "transcriere", "pentru", "editorul", "video"]
+
+
+def stub_words(n_words: int, word_duration: float = 0.4, gap: float = 0.1) -> List[dict]:
+    """ Words in the format of the Vatis transcript response. """
+    words = []
+    for i, word in zip(range(n_words), itertools.cycle(STUB_WORDS)):
+        start = i * (word_duration + gap)
+        words.append({"startTime": round(start, 3), "endTime": round(start + word_duration, 3), "word": word})
+    return words
+
+
+class StubTranscriptionServer:
+    """
+    Local stand-in for the Vatis API, serving /files/transcribe/file and /transcripts/{uid}.
+    Jobs report TRANSCRIPTING for processing_delay seconds after the upload, then return n_words
+    synthetic words. Uploads are read in chunks and only counted.
+    """
+    api_prefix = "/api/v1"
+
+    def __init__(self, processing_delay: float = 1.0, n_words: int = 200):
+        self.processing_delay = processing_delay
+        self.n_words = n_words
+        self.jobs: Dict[str, float] = {}
+        self.uploaded_bytes = 0
+        self.requests = 0
+        self.runner = None
+        self.base_url = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(f"{self.api_prefix}/files/transcribe/file", self.handle_upload)
+        app.router.add_get(f"{self.api_prefix}/transcripts/{{uid}}", self.handle_transcript)
+        return app
+
+    async def handle_upload(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        reader = await request.multipart()
+        async for part in reader:
+            while True:
+                chunk = await part.read_chunk()
+                if not chunk:
+                    break
+                self.uploaded_bytes += len(chunk)
+        uid = str(uuid.uuid4())
+        self.jobs[uid] = time.monotonic() + self.processing_delay
+        return web.json_response({"uid": uid})
+
+    async def handle_transcript(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        uid = request.match_info["uid"]
+        if uid not in self.jobs:
+            return web.json_response({"error": f"Unknown transcript {uid}"}, status=404)
+        if time.monotonic() < self.jobs[uid]:
+            return web.json_response({"status": TranscriptClient.trasncripting})
+        return web.json_response({"status": TranscriptClient.transcripted, "data": {"words": stub_words(self.n_words)}})
+
+    @property
+    def urls(self) -> Tuple[str, str]:
+        """ The (post_file_url, get_transcript_url) pair to point a client at this server. """
+        return f"{self.base_url}/files/transcribe/file", f"{self.base_url}/transcripts/"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "StubTranscriptionServer":
+        self.runner = web.AppRunner(self.make_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        bound_port = self.runner.addresses[0][1]
+        self.base_url = f"http://{host}:{bound_port}{self.api_prefix}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+        self.runner = None
+
+
+def test():
+    """ Transcribes a batch of files concurrently against the stub server. """
+    import tempfile
+    from media_archive.media_archive import MediaArchive
+    from transcriptions.async_client import AsyncTranscriptClient
+
+    async def run():
+        server = await StubTranscriptionServer(processing_delay=1.0, n_words=50).start()
+        post_file_url, get_transcript_url = server.urls
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_paths = []
+            for i in range(24):
+                file_path = f"{temp_dir}/file_{i}.mp4"
+                with open(file_path, "wb") as file:
+                    file.write(bytes(256 * 1024))
+                file_paths.append(file_path)
+
+            archive = MediaArchive(cache_file=f"{temp_dir}/archive.json")
+            client = AsyncTranscriptClient(api_key="stub", media_archive=archive, post_file_url=post_file_url,
+                                           get_transcript_url=get_transcript_url, max_concurrency=8)
+            client.poll_initial_delay = 0.2
+            start_time = time.monotonic()
+            async with client:
+                results = await client.transcribe_many(file_paths)
+            elapsed = time.monotonic() - start_time
+
+        failures = [result for result in results if isinstance(result, Exception)]
+        assert not failures, failures
+        assert all(len(transcription.words) == 50 for _, transcription in results)
+        print(f"{len(results)} files in {elapsed:.2f}s, {server.requests} requests, "
+              f"{server.uploaded_bytes / 2 ** 20:.1f} MiB uploaded.")
+        await server.stop()
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Vatis transcription API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--processing-delay", type=float, default=1.0)
+    parser.add_argument("--n-words", type=int, default=200)
+    args = parser.parse_args()
+
+    server = StubTranscriptionServer(processing_delay=args.processing_delay, n_words=args.n_words)
+    print(f"Serving on http://{args.host}:{args.port}{server.api_prefix}")
+    web.run_app(server.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
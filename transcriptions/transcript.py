@@ -1,5 +1,8 @@
 from typing import List, Tuple
 
+import numpy as np
+
+from editor import intervals
 from transcriptions.objects import TranscribedWord
 
 
@@ -9,31 +12,15 @@ def merge_transcript_words(transcribed_words: List[TranscribedWord], speech_segm
 
         Args:
         transcribed_words (list of TranscribedWord): The transcribed words.
-        pauses (list of tuples): Each tuple contains the start and end of a pause.
+        speech_segments (list of tuples): Each tuple contains the start and end of a speech segment.
 
         Returns:
-        list of str: Each string is a paragraph formed from words between pauses.
+        list of str: Each string is a paragraph formed from the words ending in the same speech segment.
         """
-    paragraphs = []
-    timestamped_paragraphs = []
-    current_paragraph_words = []
-    pause_index = 0
-
-    paragraph_start, paragraph_end = speech_segments[pause_index]
-
-    for word in transcribed_words:
-        if word.end <= paragraph_end:
-            current_paragraph_words.append(word)
-        else:
-            paragraph_string = " ".join([w.word for w in current_paragraph_words])
-            paragraphs.append(paragraph_string)
-            current_paragraph_words = [word]
-            pause_index += 1
-            paragraph_start, paragraph_end = speech_segments[pause_index]
-
-    if len(current_paragraph_words):
-        paragraphs.append(" ".join([w.word for w in current_paragraph_words]))
-
-    return paragraphs
-
-
+    if not speech_segments:
+        return [" ".join(word.word for word in transcribed_words)] if transcribed_words else []
+    paragraphs = [[] for _ in speech_segments]
+    ends = np.array([word.end for word in transcribed_words], dtype=np.float64)
+    for word, index in zip(transcribed_words, intervals.assign(ends, intervals.to_array(speech_segments)).tolist()):
+        paragraphs[index].append(word.word)
+    return [" ".join(paragraph) for paragraph in paragraphs if paragraph]
@@ -0,0 +1,119 @@
+from typing import Iterator, List, Sequence
+
+import numpy as np
+
+from transcriptions.objects import TranscribedWord, Transcription
+
+class WordTable:
+    """
+    Columnar transcription: word start and end times in float arrays, and the words in one string
+    with offsets (word i is text[offsets[i]:offsets[i + 1]]). Made for long transcripts, converted
+    from and to Transcription where an API expects one.
+
+    map_transcription_to_segments maps the word times on its columns. Stages that keep most words as
+    they are, like sync_transcription_to_pauses, stay on Transcription: rebuilding every word from a
+    table costs more than the loop it replaces.
+    """
+    __slots__ = ("starts", "ends", "text", "offsets")
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, text: str, offsets: np.ndarray):
+        assert len(starts) == len(ends) == len(offsets) - 1, "Columns of different lengths."
+        self.starts = starts
+        self.ends = ends
+        self.text = text
+        self.offsets = offsets
+
+    @classmethod
+    def from_columns(cls, starts: Sequence[float], ends: Sequence[float], words: Sequence[str]) -> "WordTable":
+        offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum([len(word) for word in words], out=offsets[1:])
+        return cls(np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64), "".join(words), offsets)
+
+    @classmethod
+    def from_transcription(cls, transcription: Transcription) -> "WordTable":
+        words = transcription.words
+        return cls.from_columns([w.start for w in words], [w.end for w in words], [w.word for w in words])
+
+    def to_transcription(self) -> Transcription:
+        return Transcription(words=list(self))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WordTable":
+        return cls(
+            np.asarray(data["starts"], dtype=np.float64),
+            np.asarray(data["ends"], dtype=np.float64),
+            data["text"],
+            np.asarray(data["offsets"], dtype=np.int64)
+        )
+
+    def to_dict(self) -> dict:
+        """ JSON serializable form, four values instead of one object per word. """
+        return {"starts": self.starts.tolist(), "ends": self.ends.tolist(), "text": self.text,
+                "offsets": self.offsets.tolist()}
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def word(self, index: int) -> str:
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    @property
+    def words(self) -> List[str]:
+        offsets = self.offsets.tolist()
+        return [self.text[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def __iter__(self) -> Iterator[TranscribedWord]:
+        for word, start, end in zip(self.words, self.starts.tolist(), self.ends.tolist()):
+            yield TranscribedWord(word=word, start=start, end=end)
+
+    def take(self, indices: np.ndarray) -> "WordTable":
+        """ The table of the words at the given sorted indices. """
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) and indices[-1] - indices[0] == len(indices) - 1:
+            return self[int(indices[0]):int(indices[-1]) + 1]
+        offsets = self.offsets.tolist()
+        words = [self.text[offsets[i]:offsets[i + 1]] for i in indices.tolist()]
+        return WordTable.from_columns(self.starts[indices], self.ends[indices], words)
+
+    def __getitem__(self, item: slice) -> "WordTable":
+        """ A contiguous range of words, sharing the time arrays with this table. """
+        start, stop, step = item.indices(len(self))
+        assert step == 1, "Only contiguous slices are supported, use take()."
+        stop = max(start, stop)
+        text_start, text_end = self.offsets[start], self.offsets[stop]
+        return WordTable(self.starts[start:stop], self.ends[start:stop], self.text[text_start:text_end],
+                         self.offsets[start:stop + 1] - text_start)
+
+    def between(self, start: float, end: float) -> "WordTable":
+        """ The words overlapping the (start, end) time range. """
+        return self.take(np.nonzero((self.ends > start) & (self.starts < end))[0])
+
+    def shift(self, offset: float) -> "WordTable":
+        return WordTable(self.starts + offset, self.ends + offset, self.text, self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.starts.nbytes + self.ends.nbytes + self.offsets.nbytes + len(self.text.encode())
+
+
+def test():
+    transcription = Transcription(words=[
+        TranscribedWord(word="This", start=0.1, end=0.3),
+        TranscribedWord(word="is", start=0.4, end=0.6),
+        TranscribedWord(word="însă", start=0.7, end=0.9),
+        TranscribedWord(word="me", start=1.0, end=1.2),
+    ])
+    table = WordTable.from_transcription(transcription)
+    assert table.words == ["This", "is", "însă", "me"] and table.word(2) == "însă"
+    assert table.to_transcription() == transcription
+    assert WordTable.from_dict(table.to_dict()).to_transcription() == transcription
+
+    assert table.between(0.5, 0.95).words == ["is", "însă"]
+    assert table[1:3].words == ["is", "însă"] and table[1:3].starts.tolist() == [0.4, 0.7]
+    assert table.take(np.array([0, 3])).words == ["This", "me"]
+    assert len(table.between(5, 6)) == 0
+    print(table.to_transcription())
+
+
+if __name__ == '__main__':
+    test()
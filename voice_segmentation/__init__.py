@@ -1,3 +1,15 @@
+from functools import lru_cache
+
 from voice_segmentation.voice_activity_detection import VoiceDetector
 
-detector = VoiceDetector()
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def get_detector() -> VoiceDetector:
+    """ The shared voice detector. Its model is only loaded when detection first runs. """
+    return VoiceDetector()
+
+
+def __getattr__(name):
+    if name == "detector":
+        return get_detector()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
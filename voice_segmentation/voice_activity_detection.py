@@ -1,12 +1,18 @@
-from pyannote.audio.pipelines import VoiceActivityDetection
-from pyannote.audio import Model
 import os
+import threading
+import time
 import dotenv
-from typing import Tuple, List
+import numpy as np
+from typing import Tuple, List, Optional, Iterator
+from audio_extraction.pcm_audio import AudioBuffer, AudioExtractor
+from editor import intervals
 dotenv.load_dotenv()
 
 HF_TOKEN = os.getenv("HUGGINGFACE_TOKEN")
 VOICE_DETECTION_MODEL_ID = "pyannote/segmentation-3.0"
+SPEECH = "speech"
+PAUSE = "pause"
+STITCH_TOLERANCE = 1e-3
 
 
 def parse_segments(segments_list) -> List[Tuple[float, float]]:
@@ -21,6 +27,9 @@ class VoiceDetector:
     pause_margin: Tuple[float, float] = (0.0, 0.0)
     min_duration_on: float = 0.0
     min_duration_off: float = 0.0
+    window_duration: float = 300.0
+    window_overlap: float = 10.0
+    streaming_min_duration: float = 1800.0
     # onset: float = 0.5
     # offset: float = 0.5
     """
@@ -33,48 +42,157 @@ class VoiceDetector:
     """
 
     def __init__(self, model_id: str = VOICE_DETECTION_MODEL_ID):
-        self.model = Model.from_pretrained(
-            model_id,
-            use_auth_token=HF_TOKEN
-        )
-        self.pipeline = VoiceActivityDetection(segmentation=self.model)
-        params = {
-            # "onset": self.onset,
-            # "offset": self.offset,
-            "min_duration_on": self.min_duration_on,
-            "min_duration_off": self.min_duration_off
-        }
-        self.pipeline.instantiate(params)
-
-    def __call__(self, file_path: str, pause_margin: Tuple[float, float] = None) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+        self.model_id = model_id
+        self._pipeline = None
+        self._pipeline_lock = threading.Lock()
+        # Seconds of audio per second of the last streamed detection, None until stream() runs
+        self.throughput: Optional[float] = None
+
+    @property
+    def pipeline(self):
+        """
+        The pyannote pipeline, loaded on first use since importing pyannote and loading the model is slow.
+        Loaded once under a lock, the CPU pool of a batch may run several detections at the same time.
+        """
+        if self._pipeline is None:
+            with self._pipeline_lock:
+                if self._pipeline is None:
+                    from pyannote.audio.pipelines import VoiceActivityDetection
+                    from pyannote.audio import Model
+
+                    self.model = Model.from_pretrained(
+                        self.model_id,
+                        use_auth_token=HF_TOKEN
+                    )
+                    pipeline = VoiceActivityDetection(segmentation=self.model)
+                    params = {
+                        # "onset": self.onset,
+                        # "offset": self.offset,
+                        "min_duration_on": self.min_duration_on,
+                        "min_duration_off": self.min_duration_off
+                    }
+                    pipeline.instantiate(params)
+                    self._pipeline = pipeline
+        return self._pipeline
+
+    def __call__(self, file_path: str, pause_margin: Tuple[float, float] = None, audio: Optional[AudioBuffer] = None,
+                 streaming: Optional[bool] = None) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
         """
         Returns the speech segments and the pause segments for the given file.
         A segment is given as (start, end) timestamps in seconds
         :param file_path: Path to the file, accepts videos too.
+        :param audio: Already decoded audio of the file, used instead of decoding it again.
+        :param streaming: Process the audio in overlapping windows with bounded memory, see stream().
+            By default, audio longer than streaming_min_duration is streamed.
         :return: The speech and pause segments
         """
 
-        voice_activity = self.pipeline(file_path)
-        timeline = voice_activity.get_timeline()
-        pause_timeline = timeline.gaps()
-
-        speech_segments = parse_segments(timeline.segments_list_)
-        pause_segments = parse_segments(pause_timeline.segments_list_)
+        if streaming is None:
+            streaming = audio is not None and audio.duration > self.streaming_min_duration
+
+        if streaming:
+            if audio is None:
+                audio = AudioExtractor()(file_path)
+            speech_segments, pause_segments = [], []
+            for kind, start, end in self.stream(audio):
+                (speech_segments if kind == SPEECH else pause_segments).append((start, end))
+        else:
+            if audio is not None:
+                audio.mark_used("voice_activity_detection")
+                voice_activity = self.pipeline(self.to_pipeline_input(audio))
+            else:
+                voice_activity = self.pipeline(file_path)
+            timeline = voice_activity.get_timeline()
+            pause_timeline = timeline.gaps()
+
+            speech_segments = parse_segments(timeline.segments_list_)
+            pause_segments = parse_segments(pause_timeline.segments_list_)
 
         # Add pause margins
         if pause_margin is None:
             pause_margin = self.pause_margin
         print(f"Adding pause margin {pause_margin}")
-        pause_segments = [(pause[0] + pause_margin[0], pause[1] - pause_margin[1]) for pause in pause_segments]
+        pauses = intervals.pad(intervals.to_array(pause_segments), -pause_margin[0], -pause_margin[1])
 
         # Add segments before first and after last utterance
         first_pause = (0.0, speech_segments[0][0] - pause_margin[1])
         last_pause = (speech_segments[-1][1] + pause_margin[0], 9999)
 
-        pause_segments = [first_pause] + pause_segments + [last_pause]
+        # Pauses shorter than the margins end up empty or inverted, they are dropped
+        pauses = np.concatenate([[first_pause], pauses, [last_pause]])
+        pause_segments = intervals.to_list(intervals.filter_min_duration(pauses))
         print(f"\nIdentified {len(pause_segments)} speech pauses.")
         return speech_segments, pause_segments
 
+    @staticmethod
+    def to_pipeline_input(audio: AudioBuffer, start: float = 0.0, end: Optional[float] = None) -> dict:
+        import torch
+        return {
+            "waveform": torch.from_numpy(audio.to_float(start, end)),
+            "sample_rate": audio.sample_rate
+        }
+
+    def stream(self, audio: AudioBuffer, window_duration: float = None,
+               window_overlap: float = None) -> Iterator[Tuple[str, float, float]]:
+        """
+        Runs the detection over overlapping windows of the audio and yields (SPEECH | PAUSE, start, end)
+        segments in order, as soon as they are final. Only one window is decoded to float at a time, so
+        memory stays flat regardless of the audio duration.
+
+        Each window is trusted up to half the overlap before its end; speech crossing that point is
+        stitched with the continuation detected by the next window.
+        """
+        window_duration = window_duration or self.window_duration
+        window_overlap = self.window_overlap if window_overlap is None else window_overlap
+        if not 0 <= window_overlap < window_duration:
+            raise ValueError(f"Window overlap {window_overlap} must be in [0, window duration {window_duration})")
+        step = window_duration - window_overlap
+        tolerance = max(self.min_duration_off, STITCH_TOLERANCE)
+        audio.mark_used("voice_activity_detection")
+
+        start_time = time.perf_counter()
+        pending = None
+        last_speech_end = None
+        committed = 0.0
+        window_start = 0.0
+
+        def emit(segment):
+            nonlocal last_speech_end
+            if last_speech_end is not None and segment[0] > last_speech_end:
+                yield PAUSE, last_speech_end, segment[0]
+            yield SPEECH, segment[0], segment[1]
+            last_speech_end = segment[1]
+
+        while committed < audio.duration:
+            window_end = min(window_start + window_duration, audio.duration)
+            commit_point = audio.duration if window_end >= audio.duration else window_end - window_overlap / 2
+
+            voice_activity = self.pipeline(self.to_pipeline_input(audio, window_start, window_end))
+            for segment in voice_activity.get_timeline().segments_list_:
+                start = max(segment.start + window_start, committed)
+                end = min(segment.end + window_start, commit_point)
+                if end <= start:
+                    continue
+                if pending is not None and start - pending[1] <= tolerance:
+                    pending = (pending[0], max(pending[1], end))
+                else:
+                    if pending is not None:
+                        yield from emit(pending)
+                    pending = (start, end)
+
+            if pending is not None and pending[1] < commit_point - tolerance:
+                yield from emit(pending)
+                pending = None
+
+            committed = commit_point
+            window_start += step
+            elapsed = time.perf_counter() - start_time
+            self.throughput = committed / elapsed if elapsed > 0 else float("inf")
+            print(f"VAD processed {committed:.0f}/{audio.duration:.0f}s of audio ({self.throughput:.1f}s audio/s).")
+
+        if pending is not None:
+            yield from emit(pending)
+
     def get_pauses(self, file_path: str, pause_margin: Tuple[float, float] = None) -> List[Tuple[float, float]]:
         _, pause_segments = self.__call__(file_path, pause_margin=pause_margin)
         return pause_segments